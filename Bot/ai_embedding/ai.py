@@ -1,315 +1,695 @@
 import time
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterator, Optional
 import requests
 from logger import ai_logger
+from ai_embedding.embedding_cache import EmbeddingCache, text_hash
+from ai_embedding.embedding_pool import EmbeddingWorkerPool
+from ai_embedding.fireworks_client import FireworksClient
+from ai_embedding.chunk_lookup import ChunkLookup
+from ai_embedding.context_packer import pack_context
+from ai_embedding.embedding_provider import EmbeddingProvider, create_embedding_provider
+from constants import (
+    CONTEXT_EMBED_PASSAGES,
+    EMBEDDING_PROVIDER,
+    FIREWORKS_BASE_URL,
+    EMBEDDING_CACHE_FILE,
+    EMBEDDING_CACHE_MAX_MB,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_BATCH_CHARS,
+    EMBEDDING_MAX_IN_FLIGHT,
+    EMBEDDING_REQUESTS_PER_SECOND,
+)
 import numpy as np
 
-url = "https://api.fireworks.ai/inference/v1/embeddings"
-url_llm = "https://api.fireworks.ai/inference/v1/chat/completions"
+url = f"{FIREWORKS_BASE_URL}/embeddings"
+url_llm = f"{FIREWORKS_BASE_URL}/chat/completions"
+EMBEDDING_MODEL = "nomic-ai/nomic-embed-text-v1.5"
+EMBEDDING_DIMENSIONS = 768
+ANSWER_MODEL = "accounts/fireworks/models/llama-v3p3-70b-instruct"
 headers = {
     "Authorization": f'Bearer fw_3ZbneyZaTFytBHirqLphxtPi', #{os.getenv('FIRE')},
     "Content-Type": "application/json",
 }
 
-
-def generate_embeddings(chunks: List[Dict[str, Any]]) -> None:
+NO_CONTEXT_ANSWER = "No se encontraron artículos relevantes para responder a tu pregunta."
+API_ERROR_ANSWER = "⚠️ Error al conectar con el servicio de respuestas. Por favor intenta nuevamente."
+PROCESSING_ERROR_ANSWER = "⚠️ Error al procesar tu consulta. Por favor intenta nuevamente."
+EXTRACTIVE_ANSWER_HEADER = (
+    "⚠️ El servicio de respuestas no está disponible. "
+    "Estos son los fragmentos más relevantes de los documentos:"
+)
+# Tokens de los fragmentos citados, para no superar el límite de un mensaje
+EXTRACTIVE_TOKEN_BUDGET = 800
+ANSWER_NOTE = "\n\nℹ️ Nota: Siempre verifique la información directamente en los documentos."
+
+# Caché persistente de embeddings, creada bajo demanda
+_embedding_cache = None
+# Cliente HTTP compartido de la API, creado bajo demanda
+_fireworks_client = None
+# Proveedor de embeddings configurado, creado bajo demanda
+_embedding_provider = None
+# Resolución de ids y vectores a chunks de la última lista de chunks usada
+_chunk_lookup = None
+
+
+def generate_embeddings(
+    chunks: List[Dict[str, Any]],
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    max_batch_chars: int = EMBEDDING_MAX_BATCH_CHARS,
+    max_in_flight: int = EMBEDDING_MAX_IN_FLIGHT,
+    requests_per_second: float = EMBEDDING_REQUESTS_PER_SECOND,
+    on_embedding: Optional[Callable[[Dict[str, Any], List[float]], None]] = None,
+) -> List[Dict[str, Any]]:
     """
     Genera embeddings para los fragmentos de texto que no los tengan
 
+    Los textos se envían en lotes a la API; cada lote respeta tanto el número
+    máximo de entradas como el tamaño máximo del payload en caracteres. Los
+    lotes se procesan de forma concurrente con un límite de peticiones
+    simultáneas y de tasa.
+
     Args:
         chunks: Lista de fragmentos con metadatos
+        batch_size: Número máximo de textos por petición
+        max_batch_chars: Número máximo de caracteres por petición
+        max_in_flight: Número máximo de peticiones simultáneas
+        requests_per_second: Tasa máxima de peticiones a la API
+        on_embedding: Función llamada con (chunk, embedding) por cada
+            embedding nuevo, por ejemplo para guardar un checkpoint
 
     Returns:
-        None - Modifica los chunks in-place
+        List[Dict[str, Any]]: Chunks cuyo embedding no se pudo generar
+        (los chunks se modifican in-place)
     """
     ai_logger.info(f"Solicitada generación de embeddings para {len(chunks)} chunks")
 
-    # Contador de embeddings a generar
-    total_to_generate = 0
+    # Seleccionar los chunks pendientes que tienen texto
+    pending = []
     for chunk in chunks:
-        if "embedding" not in chunk:
-            total_to_generate += 1
+        if "embedding" in chunk:
+            continue  # Omitir chunks que ya tienen embedding
+        if not chunk.get("text", ""):
+            ai_logger.warning(
+                f"Fragmento {chunk.get('chunk_id', 'desconocido')} no tiene texto para embeddings"
+            )
+            continue
+        pending.append(chunk)
+
+    # Reutilizar los embeddings ya pagados que estén en la caché persistente
+    cache = get_embedding_cache()
+    if pending and cache:
+        cached = cache.get_many(chunk["text"] for chunk in pending)
+        missing = []
+        for chunk in pending:
+            embedding = cached.get(text_hash(chunk["text"]))
+            if embedding is not None:
+                chunk["embedding"] = embedding
+            else:
+                missing.append(chunk)
+        ai_logger.info(
+            f"Caché de embeddings: {len(pending) - len(missing)} aciertos, {len(missing)} fallos"
+        )
+        pending = missing
 
-    if total_to_generate == 0:
+    if not pending:
         ai_logger.info(
             "Todos los chunks ya tienen embeddings. No es necesario generar nuevos."
         )
-        return
+        return []
 
     ai_logger.info(
-        f"Se generarán {total_to_generate} nuevos embeddings (omitiendo {len(chunks) - total_to_generate} existentes)"
+        f"Se generarán {len(pending)} nuevos embeddings (omitiendo {len(chunks) - len(pending)} existentes)"
     )
 
-    # Generar solo los embeddings faltantes
     generated_count = 0
+    failed = []
     start_time = time.time()
 
-    for chunk in chunks:
-        #time.sleep(5)
-        if "embedding" in chunk:
-            continue  # Omitir chunks que ya tienen embedding
+    provider = get_embedding_provider()
+    if not provider.remote:
+        # Un modelo local ocupa la CPU: lotes de uno en uno y sin límite de tasa
+        max_in_flight, requests_per_second = 1, 0
+    pool = EmbeddingWorkerPool(
+        max_in_flight=max_in_flight, requests_per_second=requests_per_second
+    )
 
-        generated_count += 1
-        chunk_id = chunk.get("chunk_id", f"Chunk-{generated_count}")
-        ai_logger.info(
-            f"Generando embedding para fragmento {chunk_id} ({generated_count}/{total_to_generate})"
+    def embed_chunks(batch: List[Dict[str, Any]]) -> List[Optional[List[float]]]:
+        texts = [chunk["text"] for chunk in batch]
+        return embed_batch(
+            texts, lambda part: pool.call_with_backoff(request_embeddings, part)
         )
 
-        try:
-            text = chunk.get("text", "")
-            if not text:
-                ai_logger.warning(
-                    f"Fragmento {chunk_id} no tiene texto para embeddings"
-                )
-                continue
-
-            embedding = embed_question(text)
-            if embedding:
-                chunk["embedding"] = embedding
-                ai_logger.debug(
-                    f"Embedding generado correctamente para fragmento {chunk_id}"
-                )
-            else:
-                ai_logger.error(
-                    f"No se pudo generar embedding para fragmento {chunk_id}"
-                )
-        except Exception as e:
-            ai_logger.error(
-                f"Error generando embedding para fragmento {chunk_id}: {str(e)}"
-            )
+    batches = make_batches(pending, batch_size, max_batch_chars)
+    try:
+        for batch, embeddings in pool.run(
+            batches, embed_chunks, total_items=len(pending)
+        ):
+            # Cada embedding se asigna al chunk de su misma posición en el lote
+            for chunk, embedding in zip(batch, embeddings):
+                chunk_id = chunk.get("chunk_id", "desconocido")
+                if embedding:
+                    chunk["embedding"] = embedding
+                    generated_count += 1
+                    if cache:
+                        cache.put(chunk["text"], embedding)
+                    if on_embedding:
+                        on_embedding(chunk, embedding)
+                else:
+                    failed.append(chunk)
+                    ai_logger.error(
+                        f"No se pudo generar embedding para fragmento {chunk_id}"
+                    )
+    finally:
+        if cache:
+            cache.flush()
 
     elapsed_time = time.time() - start_time
     avg_time = elapsed_time / generated_count if generated_count > 0 else 0
+    if provider.remote:
+        get_fireworks_client().log_metrics()
 
     ai_logger.info(
-        f"Generación de embeddings completada: {generated_count} generados en {elapsed_time:.2f} segundos (promedio: {avg_time:.2f} s/embedding)"
+        f"Generación de embeddings completada: {generated_count}/{len(pending)} generados en {elapsed_time:.2f} segundos (promedio: {avg_time:.2f} s/embedding)"
     )
+    return failed
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Devuelve la caché persistente de embeddings, creándola la primera vez.
+
+    Returns:
+        Optional[EmbeddingCache]: None si la caché está desactivada o no se pudo abrir
+    """
+    global _embedding_cache
+    provider = get_embedding_provider()
+    if not provider.ready:
+        return None
+    # Un modelo local recién ajustado cambia de nombre: sus vectores van aparte
+    stale = _embedding_cache is not None and (
+        _embedding_cache.model != provider.model
+        or _embedding_cache.dimensions != provider.dimensions
+    )
+    if (_embedding_cache is None or stale) and EMBEDDING_CACHE_MAX_MB > 0:
+        try:
+            _embedding_cache = EmbeddingCache(
+                EMBEDDING_CACHE_FILE,
+                provider.model,
+                provider.dimensions,
+                max_bytes=EMBEDDING_CACHE_MAX_MB * 1024**2,
+            )
+        except Exception as e:
+            ai_logger.error(f"No se pudo abrir la caché de embeddings: {e}")
+    return _embedding_cache
+
+
+def get_fireworks_client() -> FireworksClient:
+    """Devuelve el cliente compartido de la API, creándolo la primera vez."""
+    global _fireworks_client
+    if _fireworks_client is None:
+        _fireworks_client = FireworksClient(FIREWORKS_BASE_URL, headers)
+    return _fireworks_client
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Devuelve el proveedor de embeddings de EMBEDDING_PROVIDER, creándolo la primera vez."""
+    global _embedding_provider
+    if _embedding_provider is None:
+        _embedding_provider = create_embedding_provider(
+            EMBEDDING_PROVIDER, get_fireworks_client, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS
+        )
+        ai_logger.info(f"Proveedor de embeddings: {_embedding_provider.identity}")
+    return _embedding_provider
+
+
+def make_batches(
+    chunks: List[Dict[str, Any]],
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    max_batch_chars: int = EMBEDDING_MAX_BATCH_CHARS,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Agrupa fragmentos en lotes limitados por cantidad y por caracteres.
+
+    Un fragmento que por sí solo supera max_batch_chars forma su propio lote.
+
+    Args:
+        chunks: Fragmentos con el campo "text"
+        batch_size: Número máximo de fragmentos por lote
+        max_batch_chars: Número máximo de caracteres por lote
+
+    Yields:
+        List[Dict[str, Any]]: Lote de fragmentos en el orden original
+    """
+    batch = []
+    batch_chars = 0
+    for chunk in chunks:
+        text_len = len(chunk["text"])
+        if batch and (
+            len(batch) >= batch_size or batch_chars + text_len > max_batch_chars
+        ):
+            yield batch
+            batch = []
+            batch_chars = 0
+        batch.append(chunk)
+        batch_chars += text_len
+
+    if batch:
+        yield batch
+
+
+def embed_batch(
+    texts: List[str],
+    request_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+) -> List[Optional[List[float]]]:
+    """
+    Genera embeddings para un lote de textos en una sola petición.
+
+    Si la petición falla, el lote se divide en dos mitades que se reintentan
+    por separado, de modo que un texto problemático solo invalida su propio
+    embedding.
+
+    Args:
+        texts: Textos a convertir en embeddings
+        request_fn: Función que realiza la petición (por defecto request_embeddings)
+
+    Returns:
+        List[Optional[List[float]]]: Embeddings en el mismo orden que texts
+        (None para los textos que no se pudieron procesar)
+    """
+    if not texts:
+        return []
+    request_fn = request_fn or request_embeddings
+
+    try:
+        return request_fn(texts)
+    except Exception as e:
+        if len(texts) == 1:
+            ai_logger.error(f"Error generando embedding para un texto: {e}")
+            return [None]
+
+        middle = len(texts) // 2
+        ai_logger.warning(
+            f"Fallo en lote de {len(texts)} textos ({e}); reintentando en lotes de "
+            f"{middle} y {len(texts) - middle}"
+        )
+        return embed_batch(texts[:middle], request_fn) + embed_batch(
+            texts[middle:], request_fn
+        )
+
+
+def request_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    Genera en una sola llamada al proveedor los embeddings de una lista de textos.
+
+    Args:
+        texts: Textos a convertir en embeddings
+
+    Returns:
+        List[List[float]]: Embeddings en el mismo orden que texts
+
+    Raises:
+        requests.exceptions.RequestException: Si falla la petición HTTP
+        ValueError: Si la respuesta no contiene un embedding por cada texto
+    """
+    return get_embedding_provider().embed(texts)
 
 
 def generate_answer(
     question: str,
-    context_chunks: List[Dict[str, Any]] | List[List[int]],
-    save_chunks: List[Dict[str, Any]] | List[List[int]],
-    model: str = "accounts/fireworks/models/llama-v3p3-70b-instruct",
+    context_chunks: List[Dict[str, Any]] | List[str] | List[List[float]],
+    save_chunks: List[Dict[str, Any]],
+    model: str = ANSWER_MODEL,
+    on_text: Optional[Callable[[str], None]] = None,
+    question_embedding: Optional[List[float]] = None,
 ) -> tuple:
     """
     Genera una respuesta citando específicamente artículos, páginas y documentos.
 
     Args:
         question: Pregunta del usuario
-        context_chunks: Fragmentos de artículos relevantes (vectores o diccionarios)
+        context_chunks: Fragmentos relevantes (chunks, claves chunk_key o vectores)
         save_chunks: Todos los chunks disponibles para búsqueda
         model: Modelo generativo a usar
+        on_text: Si se indica, la respuesta se pide en streaming y se llama
+            con el texto acumulado cada vez que llega un fragmento
+        question_embedding: Embedding de la pregunta, para elegir los pasajes
+            del contexto (sin él se eligen por términos de la pregunta)
 
     Returns:
         tuple: (respuesta_formateada, referencias_detalladas)
     """
     try:
-        # Procesar los chunks de contexto
-        processed_chunks = []
-        for chunk in context_chunks:
-            if isinstance(chunk, dict):
-                processed_chunks.append(chunk)
-            else:
-                original_chunk = find_original_chunk(chunk, save_chunks)
-                if original_chunk:
-                    processed_chunks.append(original_chunk)
-
+        processed_chunks = prepare_context(
+            question, context_chunks, save_chunks, question_embedding
+        )
         if not processed_chunks:
-            return (
-                "No se encontraron artículos relevantes para responder a tu pregunta.",
-                [],
-            )
+            return NO_CONTEXT_ANSWER, []
 
-        context_text = ""
-        for chunk in processed_chunks:
-            doc_name = (
-                os.path.basename(chunk["document"])
-                .replace(".pdf", "")
-                .replace("_", " ")
-            )
+        payload = build_answer_payload(question, processed_chunks, model)
 
-            pages = ", ".join(map(str, chunk["pages"])) if "pages" in chunk else "N/A"
+        # Generar respuesta
+        return format_answer(complete_chat(payload, on_text), processed_chunks)
 
-            context_text += (
-                f"\n\n📄 Documento: {doc_name}\n"
-                f"📌 Páginas: {pages}\n"
-                f"📝 Contenido:\n{chunk['text']}\n"
-                "――――――――――――――――――――――"
-            )
+    except requests.exceptions.RequestException as e:
+        ai_logger.error(f"Error en la API: {str(e)}")
+        return API_ERROR_ANSWER, []
+    except Exception as e:
+        ai_logger.error(f"Error generando respuesta: {str(e)}")
+        return PROCESSING_ERROR_ANSWER, []
 
-        # Prompt
-        prompt = (
-            "Eres un experto en bioinformática y programación. "
-            f"PREGUNTA: {question}\n\n"
-            "INFORMACIÓN RELEVANTE:\n" + context_text + "\n\n"
-            "Basándote en la información anterior y tu conocimiento, "
-            "proporciona una respuesta académica completa. "
-            "No repitas frases exactas del contexto. "
-            "No menciones las fuentes ni que estás usando información proporcionada. "
-            "Estructura tu respuesta con encabezados en Markdown cuando sea apropiado.\n\n"
-            "RESPUESTA:"
-        )
 
-        # Configurar payload para la API
-        payload = {
-            "model": model,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "Eres un asistente legal especializado en interpretar documentos normativos. Responde de manera precisa y profesional.",
-                    "name": "system",
-                },
-                {"role": "user", "content": prompt, "name": "User"},
-            ],
-            # si lo bajas da mas Precisión
-            "temperature": 0.2,  
-            "max_tokens": 1500,
-            "top_p": 0.9,
-        }
+def prepare_context(
+    question: str,
+    context_chunks: List[Dict[str, Any]] | List[str] | List[List[float]],
+    save_chunks: List[Dict[str, Any]],
+    question_embedding: Optional[List[float]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Resuelve los fragmentos de contexto y los reduce al presupuesto de tokens.
 
-        # Generar respuesta
-        response = requests.post(url_llm, json=payload, headers=headers)
-        response.raise_for_status()
-        response_data = response.json()
+    Los pasajes solo se envían a la API de embeddings con CONTEXT_EMBED_PASSAGES;
+    por defecto se puntúan sin llamadas externas.
+
+    Returns:
+        List[Dict[str, Any]]: Secciones de contexto con documento y páginas
+    """
+    processed_chunks = resolve_context_chunks(context_chunks, save_chunks)
+    if not processed_chunks:
+        return []
+    return pack_context(
+        question,
+        processed_chunks,
+        question_embedding,
+        embed_texts if CONTEXT_EMBED_PASSAGES else None,
+    )
+
+
+def embed_texts(texts: List[str]) -> List[Optional[List[float]]]:
+    """
+    Genera embeddings para textos sueltos reutilizando la caché persistente.
+
+    Args:
+        texts: Textos a convertir en embeddings
+
+    Returns:
+        List[Optional[List[float]]]: Embeddings en el mismo orden que texts
+        (None para los que no se pudieron generar)
+    """
+    cache = get_embedding_cache()
+    cached = cache.get_many(texts) if cache else {}
+    embeddings = [cached.get(text_hash(text)) for text in texts]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if not missing:
+        return embeddings
+
+    batches = make_batches([{"text": texts[i], "position": i} for i in missing])
+    for batch in batches:
+        for item, embedding in zip(
+            batch, embed_batch([item["text"] for item in batch])
+        ):
+            embeddings[item["position"]] = embedding
+            if embedding is not None and cache:
+                cache.put(item["text"], embedding)
+    if cache:
+        cache.flush()
+    ai_logger.info(
+        f"Embeddings de pasajes: {len(texts) - len(missing)} de la caché, {len(missing)} generados"
+    )
+    return embeddings
+
+
+def resolve_context_chunks(
+    context_chunks: List[Dict[str, Any]] | List[str] | List[List[float]],
+    save_chunks: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Convierte los fragmentos de contexto en chunks.
 
-        # Procesar respuesta
-        answer = (
-            response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
+    Cada elemento puede ser el propio chunk, su clave estable (chunk_key)
+    o, por compatibilidad, su vector de embedding.
+    """
+    processed_chunks = []
+    for chunk in context_chunks:
+        if isinstance(chunk, dict):
+            processed_chunks.append(chunk)
+            continue
+        if isinstance(chunk, str):
+            original_chunk = get_chunk_lookup(save_chunks).get(chunk)
+        else:
+            original_chunk = find_original_chunk(chunk, save_chunks)
+        if original_chunk:
+            processed_chunks.append(original_chunk)
+    return processed_chunks
+
+
+def _pretty_document_name(chunk: Dict[str, Any]) -> str:
+    """Nombre legible del documento de un chunk."""
+    return os.path.basename(chunk["document"]).replace(".pdf", "").replace("_", " ")
+
+
+def build_answer_payload(
+    question: str, processed_chunks: List[Dict[str, Any]], model: str = ANSWER_MODEL
+) -> Dict[str, Any]:
+    """
+    Construye la petición a la API de chat para responder con los chunks como contexto.
+
+    Args:
+        question: Pregunta del usuario
+        processed_chunks: Chunks de contexto
+        model: Modelo generativo a usar
+
+    Returns:
+        Dict[str, Any]: Payload de la petición
+    """
+    context_text = ""
+    for chunk in processed_chunks:
+        doc_name = _pretty_document_name(chunk)
+
+        pages = ", ".join(map(str, chunk["pages"])) if "pages" in chunk else "N/A"
+
+        context_text += (
+            f"\n\n📄 Documento: {doc_name}\n"
+            f"📌 Páginas: {pages}\n"
+            f"📝 Contenido:\n{chunk['text']}\n"
+            "――――――――――――――――――――――"
         )
 
-        # Extraer referencias únicas
-        unique_refs = []
-        for chunk in processed_chunks:
-            doc_name = (
-                os.path.basename(chunk["document"])
-                .replace(".pdf", "")
-                .replace("_", " ")
-            )
+    # Prompt
+    prompt = (
+        "Eres un experto en bioinformática y programación. "
+        f"PREGUNTA: {question}\n\n"
+        "INFORMACIÓN RELEVANTE:\n" + context_text + "\n\n"
+        "Basándote en la información anterior y tu conocimiento, "
+        "proporciona una respuesta académica completa. "
+        "No repitas frases exactas del contexto. "
+        "No menciones las fuentes ni que estás usando información proporcionada. "
+        "Estructura tu respuesta con encabezados en Markdown cuando sea apropiado.\n\n"
+        "RESPUESTA:"
+    )
 
-            pages = ", ".join(map(str, chunk["pages"])) if "pages" in chunk else "N/A"
+    # Configurar payload para la API
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "system",
+                "content": "Eres un asistente legal especializado en interpretar documentos normativos. Responde de manera precisa y profesional.",
+                "name": "system",
+            },
+            {"role": "user", "content": prompt, "name": "User"},
+        ],
+        # si lo bajas da mas Precisión
+        "temperature": 0.2,  
+        "max_tokens": 1500,
+        "top_p": 0.9,
+    }
+
+
+def format_answer(answer: str, processed_chunks: List[Dict[str, Any]]) -> tuple:
+    """
+    Añade la nota final a la respuesta y compone las referencias de los chunks usados.
 
-            ref_str = f"📄 {doc_name} | | 📌 Pág. {pages}"
-            unique_refs.append(ref_str)
+    Returns:
+        tuple: (respuesta_formateada, referencias_detalladas)
+    """
 
-        answer += "\n\nℹ️ Nota: Siempre verifique la información directamente en los documentos."
+    # Extraer referencias únicas
+    unique_refs = []
+    for chunk in processed_chunks:
+        doc_name = _pretty_document_name(chunk)
 
-        return answer, unique_refs
+        pages = ", ".join(map(str, chunk["pages"])) if "pages" in chunk else "N/A"
 
-    except requests.exceptions.RequestException as e:
-        ai_logger.error(f"Error en la API: {str(e)}")
-        return (
-            "⚠️ Error al conectar con el servicio de respuestas. Por favor intenta nuevamente.",
-            [],
+        ref_str = f"📄 {doc_name} | | 📌 Pág. {pages}"
+        unique_refs.append(ref_str)
+
+    answer += ANSWER_NOTE
+
+    return answer, unique_refs
+
+
+def extractive_answer(
+    question: str,
+    context_chunks: List[Dict[str, Any]],
+    save_chunks: List[Dict[str, Any]],
+) -> tuple:
+    """
+    Respuesta sin modelo generativo: los pasajes más relevantes, citados tal cual.
+
+    Se usa cuando la búsqueda ha funcionado sin red (índice léxico) pero el
+    servicio de respuestas no está disponible. Los pasajes se eligen por
+    términos de la pregunta y caben en un mensaje de Telegram.
+
+    Returns:
+        tuple: (respuesta_formateada, referencias_detalladas)
+    """
+    processed_chunks = resolve_context_chunks(context_chunks, save_chunks)
+    sections = pack_context(
+        question, processed_chunks, token_budget=EXTRACTIVE_TOKEN_BUDGET
+    )
+    if not sections:
+        return NO_CONTEXT_ANSWER, []
+
+    parts = [EXTRACTIVE_ANSWER_HEADER]
+    for section in sections:
+        pages = ", ".join(map(str, section.get("pages") or [])) or "N/A"
+        parts.append(
+            f"📄 {_pretty_document_name(section)} (pág. {pages})\n«{section['text']}»"
         )
-    except Exception as e:
-        ai_logger.error(f"Error generando respuesta: {str(e)}")
-        return "⚠️ Error al procesar tu consulta. Por favor intenta nuevamente.", []
+    return format_answer("\n\n".join(parts), sections)
+
+
+def chat_content(response_data: Dict[str, Any]) -> str:
+    """Texto de la primera respuesta de la API de chat."""
+    return response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
+
+
+def complete_chat(
+    payload: Dict[str, Any], on_text: Optional[Callable[[str], None]] = None
+) -> str:
+    """
+    Envía una petición de chat y devuelve el texto completo de la respuesta.
+
+    Args:
+        payload: Petición a la API de chat
+        on_text: Si se indica, la respuesta se pide en streaming y se llama
+            con el texto acumulado cada vez que llega un fragmento
+
+    Returns:
+        str: Texto de la respuesta
+    """
+    client = get_fireworks_client()
+    if on_text is None:
+        return chat_content(client.chat(payload))
+
+    text = ""
+    for delta in client.chat_stream(payload):
+        text += delta
+        on_text(text)
+    return text
 
 
 def find_original_chunk(vector, chunks_db):
     """
-    Función para encontrar el chunk original correspondiente a un vector.
-    se Podrá optimizar? par que no sea O(n)?
+    Encuentra el chunk original correspondiente a un vector.
+
+    Usa el mapa exacto de vectores de ChunkLookup y, si el vector no
+    coincide con ninguno, el más cercano mediante una sola operación
+    matricial.
     """
+    return get_chunk_lookup(chunks_db).resolve_vector(vector)
 
-    closest_chunk = None
-    min_distance = float("inf")
 
-    for chunk in chunks_db:
-        chunk_vector = chunk.get("embedding")
-        if chunk_vector:
-            distance = np.linalg.norm(np.array(vector) - np.array(chunk_vector))
-            if distance < min_distance:
-                min_distance = distance
-                closest_chunk = chunk
+def get_chunk_lookup(chunks: List[Dict[str, Any]]) -> ChunkLookup:
+    """
+    Devuelve el ChunkLookup de una lista de chunks, reutilizándolo mientras sea la misma lista.
 
-    return closest_chunk
+    Args:
+        chunks: Lista completa de chunks
+    """
+    global _chunk_lookup
+    if _chunk_lookup is None or _chunk_lookup.chunks is not chunks:
+        _chunk_lookup = ChunkLookup(chunks)
+    return _chunk_lookup
+
+
+def register_chunk_lookup(lookup: ChunkLookup) -> None:
+    """Registra el ChunkLookup de los chunks cargados, con su matriz mapeada."""
+    global _chunk_lookup
+    _chunk_lookup = lookup
 
 
 def embed_question(question: str) -> List[float]:
     """
-    Genera embedding para una pregunta
+    Genera embedding para una pregunta con el proveedor configurado
 
     Args:
         question: Pregunta a convertir en embedding
-        model_name: Modelo de embeddings a usar
 
     Returns:
         List[float]: Embedding generado
     """
     try:
-        payload = {
-            "input": question,
-            "model": "nomic-ai/nomic-embed-text-v1.5",
-            "dimensions": 768,
-        }
         ai_logger.info(f"Generando embedding para pregunta {question}")
-        response = requests.post(url, json=payload, headers=headers)
-        response.raise_for_status()
-        response_json = response.json()
-        question_embedding = response_json["data"][0]["embedding"]
-        return question_embedding
+        return get_embedding_provider().embed_query(question)
     except Exception as e:
         ai_logger.error(f"Error generando embedding para pregunta {question}: {e}")
         return None
 
 
-def answer_general_question(pregunta: str) -> str:
+def answer_general_question(
+    pregunta: str, on_text: Optional[Callable[[str], None]] = None
+) -> str:
     """
     Genera una respuesta formal para preguntas generales sin buscar en documentos.
 
     Args:
         pregunta: La pregunta del usuario
+        on_text: Función para recibir el texto acumulado en streaming (opcional)
 
     Returns:
         str: Respuesta formal a la pregunta general
     """
     try:
+        payload = build_general_payload(pregunta)
 
-        prompt = (
-            "🧬 Como experto en Bioinformática y Programación, responde de manera detallada pero concisa:\n"
-            f"❓ Pregunta: {pregunta}\n\n"
-            "Cuando sea relevante, enriquece la respuesta incluyendo:\n"
-            "- Explicaciones conceptuales\n"
-            "- Contexto histórico\n"
-            "- Aplicaciones prácticas\n\n"
-            "- Si la respuesta incluye código, preséntalo en un bloque de código usando triple backticks (```)\n\n"
-            "Justo después de los backticks de apertura, indica el lenguaje de programación para que Telegram lo formatee correctamente.\n\n"
-            "Además, utiliza emojis para hacer la explicación más clara y amena, ayudando a destacar puntos importantes.\n\n"
-            "Por ejemplo:\n"
-            "```python\n"
-            "# tu código aquí\n"
-            "```\n"
-            "Respuesta:\n"
-        )
+        return complete_chat(payload, on_text)
 
+    except Exception as e:
+        return f"⚠️ Error al generar respuesta para tu pregunta general: {str(e)}"
 
 
-        payload = {
-            "model": "accounts/fireworks/models/llama-v3p3-70b-instruct",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "Eres un asistente especializado en Bioinformática. Responde de manera precisa y profesional.",
-                    "name": "system",
-                },
-                {"role": "user", "content": prompt, "name": "User"},
-            ],
-            "temperature": 0.3,
-            "max_tokens": 1500,
-            "top_p": 0.9,
-        }
-
-        response = requests.post(url_llm, json=payload, headers=headers)
-        response.raise_for_status()
-        response_data = response.json()
-
-        answer = (
-            response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
-        )
-        return answer
+def build_general_payload(pregunta: str) -> Dict[str, Any]:
+    """Construye la petición a la API de chat para una pregunta general."""
+    prompt = (
+        "🧬 Como experto en Bioinformática y Programación, responde de manera detallada pero concisa:\n"
+        f"❓ Pregunta: {pregunta}\n\n"
+        "Cuando sea relevante, enriquece la respuesta incluyendo:\n"
+        "- Explicaciones conceptuales\n"
+        "- Contexto histórico\n"
+        "- Aplicaciones prácticas\n\n"
+        "- Si la respuesta incluye código, preséntalo en un bloque de código usando triple backticks (```)\n\n"
+        "Justo después de los backticks de apertura, indica el lenguaje de programación para que Telegram lo formatee correctamente.\n\n"
+        "Además, utiliza emojis para hacer la explicación más clara y amena, ayudando a destacar puntos importantes.\n\n"
+        "Por ejemplo:\n"
+        "```python\n"
+        "# tu código aquí\n"
+        "```\n"
+        "Respuesta:\n"
+    )
 
-    except Exception as e:
-        return f"⚠️ Error al generar respuesta para tu pregunta general: {str(e)}"
+    return {
+        "model": ANSWER_MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": "Eres un asistente especializado en Bioinformática. Responde de manera precisa y profesional.",
+                "name": "system",
+            },
+            {"role": "user", "content": prompt, "name": "User"},
+        ],
+        "temperature": 0.3,
+        "max_tokens": 1500,
+        "top_p": 0.9,
+    }
@@ -0,0 +1,244 @@
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import aiohttp
+from logger import ai_logger
+from ai_embedding.ai import (
+    ANSWER_MODEL,
+    API_ERROR_ANSWER,
+    NO_CONTEXT_ANSWER,
+    PROCESSING_ERROR_ANSWER,
+    build_answer_payload,
+    build_general_payload,
+    chat_content,
+    format_answer,
+    get_embedding_provider,
+    get_fireworks_client,
+    headers,
+    prepare_context,
+)
+from ai_embedding.embedding_pool import RETRYABLE_STATUS_CODES
+from ai_embedding.fireworks_client import CircuitOpenError
+from constants import ASYNC_HTTP_MAX_CONNECTIONS, CHAT_TIMEOUT, EMBEDDING_TIMEOUT
+
+# Sesión HTTP compartida por todas las corrutinas del bucle de eventos
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Devuelve la sesión aiohttp compartida, creándola la primera vez.
+
+    Debe llamarse desde el bucle de eventos del bot. La sesión reutiliza
+    las conexiones a la API y limita las simultáneas.
+    """
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            headers=headers,
+            connector=aiohttp.TCPConnector(limit=ASYNC_HTTP_MAX_CONNECTIONS),
+        )
+    return _session
+
+
+async def close_session() -> None:
+    """Cierra la sesión HTTP compartida."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def _classify_error(error: Exception) -> Tuple[bool, Optional[int], Optional[float]]:
+    """
+    Clasifica un error de aiohttp para la política de reintentos del cliente.
+
+    Returns:
+        tuple: (es transitorio, código HTTP, segundos de Retry-After)
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        retry_after = None
+        try:
+            retry_after = float((error.headers or {}).get("Retry-After"))
+        except (TypeError, ValueError):
+            pass
+        return error.status in RETRYABLE_STATUS_CODES, error.status, retry_after
+    return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError)), None, None
+
+
+async def _send(
+    endpoint: str,
+    payload: Dict[str, Any],
+    timeout: aiohttp.ClientTimeout,
+    stream: bool = False,
+) -> Any:
+    """
+    Envía una petición POST con los reintentos, el circuit breaker y las
+    métricas del FireworksClient compartido.
+
+    Args:
+        endpoint: "embeddings" o "chat"
+        payload: Cuerpo JSON de la petición
+        timeout: Timeout de aiohttp de cada intento
+        stream: Si es True se devuelve la respuesta abierta tras recibir la cabecera
+
+    Returns:
+        Any: Respuesta JSON o, con stream, la respuesta aiohttp (a cerrar por quien llama)
+
+    Raises:
+        CircuitOpenError: Si el circuito está abierto
+        aiohttp.ClientError, asyncio.TimeoutError: Si la petición falla tras los reintentos
+    """
+    client = get_fireworks_client()
+    attempt = 0
+    while True:
+        probe = client.before_attempt(endpoint)
+        start = time.perf_counter()
+        try:
+            response = await get_session().post(client.url(endpoint), json=payload, timeout=timeout)
+            response.raise_for_status()
+            if stream:
+                data = response
+            else:
+                async with response:
+                    data = await response.json()
+        except Exception as e:
+            retryable, status, retry_after = _classify_error(e)
+            delay = client.attempt_failed(
+                endpoint, e, time.perf_counter() - start, attempt, None, retryable, status, retry_after
+            )
+            if delay is None:
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # asyncio.CancelledError (timeout del llamante o cancelación)
+            client.attempt_cancelled(probe)
+            raise
+
+        client.attempt_succeeded(endpoint, time.perf_counter() - start)
+        return data
+
+
+async def _post_json(endpoint: str, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """Envía una petición POST a un endpoint ("embeddings" o "chat") y devuelve el JSON."""
+    return await _send(endpoint, payload, aiohttp.ClientTimeout(total=timeout))
+
+
+async def _complete_chat(
+    payload: Dict[str, Any],
+    on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> str:
+    """
+    Envía una petición de chat y devuelve el texto completo de la respuesta.
+
+    Con on_text la respuesta se pide en streaming: se leen los eventos SSE
+    conforme llegan y se espera on_text(texto acumulado) tras cada fragmento.
+    El timeout se aplica entonces a cada lectura y no a la respuesta entera,
+    y los reintentos solo hasta recibir la cabecera, como en chat_stream.
+    """
+    if on_text is None:
+        return chat_content(await _post_json("chat", payload, CHAT_TIMEOUT))
+
+    text = ""
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=CHAT_TIMEOUT)
+    response = await _send("chat", dict(payload, stream=True), timeout, stream=True)
+    async with response:
+        async for raw_line in response.content:
+            line = raw_line.decode("utf-8").strip()
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:") :].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                text += delta
+                await on_text(text)
+    return text
+
+
+async def embed_question_async(question: str) -> Optional[List[float]]:
+    """
+    Genera embedding para una pregunta sin bloquear el bucle de eventos.
+
+    Args:
+        question: Pregunta a convertir en embedding
+
+    Returns:
+        Optional[List[float]]: Embedding generado, o None si falla
+    """
+    try:
+        ai_logger.info(f"Generando embedding para pregunta {question}")
+        provider = get_embedding_provider()
+        if not provider.remote:
+            # Un modelo local ocupa la CPU: se ejecuta fuera del bucle de eventos
+            return await asyncio.get_running_loop().run_in_executor(
+                None, provider.embed_query, question
+            )
+        response_json = await _post_json(
+            "embeddings", provider.payload(question), EMBEDDING_TIMEOUT
+        )
+        return response_json["data"][0]["embedding"]
+    except Exception as e:
+        ai_logger.error(f"Error generando embedding para pregunta {question}: {e}")
+        return None
+
+
+async def generate_answer_async(
+    question: str,
+    context_chunks: List[Dict[str, Any]],
+    save_chunks: List[Dict[str, Any]],
+    model: str = ANSWER_MODEL,
+    on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+    question_embedding: Optional[List[float]] = None,
+) -> tuple:
+    """
+    Versión asíncrona de generate_answer, con el mismo prompt y formato.
+
+    Args:
+        on_text: Corrutina que recibe el texto acumulado en streaming (opcional)
+        question_embedding: Embedding de la pregunta, para elegir los pasajes del contexto
+
+    Returns:
+        tuple: (respuesta_formateada, referencias_detalladas)
+    """
+    try:
+        # La selección de pasajes puede pedir embeddings con el cliente síncrono
+        processed_chunks = await asyncio.get_running_loop().run_in_executor(
+            None, prepare_context, question, context_chunks, save_chunks, question_embedding
+        )
+        if not processed_chunks:
+            return NO_CONTEXT_ANSWER, []
+
+        payload = build_answer_payload(question, processed_chunks, model)
+        return format_answer(await _complete_chat(payload, on_text), processed_chunks)
+
+    except (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError) as e:
+        ai_logger.error(f"Error en la API: {str(e)}")
+        return API_ERROR_ANSWER, []
+    except Exception as e:
+        ai_logger.error(f"Error generando respuesta: {str(e)}")
+        return PROCESSING_ERROR_ANSWER, []
+
+
+async def answer_general_question_async(
+    pregunta: str, on_text: Optional[Callable[[str], Awaitable[None]]] = None
+) -> str:
+    """
+    Versión asíncrona de answer_general_question.
+
+    Args:
+        pregunta: La pregunta del usuario
+        on_text: Corrutina que recibe el texto acumulado en streaming (opcional)
+
+    Returns:
+        str: Respuesta formal a la pregunta general
+    """
+    try:
+        return await _complete_chat(build_general_payload(pregunta), on_text)
+    except Exception as e:
+        return f"⚠️ Error al generar respuesta para tu pregunta general: {str(e)}"
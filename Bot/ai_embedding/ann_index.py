@@ -0,0 +1,225 @@
+import os
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+from logger import data_logger
+
+# Filas procesadas por bloque al asignar vectores a listas
+ASSIGN_BLOCK = 65536
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """Devuelve una copia float32 con las filas normalizadas (las nulas quedan a cero)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, n_clusters: int, iterations: int = 15, seed: int = 0
+) -> np.ndarray:
+    """
+    K-means con similitud coseno sobre vectores normalizados.
+
+    Args:
+        vectors: Muestra de entrenamiento (n, d), normalizada
+        n_clusters: Número de centroides
+        iterations: Iteraciones de Lloyd
+        seed: Semilla para la inicialización
+
+    Returns:
+        np.ndarray: Centroides normalizados (n_clusters, d)
+    """
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=n_clusters)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+        sums = np.add.reduceat(vectors[order], starts, axis=0)
+
+        centroids[nonempty] = sums
+        # Los centroides vacíos se reinician en puntos aleatorios
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = _normalize(centroids)
+
+    return centroids
+
+
+class IVFFlatIndex:
+    """
+    Índice aproximado IVF-flat implementado en NumPy.
+
+    Los vectores se reparten en listas invertidas según su centroide más
+    cercano (k-means esférico). Una consulta solo examina las n_probe
+    listas más cercanas y puntúa esas filas de forma exacta sobre la matriz
+    original, que no se duplica: el índice guarda únicamente centroides,
+    el número de fila de cada vector agrupado por lista y el inverso de
+    las normas. Expone la misma interfaz search/size que CosineSearchEngine.
+    """
+
+    def __init__(self, n_lists: int = 0, n_probe: int = 8):
+        """
+        Args:
+            n_lists: Número de listas (0 = automático, ~2·sqrt(n))
+            n_probe: Listas examinadas por consulta
+        """
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.matrix = None
+        self.centroids = None
+        self.list_offsets = None
+        self.list_rows = None
+        self.inv_norms = None
+        self.size = 0
+        self.signature = ""
+
+    def build(
+        self,
+        matrix: np.ndarray,
+        valid: Optional[np.ndarray] = None,
+        points_per_list: int = 50,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> "IVFFlatIndex":
+        """
+        Entrena los centroides y asigna todas las filas válidas a su lista.
+
+        Args:
+            matrix: Matriz (n, d) de embeddings, una fila por chunk
+            valid: Máscara booleana de filas indexables
+            points_per_list: Filas de entrenamiento de k-means por lista
+            iterations: Iteraciones de k-means
+            seed: Semilla aleatoria
+        """
+        start_time = time.time()
+        self.matrix = matrix
+        norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix, dtype=np.float32))
+        usable = norms > 0
+        if valid is not None:
+            usable &= np.asarray(valid, dtype=bool)
+        self.inv_norms = np.zeros(len(norms), dtype=np.float32)
+        self.inv_norms[usable] = 1.0 / norms[usable]
+
+        rows = np.flatnonzero(usable)
+        self.size = len(rows)
+        if self.size == 0:
+            self.centroids = np.zeros((0, matrix.shape[1]), dtype=np.float32)
+            self.list_offsets = np.zeros(1, dtype=np.int64)
+            self.list_rows = np.zeros(0, dtype=np.int64)
+            return self
+
+        n_lists = self.n_lists or int(2 * np.sqrt(self.size))
+        n_lists = max(1, min(n_lists, self.size))
+
+        rng = np.random.default_rng(seed)
+        sample_rows = rows
+        sample_size = n_lists * points_per_list
+        if len(rows) > sample_size:
+            sample_rows = np.sort(rng.choice(rows, sample_size, replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+        sample *= self.inv_norms[sample_rows, None]
+        self.centroids = spherical_kmeans(sample, n_lists, iterations, seed)
+
+        self._set_lists(rows, self._assign(rows))
+        data_logger.info(
+            f"Índice IVF creado: {self.size} vectores en {len(self.centroids)} listas en {time.time() - start_time:.2f} segundos"
+        )
+        return self
+
+    def _assign(self, rows: np.ndarray) -> np.ndarray:
+        """Calcula la lista (centroide más cercano) de cada fila."""
+        assign = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), ASSIGN_BLOCK):
+            block = rows[start : start + ASSIGN_BLOCK]
+            vectors = np.asarray(self.matrix[block], dtype=np.float32)
+            assign[start : start + len(block)] = np.argmax(
+                vectors @ self.centroids.T, axis=1
+            )
+        return assign
+
+    def _set_lists(self, rows: np.ndarray, assign: np.ndarray) -> None:
+        """Agrupa las filas por lista en formato CSR (offsets + filas)."""
+        order = np.lexsort((rows, assign))
+        self.list_rows = rows[order].astype(np.int64)
+        counts = np.bincount(assign, minlength=len(self.centroids))
+        self.list_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+    def search(self, query, top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Devuelve las filas aproximadamente más similares a la consulta.
+
+        Returns:
+            List[Tuple[int, float]]: (fila, similitud coseno) de mayor a menor
+        """
+        if self.size == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return []
+        query = query / query_norm
+
+        n_probe = min(self.n_probe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        candidates = np.concatenate(
+            [
+                self.list_rows[self.list_offsets[i] : self.list_offsets[i + 1]]
+                for i in probe
+            ]
+        )
+        if len(candidates) == 0:
+            return []
+
+        # Leer las filas en orden creciente favorece el acceso secuencial al mmap
+        candidates.sort()
+        scores = np.asarray(self.matrix[candidates], dtype=np.float32) @ query
+        scores *= self.inv_norms[candidates]
+
+        k = min(top_k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(candidates[i]), float(scores[i])) for i in top]
+
+    def save(self, path: str) -> None:
+        """Guarda el índice (sin la matriz) en un archivo .npz de forma atómica."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                list_offsets=self.list_offsets,
+                list_rows=self.list_rows,
+                inv_norms=self.inv_norms,
+                n_probe=np.int64(self.n_probe),
+                signature=np.array(self.signature),
+            )
+        os.replace(tmp_path, path)
+        data_logger.info(f"Índice IVF guardado en {path}")
+
+    @classmethod
+    def load(cls, path: str, matrix: np.ndarray) -> "IVFFlatIndex":
+        """Carga un índice guardado y lo asocia a la matriz de embeddings."""
+        with np.load(path) as data:
+            index = cls(n_lists=len(data["centroids"]), n_probe=int(data["n_probe"]))
+            index.centroids = data["centroids"]
+            index.list_offsets = data["list_offsets"]
+            index.list_rows = data["list_rows"]
+            index.inv_norms = data["inv_norms"]
+            index.signature = str(data["signature"])
+        if len(index.inv_norms) != matrix.shape[0]:
+            raise ValueError(
+                f"El índice IVF cubre {len(index.inv_norms)} filas y la matriz tiene {matrix.shape[0]}"
+            )
+        index.matrix = matrix
+        index.size = len(index.list_rows)
+        return index
@@ -0,0 +1,188 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from logger import ai_logger
+from ai_embedding.checkpoint import chunk_key
+from ai_embedding.query_cache import normalize_query
+
+
+def chunk_signature(chunks: List[Dict[str, Any]]) -> Tuple[str, ...]:
+    """Identificador del conjunto de chunks recuperados, independiente del orden."""
+    return tuple(sorted(chunk_key(chunk) for chunk in chunks))
+
+
+class AnswerCache:
+    """
+    Caché de respuestas de generate_answer con búsqueda exacta y semántica.
+
+    La búsqueda exacta usa la pregunta normalizada y los chunks recuperados.
+    La semántica reutiliza la respuesta de una pregunta cuyo embedding tenga
+    una similitud coseno mayor o igual que el umbral con el de la nueva,
+    siempre que ambas hayan recuperado exactamente los mismos chunks. Las
+    entradas se desalojan por LRU y por antigüedad, y se descartan todas
+    cuando cambia el índice.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 24 * 3600,
+        similarity_threshold: float = 0.95,
+    ):
+        """
+        Args:
+            max_entries: Número máximo de respuestas en caché
+            ttl: Segundos de validez de cada respuesta
+            similarity_threshold: Similitud coseno mínima para la búsqueda semántica
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # clave -> (instante, embedding normalizado, respuesta, referencias)
+        self.entries = OrderedDict()
+        # firma de chunks -> claves de las entradas que la comparten
+        self.by_signature: Dict[Tuple[str, ...], set] = {}
+        self.index_version = None
+        self.lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        question: str,
+        question_embedding: Optional[List[float]],
+        chunks: List[Dict[str, Any]],
+    ) -> Optional[Tuple[str, List[str]]]:
+        """
+        Busca una respuesta en caché para la pregunta y los chunks recuperados.
+
+        Args:
+            question: Pregunta del usuario
+            question_embedding: Embedding de la pregunta (None = solo búsqueda exacta)
+            chunks: Chunks recuperados para la pregunta
+
+        Returns:
+            Optional[Tuple[str, List[str]]]: (respuesta, referencias) o None
+        """
+        signature = chunk_signature(chunks)
+        key = (normalize_query(question), signature)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[2], entry[3]
+            if entry is not None:
+                self._remove(key)
+
+            if question_embedding is not None:
+                match = self._semantic_match(signature, question_embedding, now)
+                if match is not None:
+                    self.entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    entry = self.entries[match]
+                    return entry[2], entry[3]
+
+            self.misses += 1
+            return None
+
+    def _semantic_match(
+        self, signature: Tuple[str, ...], question_embedding, now: float
+    ) -> Optional[tuple]:
+        """Clave de la entrada más parecida con la misma firma, si supera el umbral."""
+        keys = [
+            key
+            for key in self.by_signature.get(signature, ())
+            if now - self.entries[key][0] < self.ttl
+            and self.entries[key][1] is not None
+        ]
+        if not keys:
+            return None
+        query = _unit(question_embedding)
+        if query is None:
+            return None
+        cached = np.stack([self.entries[key][1] for key in keys])
+        scores = cached @ query
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity_threshold:
+            return keys[best]
+        return None
+
+    def put(
+        self,
+        question: str,
+        question_embedding: Optional[List[float]],
+        chunks: List[Dict[str, Any]],
+        answer: str,
+        references: List[str],
+    ) -> None:
+        """
+        Guarda una respuesta.
+
+        Las respuestas sin referencias corresponden a errores de la API o a
+        búsquedas sin resultados y no se guardan.
+        """
+        if not references:
+            return
+        signature = chunk_signature(chunks)
+        key = (normalize_query(question), signature)
+        embedding = _unit(question_embedding) if question_embedding is not None else None
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.time(), embedding, answer, references)
+            self.by_signature.setdefault(signature, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: tuple) -> None:
+        """Elimina una entrada y su referencia en el índice por firma."""
+        del self.entries[key]
+        keys = self.by_signature.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.by_signature[key[1]]
+
+    def set_index_version(self, version: Any) -> None:
+        """
+        Registra la versión del índice y vacía la caché si ha cambiado.
+
+        Args:
+            version: Identificador del índice (p. ej. la firma del almacén)
+        """
+        with self.lock:
+            if version == self.index_version:
+                return
+            dropped = len(self.entries)
+            self.entries.clear()
+            self.by_signature.clear()
+            self.index_version = version
+        if dropped:
+            ai_logger.info(f"Índice actualizado: {dropped} respuestas en caché descartadas")
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores de uso de la caché."""
+        with self.lock:
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+            }
+
+
+def _unit(vector) -> Optional[np.ndarray]:
+    """Vector float32 normalizado, o None si es nulo."""
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        return None
+    return vector / norm
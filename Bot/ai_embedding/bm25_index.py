@@ -0,0 +1,224 @@
+import heapq
+import math
+import os
+import pickle
+import re
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from logger import data_logger
+from ai_embedding.checkpoint import chunk_key
+from constants import BM25_B, BM25_INDEX_FILE, BM25_K1
+
+BM25_VERSION = 1
+
+# Palabras con guiones, puntos o dos puntos internos (BRCA1-Δ11, NM_000546.6,
+# bwa-mem, chr17:7668402) se indexan enteras y también por partes
+_TOKEN = re.compile(r"\w+(?:[-.:]\w+)*", re.UNICODE)
+_PART = re.compile(r"\w+", re.UNICODE)
+
+
+def _fold(text: str) -> str:
+    """Minúsculas y sin tildes, para que "proteína" y "proteina" coincidan."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Divide un texto en los términos del índice léxico.
+
+    Returns:
+        List[str]: Términos en orden de aparición (con repeticiones)
+    """
+    terms = []
+    for match in _TOKEN.finditer(_fold(text)):
+        token = match.group()
+        if len(token) > 1:
+            terms.append(token)
+        if _PART.fullmatch(token):
+            continue
+        terms.extend(part for part in _PART.findall(token) if len(part) > 1)
+    return terms
+
+
+class BM25Index:
+    """
+    Índice invertido BM25 sobre el texto de los bloques del almacén.
+
+    Complementa la búsqueda por embeddings con coincidencias exactas de
+    términos técnicos (nombres de genes, opciones de herramientas,
+    identificadores de secuencias) y responde sin llamar a la API. Las
+    listas de apariciones se indexan por el row_id estable de cada bloque,
+    así que se actualiza de forma incremental como el almacén.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        """
+        Args:
+            k1: Saturación de la frecuencia de cada término
+            b: Peso de la normalización por longitud del bloque
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}  # término -> {row_id: frecuencia}
+        self.doc_len: Dict[int, int] = {}  # row_id -> número de términos
+        self.doc_keys: Dict[int, str] = {}  # row_id -> chunk_key del bloque indexado
+        self.total_len = 0
+        self.chunks: Dict[int, Dict[str, Any]] = {}
+        self._norms: Optional[Dict[int, float]] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.doc_len)
+
+    def attach(self, chunks: List[Dict[str, Any]]) -> None:
+        """Asocia el índice a los bloques actuales para devolverlos en las búsquedas."""
+        self.chunks = {
+            chunk["row_id"]: chunk
+            for chunk in chunks
+            if "row_id" in chunk and not chunk.get("deleted")
+        }
+
+    def update(self, chunks: List[Dict[str, Any]]) -> bool:
+        """
+        Indexa los bloques nuevos y retira los eliminados.
+
+        Un row_id cuyo bloque ha cambiado (por ejemplo, si el almacén se ha
+        regenerado desde cero) se vuelve a indexar.
+
+        Args:
+            chunks: Bloques del almacén (con "row_id")
+
+        Returns:
+            bool: True si el índice ha cambiado
+        """
+        self.attach(chunks)
+        removed = {
+            row_id
+            for row_id, key in self.doc_keys.items()
+            if row_id not in self.chunks or chunk_key(self.chunks[row_id]) != key
+        }
+        added = [
+            row_id for row_id in self.chunks if row_id not in self.doc_keys or row_id in removed
+        ]
+        if not removed and not added:
+            return False
+
+        if removed:
+            for term in list(self.postings):
+                posting = self.postings[term]
+                for row_id in removed & posting.keys():
+                    del posting[row_id]
+                if not posting:
+                    del self.postings[term]
+            for row_id in removed:
+                self.total_len -= self.doc_len.pop(row_id)
+                del self.doc_keys[row_id]
+
+        for row_id in added:
+            chunk = self.chunks[row_id]
+            counts = Counter(tokenize(chunk.get("text", "")))
+            for term, count in counts.items():
+                self.postings.setdefault(term, {})[row_id] = count
+            length = sum(counts.values())
+            self.doc_len[row_id] = length
+            self.doc_keys[row_id] = chunk_key(chunk)
+            self.total_len += length
+
+        self._norms = None
+        data_logger.info(
+            f"Índice léxico actualizado: {len(added)} bloques añadidos, {len(removed)} eliminados, "
+            f"{self.size} en total, {len(self.postings)} términos"
+        )
+        return True
+
+    def search(self, query: str, top_k: int = 20) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Busca los bloques con mayor puntuación BM25 para los términos de la consulta.
+
+        Args:
+            query: Texto de la consulta
+            top_k: Número de resultados a retornar
+
+        Returns:
+            list: Pares (bloque, puntuación) ordenados por relevancia
+        """
+        terms = set(tokenize(query))
+        if not terms or not self.size:
+            return []
+        norms = self._length_norms()
+
+        scores: Dict[int, float] = {}
+        n = self.size
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for row_id, tf in posting.items():
+                scores[row_id] = scores.get(row_id, 0.0) + idf * tf * (self.k1 + 1) / (
+                    tf + norms[row_id]
+                )
+
+        best = heapq.nlargest(
+            top_k,
+            ((score, row_id) for row_id, score in scores.items() if row_id in self.chunks),
+        )
+        return [(self.chunks[row_id], score) for score, row_id in best]
+
+    def _length_norms(self) -> Dict[int, float]:
+        """Término k1·(1 - b + b·longitud/longitud media) de cada bloque."""
+        if self._norms is None:
+            avg_len = self.total_len / self.size if self.size else 1.0
+            self._norms = {
+                row_id: self.k1 * (1 - self.b + self.b * length / (avg_len or 1.0))
+                for row_id, length in self.doc_len.items()
+            }
+        return self._norms
+
+    def save(self, path: str = BM25_INDEX_FILE) -> None:
+        """Guarda el índice de forma atómica."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {
+                    "version": BM25_VERSION,
+                    "postings": self.postings,
+                    "doc_len": self.doc_len,
+                    "doc_keys": self.doc_keys,
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, path)
+        data_logger.info(f"Índice léxico guardado en {path} ({self.size} bloques)")
+
+    @classmethod
+    def load(cls, path: str = BM25_INDEX_FILE) -> Optional["BM25Index"]:
+        """
+        Carga el índice guardado.
+
+        Returns:
+            Optional[BM25Index]: None si no existe o es de otra versión
+        """
+        if not os.path.exists(path):
+            return None
+        start_time = time.time()
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") != BM25_VERSION:
+            data_logger.info("El índice léxico es de otra versión, se reconstruye")
+            return None
+        index = cls()
+        index.postings = data["postings"]
+        index.doc_len = data["doc_len"]
+        index.doc_keys = data["doc_keys"]
+        index.total_len = sum(index.doc_len.values())
+        data_logger.info(
+            f"Índice léxico cargado: {index.size} bloques en {time.time() - start_time:.2f} segundos"
+        )
+        return index
@@ -0,0 +1,249 @@
+import json
+import os
+import pickle
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+from logger import data_logger
+from ai_embedding.embedding_cache import text_hash
+
+CHECKPOINT_VERSION = 1
+
+
+def chunk_key(chunk: Dict[str, Any]) -> str:
+    """Clave estable de un chunk: documento (por contenido) y número de bloque."""
+    content_hash = chunk.get("content_hash") or text_hash(chunk.get("text", ""))
+    return f"{content_hash}:{chunk.get('chunk_id', '')}"
+
+
+class EmbeddingCheckpoint:
+    """
+    Registro append-only de los embeddings generados durante una ingesta.
+
+    Cada embedding se añade al registro en cuanto llega de la API y se
+    fuerza a disco periódicamente, de modo que una interrupción solo pierde
+    los últimos segundos de trabajo. Al reanudar, restore() reasigna los
+    embeddings registrados a los chunks recién extraídos. El registro se
+    elimina cuando el almacén definitivo se ha guardado.
+
+    El registro empieza con una cabecera con el modelo y las dimensiones de
+    sus embeddings: un registro de otro modelo se descarta entero y los
+    embeddings con otras dimensiones se ignoran.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        model: Optional[str] = None,
+        flush_every: int = 64,
+        flush_interval: float = 5.0,
+    ):
+        """
+        Args:
+            path: Ruta del archivo de registro
+            model: Identidad del modelo de los embeddings (None = no se comprueba)
+            flush_every: Registros entre cada sincronización con disco
+            flush_interval: Segundos máximos entre sincronizaciones
+        """
+        self.path = path
+        self.model = model
+        self.dimensions = None
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.file = None
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+    def load(self) -> Dict[str, np.ndarray]:
+        """
+        Lee los embeddings registrados.
+
+        Un registro final incompleto (por ejemplo, tras un corte de
+        corriente) se descarta sin afectar a los anteriores.
+        """
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, "rb") as f:
+            header = self._read_header(f)
+            if header is None:
+                return records
+            dimensions = header["dimensions"]
+            rejected = 0
+            while True:
+                try:
+                    key, blob = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception as e:
+                    data_logger.warning(f"Registro incompleto al final del checkpoint: {e}")
+                    break
+                embedding = np.frombuffer(blob, dtype=np.float32)
+                if len(embedding) != dimensions:
+                    rejected += 1
+                    continue
+                records[key] = embedding
+        if rejected:
+            data_logger.warning(
+                f"Checkpoint: {rejected} embeddings descartados por no tener {dimensions} dimensiones"
+            )
+        return records
+
+    def _read_header(self, f) -> Optional[Dict[str, Any]]:
+        """
+        Lee la cabecera del registro.
+
+        Returns:
+            Optional[Dict]: None si falta, es de otra versión o de otro modelo
+        """
+        try:
+            header = pickle.load(f)
+        except Exception:
+            return None
+        if not isinstance(header, dict) or header.get("version") != CHECKPOINT_VERSION:
+            data_logger.info("Checkpoint sin cabecera o de otra versión: se descarta")
+            return None
+        if self.model is not None and header.get("model") != self.model:
+            data_logger.info(
+                f"Checkpoint de otro modelo ({header.get('model')}): se descarta"
+            )
+            return None
+        return header
+
+    def restore(self, chunks: List[Dict[str, Any]]) -> int:
+        """
+        Asigna a los chunks sin embedding los que ya estaban en el registro.
+
+        Returns:
+            int: Número de embeddings recuperados
+        """
+        records = self.load()
+        if not records:
+            return 0
+        restored = 0
+        for chunk in chunks:
+            if "embedding" in chunk:
+                continue
+            embedding = records.get(chunk_key(chunk))
+            if embedding is not None:
+                chunk["embedding"] = embedding.tolist()
+                restored += 1
+        data_logger.info(
+            f"Checkpoint: {restored} embeddings recuperados de una ingesta interrumpida"
+        )
+        return restored
+
+    def append(self, chunk: Dict[str, Any], embedding: List[float]) -> None:
+        """Añade un embedding al registro."""
+        if self.file is None:
+            self._open(len(embedding))
+        if len(embedding) != self.dimensions:
+            raise ValueError(
+                f"Embedding de {len(embedding)} dimensiones en un checkpoint de {self.dimensions}"
+            )
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        pickle.dump((chunk_key(chunk), blob), self.file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.unflushed += 1
+        if (
+            self.unflushed >= self.flush_every
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def _open(self, dimensions: int) -> None:
+        """
+        Abre el registro para añadir embeddings: continúa el existente si es
+        del mismo modelo y dimensiones y, si no, lo reemplaza.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        header = None
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                header = self._read_header(f)
+        if header is not None and header["dimensions"] == dimensions:
+            self.file = open(self.path, "ab")
+        else:
+            self.file = open(self.path, "wb")
+            pickle.dump(
+                {"version": CHECKPOINT_VERSION, "model": self.model, "dimensions": dimensions},
+                self.file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        self.dimensions = dimensions
+
+    def flush(self) -> None:
+        """Fuerza los registros pendientes a disco."""
+        if self.file is None or self.unflushed == 0:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """Sincroniza y cierra el registro, conservándolo en disco."""
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def clear(self) -> None:
+        """Elimina el registro una vez que el almacén definitivo está guardado."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def load_failed_chunks(path: str) -> Dict[str, Dict[str, Any]]:
+    """Carga el registro de chunks cuyo embedding falló."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        data_logger.error(f"Error cargando {path}: {e}")
+        return {}
+
+
+def save_failed_chunks(path: str, failed: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Registra los chunks que siguen sin embedding tras un intento de generación.
+
+    Como cada ingesta reintenta todos los chunks sin embedding, el registro
+    se reescribe con los fallos actuales; los que ya tienen embedding o
+    pertenecen a documentos eliminados desaparecen, y los que siguen
+    fallando acumulan intentos.
+
+    Args:
+        path: Ruta del registro
+        failed: Chunks que siguen sin embedding
+
+    Returns:
+        Dict: Registro {clave: {"document", "chunk_id", "attempts", "last_attempt"}}
+    """
+    previous = load_failed_chunks(path)
+    now = time.time()
+    records = {}
+    for chunk in failed:
+        key = chunk_key(chunk)
+        records[key] = {
+            "document": chunk.get("document"),
+            "chunk_id": chunk.get("chunk_id"),
+            "attempts": previous.get(key, {}).get("attempts", 0) + 1,
+            "last_attempt": now,
+        }
+
+    if not records and not previous:
+        return records
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, indent=1)
+    os.replace(tmp_path, path)
+    if records:
+        data_logger.warning(
+            f"{len(records)} chunks sin embedding registrados en {path} para reintento"
+        )
+    return records
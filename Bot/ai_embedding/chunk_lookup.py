@@ -0,0 +1,110 @@
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+from logger import data_logger
+from ai_embedding.checkpoint import chunk_key
+
+# Filas procesadas por bloque al construir el mapa de vectores
+HASH_BLOCK = 65536
+
+
+class ChunkLookup:
+    """
+    Resolución de identificadores y vectores a sus chunks.
+
+    Los chunks se identifican por su clave estable (chunk_key). Para los
+    vectores se usa primero un mapa exacto de los bytes float32 de cada
+    fila y, si no hay coincidencia exacta, una única operación vectorizada
+    sobre la matriz de embeddings que devuelve la fila más cercana en
+    distancia euclídea. El mapa y las normas se calculan al primer uso.
+    """
+
+    def __init__(
+        self,
+        chunks: List[Dict[str, Any]],
+        matrix: Optional[np.ndarray] = None,
+        valid: Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            chunks: Lista de chunks, en el orden de las filas de la matriz
+            matrix: Matriz (n, d) de embeddings (None = se construye desde los chunks)
+            valid: Máscara de filas con embedding
+        """
+        self.chunks = chunks
+        self.matrix = matrix
+        self.valid = valid
+        self.by_key = {
+            chunk_key(chunk): row
+            for row, chunk in enumerate(chunks)
+            if not chunk.get("deleted")
+        }
+        self.by_vector = None
+        self.sq_norms = None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Devuelve el chunk con la clave indicada, o None."""
+        row = self.by_key.get(key)
+        return self.chunks[row] if row is not None else None
+
+    def resolve_vector(self, vector) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve el chunk cuyo embedding coincide con el vector, o el más cercano.
+
+        Args:
+            vector: Embedding (lista o array)
+
+        Returns:
+            Optional[Dict[str, Any]]: Chunk correspondiente, o None si no hay embeddings
+        """
+        self._prepare()
+        if self.sq_norms is None:
+            return None
+        query = np.ascontiguousarray(vector, dtype=np.float32).ravel()
+        if query.shape[0] != self.matrix.shape[1]:
+            return None
+
+        row = self.by_vector.get(query.tobytes())
+        if row is None:
+            # ||m - q||² = ||m||² - 2·m·q + ||q||²; el último término no cambia el argmin
+            distances = self.sq_norms - 2.0 * (self.matrix @ query)
+            row = int(np.argmin(distances))
+        return self.chunks[row]
+
+    def _prepare(self) -> None:
+        """Construye la matriz (si hace falta), el mapa de vectores y las normas."""
+        if self.by_vector is not None:
+            return
+        start_time = time.time()
+        if self.matrix is None:
+            self._matrix_from_chunks()
+        valid = self.valid if self.valid is not None else np.ones(len(self.chunks), dtype=bool)
+        rows = np.flatnonzero(valid)
+
+        self.by_vector = {}
+        if len(rows) == 0 or self.matrix.shape[1] == 0:
+            return
+        # Las filas sin embedding nunca son las más cercanas
+        sq_norms = np.full(len(self.chunks), np.inf, dtype=np.float32)
+        for start in range(0, len(rows), HASH_BLOCK):
+            block_rows = rows[start : start + HASH_BLOCK]
+            block = np.ascontiguousarray(self.matrix[block_rows], dtype=np.float32)
+            sq_norms[block_rows] = np.einsum("ij,ij->i", block, block)
+            for row, vector in zip(block_rows, block):
+                self.by_vector.setdefault(vector.tobytes(), int(row))
+        self.sq_norms = sq_norms
+        data_logger.info(
+            f"Mapa de vectores a chunks creado con {len(self.by_vector)} entradas en {time.time() - start_time:.2f} segundos"
+        )
+
+    def _matrix_from_chunks(self) -> None:
+        """Reúne en una matriz float32 los embeddings que llevan los chunks."""
+        dimensions = next(
+            (len(chunk["embedding"]) for chunk in self.chunks if "embedding" in chunk), 0
+        )
+        self.matrix = np.zeros((len(self.chunks), dimensions), dtype=np.float32)
+        self.valid = np.zeros(len(self.chunks), dtype=bool)
+        for row, chunk in enumerate(self.chunks):
+            if "embedding" in chunk:
+                self.matrix[row] = chunk["embedding"]
+                self.valid[row] = True
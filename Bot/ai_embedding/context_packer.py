@@ -0,0 +1,333 @@
+import bisect
+import math
+import re
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from logger import ai_logger
+from constants import CONTEXT_PASSAGE_CHARS, CONTEXT_TOKEN_BUDGET
+
+# Caracteres por token aproximados para texto en español e inglés
+CHARS_PER_TOKEN = 4
+# Solapamiento entre bloques consecutivos de iter_text_blocks
+BLOCK_OVERLAP = 500
+# Tamaño de los n-gramas de palabras usados para detectar texto repetido
+SHINGLE_SIZE = 6
+# Fracción de n-gramas ya vistos a partir de la cual un pasaje es redundante
+REDUNDANCY_THRESHOLD = 0.8
+
+# Fin de frase o de párrafo: puntos de corte preferidos para los pasajes
+_BOUNDARY = re.compile(r"[.!?…][\"'»)\]]*\s+|\n\s*\n")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación del número de tokens de un texto."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _block_number(chunk: Dict[str, Any]) -> Optional[int]:
+    """Número de bloque de un chunk de iter_text_blocks ("Block-N")."""
+    chunk_id = str(chunk.get("chunk_id", ""))
+    if chunk_id.startswith("Block-") and chunk_id[6:].isdigit():
+        return int(chunk_id[6:])
+    return None
+
+
+def _passage_pages(chunk: Dict[str, Any], start: int, end: int) -> List[int]:
+    """Páginas de un chunk que se solapan con el tramo [start, end) de su texto."""
+    pages = chunk.get("pages") or []
+    offsets = chunk.get("page_offsets")
+    if not offsets or len(offsets) != len(pages):
+        return list(pages)
+    first = max(bisect.bisect_right(offsets, start) - 1, 0)
+    last = max(bisect.bisect_left(offsets, end), first + 1)
+    return list(pages[first:last])
+
+
+def _passage_end(text: str, start: int, max_chars: int) -> int:
+    """Final del pasaje que empieza en start: el último fin de frase que cabe, o un espacio."""
+    limit = start + max_chars
+    if limit >= len(text):
+        return len(text)
+    end = None
+    for match in _BOUNDARY.finditer(text, start, limit):
+        end = match.end()
+    if end is None or end - start < max_chars // 4:
+        space = text.rfind(" ", start + max_chars // 2, limit)
+        end = space + 1 if space > 0 else limit
+    return end
+
+
+def split_passages(
+    chunk: Dict[str, Any], max_chars: int = CONTEXT_PASSAGE_CHARS, skip: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Divide el texto de un chunk en pasajes cortados en finales de frase.
+
+    Args:
+        chunk: Chunk con "text", "document" y "pages"
+        max_chars: Tamaño máximo de cada pasaje
+        skip: Caracteres iniciales a omitir (solapamiento con el bloque anterior)
+
+    Returns:
+        List[Dict[str, Any]]: Pasajes con su texto, documento, páginas y posición
+    """
+    text = chunk.get("text", "")
+    passages = []
+    start = skip
+    while start < len(text):
+        end = _passage_end(text, start, max_chars)
+        passage = make_passage(chunk, start, end)
+        if passage["text"]:
+            passages.append(passage)
+        start = end
+    return passages
+
+
+def make_passage(chunk: Dict[str, Any], start: int, end: int) -> Dict[str, Any]:
+    """Pasaje con el tramo [start, end) del texto de un chunk, su documento y sus páginas."""
+    return {
+        "text": chunk.get("text", "")[start:end].strip(),
+        "document": chunk.get("document", ""),
+        "pages": _passage_pages(chunk, start, end),
+        "chunk_id": chunk.get("chunk_id"),
+        "content_hash": chunk.get("content_hash"),
+        "start": start,
+        "end": end,
+    }
+
+
+def _overlap_to_skip(chunk: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> int:
+    """Caracteres del inicio del bloque que ya están al final del bloque anterior."""
+    if previous is None:
+        return 0
+    overlap = min(BLOCK_OVERLAP, len(previous.get("text", "")), len(chunk.get("text", "")))
+    if overlap and chunk["text"][:overlap] == previous["text"][-overlap:]:
+        return overlap
+    return 0
+
+
+def collect_passages(
+    chunks: Sequence[Dict[str, Any]], max_chars: int = CONTEXT_PASSAGE_CHARS
+) -> List[Dict[str, Any]]:
+    """
+    Divide los chunks recuperados en pasajes sin el texto de los solapamientos.
+
+    Cuando dos bloques consecutivos del mismo documento están entre los
+    recuperados, el comienzo del segundo repite el final del primero y se omite.
+    """
+    by_block = {}
+    for chunk in chunks:
+        number = _block_number(chunk)
+        if number is not None:
+            by_block[(chunk.get("content_hash") or chunk.get("document"), number)] = chunk
+
+    passages = []
+    for rank, chunk in enumerate(chunks):
+        number = _block_number(chunk)
+        key = chunk.get("content_hash") or chunk.get("document")
+        previous = by_block.get((key, number - 1)) if number is not None else None
+        for passage in split_passages(chunk, max_chars, _overlap_to_skip(chunk, previous)):
+            passage["rank"] = rank
+            passages.append(passage)
+    return passages
+
+
+def _shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def lexical_scores(question: str, passages: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """
+    Puntuación léxica de los pasajes (TF-IDF de los términos de la pregunta).
+
+    Se usa cuando no hay embeddings disponibles para la pregunta o los pasajes.
+    """
+    terms = {word for word in _WORD.findall(question.lower()) if len(word) > 2}
+    if not terms or not passages:
+        return np.zeros(len(passages), dtype=np.float32)
+    counts = [Counter(_WORD.findall(passage["text"].lower())) for passage in passages]
+    n = len(passages)
+    scores = np.zeros(n, dtype=np.float32)
+    for term in terms:
+        df = sum(1 for count in counts if term in count)
+        if not df:
+            continue
+        idf = math.log(1 + n / df)
+        for i, count in enumerate(counts):
+            if term in count:
+                scores[i] += (1 + math.log(count[term])) * idf
+    return scores
+
+
+def chunk_similarities(
+    chunks: Sequence[Dict[str, Any]], question_embedding: Optional[Sequence[float]]
+) -> Optional[np.ndarray]:
+    """
+    Similitud coseno de la pregunta con el embedding ya guardado de cada chunk.
+
+    Returns:
+        Optional[np.ndarray]: Una similitud por chunk (0 en los que no tienen
+            embedding), o None si no hay embedding de la pregunta ni de ningún chunk
+    """
+    if question_embedding is None:
+        return None
+    query = np.asarray(question_embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query) or 1.0
+    similarities = np.zeros(len(chunks), dtype=np.float32)
+    found = False
+    for i, chunk in enumerate(chunks):
+        vector = chunk.get("embedding")
+        if vector is None or len(vector) != len(query):
+            continue
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            similarities[i] = float(vector @ query) / (norm * query_norm)
+            found = True
+    return similarities if found else None
+
+
+def score_passages(
+    question: str,
+    passages: Sequence[Dict[str, Any]],
+    question_embedding: Optional[Sequence[float]] = None,
+    embed_texts: Optional[Callable[[List[str]], List[Optional[List[float]]]]] = None,
+    chunk_scores: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, str]:
+    """
+    Puntúa los pasajes frente a la pregunta.
+
+    Sin embed_texts no se hace ninguna llamada a la API: la puntuación léxica
+    (normalizada a [0, 1]) se suma a la similitud del chunk de origen
+    calculada con su embedding guardado (chunk_scores). Con embed_texts y el
+    embedding de la pregunta se usa la similitud coseno de cada pasaje.
+
+    Args:
+        question: Pregunta del usuario
+        passages: Pasajes a puntuar
+        question_embedding: Embedding de la pregunta
+        embed_texts: Función que devuelve los embeddings de una lista de textos
+            (None en los que fallen)
+        chunk_scores: Similitud de la pregunta con cada chunk, indexada por el
+            "rank" de los pasajes
+
+    Returns:
+        Tuple: (puntuaciones, "embeddings", "léxica + chunk" o "léxica" según el método usado)
+    """
+    if question_embedding is not None and embed_texts is not None and passages:
+        try:
+            vectors = embed_texts([passage["text"] for passage in passages])
+            if all(vector is not None for vector in vectors):
+                matrix = np.asarray(vectors, dtype=np.float32)
+                query = np.asarray(question_embedding, dtype=np.float32)
+                norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+                return (matrix @ query) / np.where(norms > 0, norms, 1.0), "embeddings"
+            ai_logger.warning("Faltan embeddings de pasajes; se usa puntuación léxica")
+        except Exception as e:
+            ai_logger.warning(f"Error puntuando pasajes con embeddings, se usa puntuación léxica: {e}")
+
+    scores = lexical_scores(question, passages)
+    if chunk_scores is None or not passages:
+        return scores, "léxica"
+    peak = scores.max()
+    if peak > 0:
+        scores = scores / peak
+    ranks = np.array([passage["rank"] for passage in passages], dtype=np.int64)
+    return scores + chunk_scores[ranks], "léxica + chunk"
+
+
+def _merge_sections(selected: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Une los pasajes contiguos del mismo bloque en una sola sección."""
+    sections = []
+    for passage in selected:
+        last = sections[-1] if sections else None
+        if (
+            last
+            and last["document"] == passage["document"]
+            and last["chunk_id"] == passage["chunk_id"]
+            and last["end"] == passage["start"]
+        ):
+            last["text"] += " " + passage["text"]
+            last["end"] = passage["end"]
+            last["pages"] = sorted(set(last["pages"]) | set(passage["pages"]))
+        else:
+            sections.append(dict(passage))
+    return sections
+
+
+def pack_context(
+    question: str,
+    chunks: Sequence[Dict[str, Any]],
+    question_embedding: Optional[Sequence[float]] = None,
+    embed_texts: Optional[Callable[[List[str]], List[Optional[List[float]]]]] = None,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    max_chars: int = CONTEXT_PASSAGE_CHARS,
+) -> List[Dict[str, Any]]:
+    """
+    Selecciona los pasajes más relevantes de los chunks hasta llenar el presupuesto de tokens.
+
+    Los chunks recuperados se dividen en pasajes, se descarta el texto
+    repetido de los solapamientos, se puntúa cada pasaje frente a la
+    pregunta y se toman los mejores mientras quepan en token_budget. Los
+    pasajes elegidos se devuelven en el orden del documento, agrupados en
+    secciones con el mismo formato que un chunk ("document", "pages",
+    "text"), de modo que conservan la atribución a documento y páginas.
+
+    Args:
+        question: Pregunta del usuario
+        chunks: Chunks recuperados, de más a menos relevante
+        question_embedding: Embedding de la pregunta (sin él se puntúa por términos)
+        embed_texts: Función que devuelve los embeddings de una lista de textos;
+            si se indica, cada pasaje se puntúa con su propio embedding (una
+            llamada a la API por consulta para los pasajes que no estén en caché)
+        token_budget: Tokens máximos del contexto (0 = sin límite, chunks completos)
+        max_chars: Tamaño máximo de cada pasaje
+
+    Returns:
+        List[Dict[str, Any]]: Secciones de contexto
+    """
+    original_tokens = sum(estimate_tokens(chunk.get("text", "")) for chunk in chunks)
+    if token_budget <= 0 or original_tokens <= token_budget:
+        return list(chunks)
+
+    start_time = time.perf_counter()
+    passages = collect_passages(chunks, max_chars)
+    scores, method = score_passages(
+        question,
+        passages,
+        question_embedding,
+        embed_texts,
+        chunk_similarities(chunks, question_embedding),
+    )
+
+    selected = []
+    seen = set()
+    used_tokens = 0
+    for i in np.argsort(-scores, kind="stable"):
+        passage = passages[int(i)]
+        tokens = estimate_tokens(passage["text"])
+        if used_tokens + tokens > token_budget and selected:
+            continue
+        shingles = _shingles(passage["text"])
+        if shingles and len(shingles & seen) >= REDUNDANCY_THRESHOLD * len(shingles):
+            continue
+        selected.append(passage)
+        seen |= shingles
+        used_tokens += tokens
+
+    # Orden de lectura: por relevancia del chunk de origen y posición en el texto
+    selected.sort(key=lambda passage: (passage["rank"], passage["start"]))
+    sections = _merge_sections(selected)
+
+    ai_logger.info(
+        f"Contexto empaquetado ({method}): {len(selected)}/{len(passages)} pasajes, "
+        f"{used_tokens} tokens de {original_tokens} ({original_tokens - used_tokens} ahorrados) "
+        f"en {time.perf_counter() - start_time:.2f} segundos"
+    )
+    return sections
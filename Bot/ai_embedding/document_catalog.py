@@ -0,0 +1,253 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+from logger import data_logger
+from ai_embedding.manifest import file_sha256, hash_documents, load_manifest
+from ai_embedding.pdf_workers import count_pdf_pages
+from constants import CATALOG_POLL_INTERVAL, DOCUMENTS_FOLDER, MANIFEST_FILE
+
+
+def pretty_document_name(path: str) -> str:
+    """Nombre legible de un documento a partir de su ruta."""
+    return os.path.basename(path).replace(".pdf", "").replace("_", " ")
+
+
+class DocumentCatalog:
+    """
+    Catálogo en memoria de los PDFs de la biblioteca.
+
+    Guarda por documento su ruta, nombre legible, carpeta de categoría,
+    tamaño, número de páginas y hash de contenido, con diccionarios para
+    resolver nombres, categorías y hashes sin tocar el disco. Los hashes y
+    las páginas se reutilizan del manifiesto de ingesta.
+
+    Para detectar cambios no se recorre la biblioteca entera: se guarda la
+    fecha de modificación de cada carpeta y, como mucho una vez cada
+    poll_interval segundos, solo se vuelven a listar las carpetas cuya
+    fecha ha cambiado (al añadir, borrar o renombrar archivos).
+    """
+
+    def __init__(
+        self,
+        folder: str = DOCUMENTS_FOLDER,
+        manifest_path: str = MANIFEST_FILE,
+        poll_interval: float = CATALOG_POLL_INTERVAL,
+    ):
+        """
+        Args:
+            folder: Carpeta raíz de los documentos
+            manifest_path: Manifiesto de ingesta del que reutilizar hashes y páginas
+            poll_interval: Segundos mínimos entre comprobaciones de cambios
+        """
+        self.folder = folder
+        self.manifest_path = manifest_path
+        self.poll_interval = poll_interval
+        self.documents: Dict[str, Dict[str, Any]] = {}  # ruta relativa -> documento
+        self.by_name: Dict[str, str] = {}  # nombre legible -> ruta relativa
+        self.by_category: Dict[str, List[str]] = {}  # categoría -> rutas relativas
+        self.by_hash: Dict[str, str] = {}  # hash de contenido -> ruta relativa
+        self._dirs: Dict[str, tuple] = {}  # carpeta -> (mtime_ns, PDFs, subcarpetas)
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        self.refresh(force=True)
+
+    def get(self, rel_path: str) -> Optional[Dict[str, Any]]:
+        """Devuelve el documento con la ruta relativa indicada, o None."""
+        return self.documents.get(rel_path)
+
+    def find_by_name(self, pretty_name: str) -> Optional[Dict[str, Any]]:
+        """Devuelve el documento con el nombre legible indicado, o None."""
+        rel_path = self.by_name.get(pretty_name)
+        return self.documents.get(rel_path) if rel_path else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Devuelve el documento con el hash de contenido indicado, o None."""
+        rel_path = self.by_hash.get(content_hash)
+        return self.documents.get(rel_path) if rel_path else None
+
+    def list_category(self, category: str) -> List[Dict[str, Any]]:
+        """Documentos de una carpeta de categoría, ordenados por nombre."""
+        return [self.documents[rel_path] for rel_path in self.by_category.get(category, [])]
+
+    def page_count(self, rel_path: str) -> Optional[int]:
+        """Número de páginas de un documento; se cuenta la primera vez si el manifiesto no lo tiene."""
+        document = self.documents.get(rel_path)
+        if document is None:
+            return None
+        if document["pages"] is None:
+            try:
+                document["pages"] = count_pdf_pages(document["path"])
+            except Exception as e:
+                data_logger.warning(f"No se pudieron contar las páginas de {rel_path}: {e}")
+        return document["pages"]
+
+    def verify(self, rel_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Comprueba que un documento sigue igual en disco antes de usarlo.
+
+        Si el tamaño o la fecha de modificación han cambiado se recalcula su
+        hash; si el archivo ya no existe se retira del catálogo.
+
+        Returns:
+            Optional[Dict[str, Any]]: Documento actualizado, o None si no existe
+        """
+        with self._lock:
+            document = self.documents.get(rel_path)
+            path = document["path"] if document else os.path.join(self.folder, rel_path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                if document:
+                    self._remove(path)
+                    self._reindex()
+                return None
+            if document and (document["size"], document["mtime"]) == (
+                stat.st_size,
+                stat.st_mtime,
+            ):
+                return document
+            if not path.lower().endswith(".pdf") or not self._inside_folder(path):
+                return None
+
+            data_logger.info(f"Documento modificado en disco, actualizando catálogo: {rel_path}")
+            self.documents[rel_path] = self._make_entry(
+                path,
+                {"hash": file_sha256(path), "size": stat.st_size, "mtime": stat.st_mtime},
+                None,
+            )
+            self._reindex()
+            return self.documents[rel_path]
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Incorpora los PDFs añadidos, borrados o modificados desde la última comprobación.
+
+        Args:
+            force: Comprobar aunque no haya pasado poll_interval
+
+        Returns:
+            bool: True si el catálogo ha cambiado
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.poll_interval:
+            return False
+
+        with self._lock:
+            self._checked_at = now
+            start_time = time.time()
+            added, removed = set(), set()
+            self._scan_dir(self.folder, added, removed)
+            if not added and not removed:
+                return False
+
+            for path in removed:
+                self._remove(path)
+            if added:
+                manifest = load_manifest(self.manifest_path)
+                for path, info in hash_documents(sorted(added), manifest).items():
+                    entry = self._make_entry(path, info, manifest.get(info["hash"]))
+                    self.documents[entry["rel_path"]] = entry
+            self._reindex()
+
+            data_logger.info(
+                f"Catálogo de documentos actualizado: {len(added)} añadidos o modificados, "
+                f"{len(removed - added)} eliminados, {len(self.documents)} en total "
+                f"({time.time() - start_time:.2f} segundos)"
+            )
+            return True
+
+    def _scan_dir(self, directory: str, added: Set[str], removed: Set[str]) -> None:
+        """Vuelve a listar la carpeta si su fecha ha cambiado y revisa sus subcarpetas."""
+        try:
+            stat = os.stat(directory)
+        except OSError:
+            self._forget_dir(directory, removed)
+            return
+
+        known = self._dirs.get(directory)
+        if known and known[0] == stat.st_mtime_ns:
+            for subdir in known[2]:
+                self._scan_dir(subdir, added, removed)
+            return
+
+        pdfs, subdirs = set(), set()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        subdirs.add(entry.path)
+                    elif entry.name.lower().endswith(".pdf"):
+                        pdfs.add(entry.path)
+        except OSError as e:
+            data_logger.error(f"No se pudo listar {directory}: {e}")
+            return
+
+        old_pdfs, old_subdirs = (known[1], known[2]) if known else (set(), set())
+        removed.update(old_pdfs - pdfs)
+        added.update(pdfs - old_pdfs)
+        # Un archivo reemplazado por otro con el mismo nombre también cambia la carpeta
+        for path in pdfs & old_pdfs:
+            document = self.documents.get(os.path.relpath(path, self.folder))
+            try:
+                file_stat = os.stat(path)
+            except OSError:
+                continue
+            if document and (document["size"], document["mtime"]) != (
+                file_stat.st_size,
+                file_stat.st_mtime,
+            ):
+                added.add(path)
+
+        for subdir in old_subdirs - subdirs:
+            self._forget_dir(subdir, removed)
+        self._dirs[directory] = (stat.st_mtime_ns, pdfs, subdirs)
+        for subdir in subdirs:
+            self._scan_dir(subdir, added, removed)
+
+    def _forget_dir(self, directory: str, removed: Set[str]) -> None:
+        """Olvida una carpeta desaparecida y marca sus PDFs como eliminados."""
+        known = self._dirs.pop(directory, None)
+        if not known:
+            return
+        removed.update(known[1])
+        for subdir in known[2]:
+            self._forget_dir(subdir, removed)
+
+    def _inside_folder(self, path: str) -> bool:
+        """Evita resolver rutas que salen de la carpeta de documentos."""
+        folder = os.path.realpath(self.folder)
+        return os.path.commonpath([folder, os.path.realpath(path)]) == folder
+
+    def _make_entry(
+        self, path: str, info: Dict[str, Any], manifest_entry: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Crea la ficha de un documento."""
+        rel_path = os.path.relpath(path, self.folder)
+        parts = rel_path.split(os.sep)
+        return {
+            "path": path,
+            "rel_path": rel_path,
+            "name": os.path.basename(path),
+            "pretty_name": pretty_document_name(path),
+            "category": parts[0] if len(parts) > 1 else "",
+            "size": info["size"],
+            "mtime": info["mtime"],
+            "pages": (manifest_entry or {}).get("pages"),
+            "hash": info["hash"],
+        }
+
+    def _remove(self, path: str) -> None:
+        """Retira un documento del catálogo."""
+        self.documents.pop(os.path.relpath(path, self.folder), None)
+
+    def _reindex(self) -> None:
+        """Reconstruye los diccionarios de búsqueda."""
+        by_name, by_category, by_hash = {}, {}, {}
+        for rel_path in sorted(self.documents):
+            document = self.documents[rel_path]
+            by_name.setdefault(document["pretty_name"], rel_path)
+            by_category.setdefault(document["category"], []).append(rel_path)
+            by_hash.setdefault(document["hash"], rel_path)
+        # Se sustituyen de una vez para que las lecturas concurrentes no vean estados a medias
+        self.by_name, self.by_category, self.by_hash = by_name, by_category, by_hash
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from logger import ai_logger
+
+
+def text_hash(text: str) -> str:
+    """Hash SHA-256 del texto, usado como clave de la caché."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Caché persistente de embeddings en SQLite.
+
+    Cada entrada se identifica por el hash del texto, el modelo y el número
+    de dimensiones, de modo que cambiar de modelo nunca reutiliza vectores
+    incompatibles. Las escrituras se acumulan y se confirman por lotes, y
+    cuando la caché supera su tamaño máximo se eliminan las entradas usadas
+    hace más tiempo. El tamaño total se calcula una vez al abrir y después
+    se actualiza con cada escritura y desalojo (la caché tiene un único
+    proceso escritor).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        model: str,
+        dimensions: int,
+        max_bytes: int = 2 * 1024**3,
+        flush_every: int = 256,
+    ):
+        """
+        Args:
+            db_path: Ruta del archivo SQLite
+            model: Nombre del modelo de embeddings
+            dimensions: Dimensiones de los embeddings
+            max_bytes: Tamaño máximo de los vectores almacenados
+            flush_every: Escrituras acumuladas antes de confirmar en disco
+        """
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.model = model
+        self.dimensions = dimensions
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.pending = []
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                text_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (text_hash, model, dimensions)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_last_access ON embeddings (last_access)"
+        )
+        self.conn.commit()
+        self.total_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, texts: Iterable[str]) -> Dict[str, List[float]]:
+        """
+        Busca los embeddings de varios textos.
+
+        Returns:
+            Dict: {hash del texto: embedding} solo para los textos en caché
+        """
+        hashes = list({text_hash(text) for text in texts})
+        found = {}
+        with self.lock:
+            # SQLite limita el número de parámetros por consulta
+            for start in range(0, len(hashes), 500):
+                group = hashes[start : start + 500]
+                placeholders = ",".join("?" * len(group))
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND dimensions = ? AND text_hash IN ({placeholders})",
+                    [self.model, self.dimensions, *group],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_access = ? "
+                    "WHERE text_hash = ? AND model = ? AND dimensions = ?",
+                    [(now, key, self.model, self.dimensions) for key in found],
+                )
+                self.conn.commit()
+        return found
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """Devuelve el embedding de un texto o None si no está en caché."""
+        return self.get_many([text]).get(text_hash(text))
+
+    def put(self, text: str, embedding: List[float]) -> None:
+        """Añade un embedding; se escribe en disco en el siguiente flush."""
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self.lock:
+            self.pending.append(
+                (text_hash(text), self.model, self.dimensions, blob, time.time())
+            )
+            should_flush = len(self.pending) >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        """Confirma las escrituras pendientes y aplica la política de tamaño."""
+        with self.lock:
+            if not self.pending:
+                return
+            # Si un texto se añadió varias veces, prevalece la última escritura
+            rows = list({row[0]: row for row in self.pending}.values())
+            replaced = self._stored_sizes([row[0] for row in rows])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(text_hash, model, dimensions, vector, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+            self.total_bytes += sum(len(row[3]) for row in rows) - replaced
+            ai_logger.debug(f"Caché de embeddings: {len(rows)} entradas guardadas")
+            self.pending = []
+            self._evict()
+
+    def _stored_sizes(self, hashes: List[str]) -> int:
+        """Bytes que ocupan ya en la base de datos los vectores de esos hashes."""
+        total = 0
+        for start in range(0, len(hashes), 500):
+            group = hashes[start : start + 500]
+            placeholders = ",".join("?" * len(group))
+            total += self.conn.execute(
+                f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings "
+                f"WHERE model = ? AND dimensions = ? AND text_hash IN ({placeholders})",
+                [self.model, self.dimensions, *group],
+            ).fetchone()[0]
+        return total
+
+    def _evict(self) -> None:
+        """Elimina las entradas menos usadas si se supera el tamaño máximo."""
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        # Liberar hasta el 90% del límite para no desalojar en cada flush
+        to_free = self.total_bytes - int(self.max_bytes * 0.9)
+        rows = self.conn.execute(
+            "SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_access"
+        )
+        victims = []
+        for rowid, size in rows:
+            if to_free <= 0:
+                break
+            victims.append((rowid,))
+            to_free -= size
+            self.total_bytes -= size
+        self.conn.executemany("DELETE FROM embeddings WHERE rowid = ?", victims)
+        self.conn.commit()
+        ai_logger.info(f"Caché de embeddings: {len(victims)} entradas desalojadas por tamaño")
+
+    def close(self) -> None:
+        """Confirma las escrituras pendientes y cierra la base de datos."""
+        self.flush()
+        with self.lock:
+            self.conn.close()
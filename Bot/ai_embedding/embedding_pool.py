@@ -0,0 +1,206 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+import requests
+from logger import ai_logger
+
+# Códigos HTTP que indican un error transitorio y merecen reintento
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Limitador de tasa tipo token bucket, seguro entre hilos."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: Tokens que se reponen por segundo
+            capacity: Ráfaga máxima permitida (por defecto, igual a rate)
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Bloquea hasta que haya tokens disponibles y los consume."""
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                elapsed = now - self.updated_at
+                self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait_time = (tokens - self.tokens) / self.rate
+
+            time.sleep(wait_time)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Indica si un error de la API es transitorio (429, 5xx o de red)."""
+    if isinstance(error, requests.exceptions.HTTPError):
+        response = error.response
+        return response is not None and response.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(
+        error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+    )
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Extrae la cabecera Retry-After de una respuesta 429, si existe."""
+    # Errores propios (p. ej. circuito abierto) que indican cuándo reintentar
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return retry_after
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingWorkerPool:
+    """
+    Pool de hilos para generar embeddings de forma concurrente.
+
+    Limita el número de peticiones simultáneas, aplica un token bucket a la
+    tasa de peticiones, reintenta con backoff exponencial y jitter los errores
+    transitorios, e informa del progreso y del rendimiento en chunks/s.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        requests_per_second: float = 5.0,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        progress_interval: float = 10.0,
+    ):
+        """
+        Args:
+            max_in_flight: Número máximo de peticiones simultáneas
+            requests_per_second: Tasa máxima de peticiones (0 desactiva el límite)
+            max_retries: Reintentos por petición ante errores transitorios
+            base_delay: Espera inicial del backoff en segundos
+            max_delay: Espera máxima del backoff en segundos
+            progress_interval: Segundos entre informes de progreso
+        """
+        self.max_in_flight = max(1, max_in_flight)
+        self.bucket = TokenBucket(requests_per_second)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.progress_interval = progress_interval
+
+    def call_with_backoff(self, request_fn: Callable[..., Any], *args) -> Any:
+        """
+        Ejecuta una petición respetando el límite de tasa y reintentando
+        los errores transitorios con backoff exponencial y jitter.
+
+        Raises:
+            Exception: El último error si se agotan los reintentos o si el
+            error no es transitorio
+        """
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                return request_fn(*args)
+            except Exception as e:
+                if not is_retryable_error(e) or attempt >= self.max_retries:
+                    raise
+
+                # Full jitter: espera aleatoria hasta el límite exponencial
+                delay = min(self.max_delay, self.base_delay * (2**attempt))
+                delay = random.uniform(0, delay)
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+
+                attempt += 1
+                ai_logger.warning(
+                    f"Error transitorio en la API ({e}); reintento {attempt}/{self.max_retries} en {delay:.2f} s"
+                )
+                time.sleep(delay)
+
+    def run(
+        self,
+        batches: Iterable[List[Any]],
+        task: Callable[[List[Any]], Any],
+        total_items: Optional[int] = None,
+    ) -> Iterator[Tuple[List[Any], Any]]:
+        """
+        Procesa lotes en paralelo y devuelve los resultados según terminan.
+
+        Los resultados se entregan en el hilo que itera, por lo que el
+        llamador puede modificar sus estructuras sin sincronización.
+
+        Args:
+            batches: Lotes de elementos a procesar
+            task: Función que procesa un lote y devuelve su resultado
+            total_items: Número total de elementos, para el informe de progreso
+
+        Yields:
+            Tuple: (lote, resultado de task para ese lote)
+        """
+        start_time = time.time()
+        last_report = start_time
+        done_items = 0
+        batches = iter(batches)
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            in_flight = {}
+
+            def submit_next() -> bool:
+                batch = next(batches, None)
+                if batch is None:
+                    return False
+                in_flight[executor.submit(task, batch)] = batch
+                return True
+
+            # Mantener una ventana acotada de lotes pendientes en memoria
+            for _ in range(self.max_in_flight * 2):
+                if not submit_next():
+                    break
+
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch = in_flight.pop(future)
+                    submit_next()
+                    done_items += len(batch)
+                    yield batch, future.result()
+
+                now = time.time()
+                if now - last_report >= self.progress_interval:
+                    last_report = now
+                    self._report_progress(done_items, total_items, now - start_time)
+
+        self._report_progress(done_items, total_items, time.time() - start_time)
+
+    def _report_progress(
+        self, done_items: int, total_items: Optional[int], elapsed: float
+    ) -> None:
+        """Registra el progreso y el rendimiento actual."""
+        throughput = done_items / elapsed if elapsed > 0 else 0.0
+        if total_items:
+            ai_logger.info(
+                f"Progreso de embeddings: {done_items}/{total_items} chunks "
+                f"({done_items / total_items * 100:.1f}%) - {throughput:.2f} chunks/s"
+            )
+        else:
+            ai_logger.info(
+                f"Progreso de embeddings: {done_items} chunks - {throughput:.2f} chunks/s"
+            )
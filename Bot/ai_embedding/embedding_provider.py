@@ -0,0 +1,296 @@
+import hashlib
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from logger import ai_logger
+from ai_embedding.bm25_index import tokenize
+from constants import (
+    LOCAL_EMBEDDING_DIMENSIONS,
+    LOCAL_EMBEDDING_FEATURES,
+    LOCAL_EMBEDDING_FIT_SAMPLES,
+    LOCAL_EMBEDDING_MODEL,
+    LOCAL_EMBEDDING_MODEL_FILE,
+)
+
+# Modelo con el que se crearon los almacenes anteriores a los proveedores
+LEGACY_EMBEDDING_MODEL = "fireworks:nomic-ai/nomic-embed-text-v1.5:768"
+
+
+class EmbeddingProvider:
+    """
+    Interfaz común de los modelos de embeddings.
+
+    Cada proveedor tiene una identidad (proveedor, modelo y dimensiones)
+    que se guarda junto a los vectores de cada índice: dos vectores solo se
+    comparan si se generaron con la misma identidad.
+    """
+
+    name = ""
+    # Los proveedores remotos pasan por el pool con límite de tasa y reintentos
+    remote = False
+
+    def __init__(self, model: str, dimensions: int):
+        self.model = model
+        self.dimensions = dimensions
+
+    @property
+    def identity(self) -> str:
+        return f"{self.name}:{self.model}:{self.dimensions}"
+
+    @property
+    def ready(self) -> bool:
+        """Indica si el modelo puede generar embeddings sin ajustarse antes."""
+        return True
+
+    def fit(self, texts: List[str]) -> bool:
+        """
+        Ajusta el modelo al corpus, si lo necesita.
+
+        Returns:
+            bool: True si el modelo ha cambiado
+        """
+        return False
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Genera los embeddings de una lista de textos.
+
+        Raises:
+            Exception: Si no se pudieron generar (embed_batch divide el lote y reintenta)
+        """
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> List[float]:
+        """Genera el embedding de una consulta."""
+        return self.embed([text])[0]
+
+
+class FireworksEmbeddingProvider(EmbeddingProvider):
+    """Embeddings de la API de Fireworks."""
+
+    name = "fireworks"
+    remote = True
+
+    def __init__(self, client: Callable[[], Any], model: str, dimensions: int):
+        """
+        Args:
+            client: Función que devuelve el FireworksClient compartido
+            model: Modelo de embeddings de la API
+            dimensions: Dimensiones pedidas a la API
+        """
+        super().__init__(model, dimensions)
+        self.client = client
+
+    def payload(self, texts) -> Dict[str, Any]:
+        """Petición de embeddings para un texto o una lista de textos."""
+        return {"input": texts, "model": self.model, "dimensions": self.dimensions}
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        # Sin reintentos propios: el EmbeddingWorkerPool ya aplica backoff
+        data = self.client().embeddings(self.payload(texts), max_retries=0).get("data", [])
+
+        # La API indica la posición de cada entrada con "index"; no se asume el orden
+        embeddings = [None] * len(texts)
+        for position, item in enumerate(data):
+            index = item.get("index", position)
+            if 0 <= index < len(texts):
+                embeddings[index] = item.get("embedding")
+
+        if any(embedding is None for embedding in embeddings):
+            raise ValueError(
+                f"Respuesta incompleta: {len(data)} embeddings para {len(texts)} textos"
+            )
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client().embeddings(self.payload(text))["data"][0]["embedding"]
+
+
+class HashingSVDEmbeddingProvider(EmbeddingProvider):
+    """
+    Embeddings locales en CPU: TF-IDF sobre términos con hashing y proyección SVD.
+
+    Los términos (palabras e identificadores, con sus pares consecutivos)
+    se reparten en n_features columnas por hashing, se ponderan con
+    TF-IDF y se proyectan a pocas dimensiones con una SVD truncada (LSA).
+    El IDF y la proyección se ajustan una sola vez con el corpus de la
+    primera ingesta y se guardan en disco; la huella de la proyección
+    forma parte del nombre del modelo, así que borrar el archivo y volver
+    a ajustar cambia la identidad y obliga a regenerar los índices.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        dimensions: int = LOCAL_EMBEDDING_DIMENSIONS,
+        n_features: int = LOCAL_EMBEDDING_FEATURES,
+        model_path: str = LOCAL_EMBEDDING_MODEL_FILE,
+    ):
+        """
+        Args:
+            dimensions: Dimensiones máximas de los embeddings
+            n_features: Columnas del espacio de hashing
+            model_path: Archivo con el IDF y la proyección ajustados
+        """
+        super().__init__("hashing-svd", dimensions)
+        self.max_dimensions = dimensions
+        self.n_features = n_features
+        self.model_path = model_path
+        self.idf: Optional[np.ndarray] = None
+        self.components: Optional[np.ndarray] = None  # (dimensiones, n_features)
+        self._vectorizer = None
+        if os.path.exists(model_path):
+            self.load()
+
+    @property
+    def ready(self) -> bool:
+        return self.components is not None
+
+    def fit(self, texts: List[str]) -> bool:
+        if self.ready:
+            return False
+        texts = [text for text in texts if text]
+        if len(texts) < 2:
+            ai_logger.error("No hay textos suficientes para ajustar el modelo de embeddings local")
+            return False
+        from sklearn.decomposition import TruncatedSVD
+
+        start_time = time.time()
+        if len(texts) > LOCAL_EMBEDDING_FIT_SAMPLES:
+            rng = np.random.default_rng(0)
+            sample = rng.choice(len(texts), LOCAL_EMBEDDING_FIT_SAMPLES, replace=False)
+            texts = [texts[i] for i in sorted(sample)]
+
+        counts = self._term_counts(texts)
+        df = np.bincount(counts.indices, minlength=self.n_features)
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+        n_components = min(self.max_dimensions, len(texts) - 1)
+        svd = TruncatedSVD(n_components=n_components, random_state=0)
+        svd.fit(self._weigh(counts))
+        self.components = svd.components_.astype(np.float32)
+        self._set_model()
+        self.save()
+        ai_logger.info(
+            f"Modelo de embeddings local ajustado con {len(texts)} textos: {self.identity} "
+            f"en {time.time() - start_time:.2f} segundos"
+        )
+        return True
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        if not self.ready:
+            raise RuntimeError("El modelo de embeddings local aún no está ajustado")
+        vectors = np.asarray(self._weigh(self._term_counts(texts)) @ self.components.T)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms > 0, norms, 1.0)
+        return vectors.tolist()
+
+    def _term_counts(self, texts: List[str]):
+        """Matriz dispersa (textos, n_features) de frecuencias de términos."""
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import HashingVectorizer
+
+            self._vectorizer = HashingVectorizer(
+                analyzer=_analyze,
+                n_features=self.n_features,
+                alternate_sign=False,
+                norm=None,
+            )
+        return self._vectorizer.transform(texts).tocsr()
+
+    def _weigh(self, counts):
+        """TF logarítmico por IDF, normalizado por fila."""
+        from sklearn.preprocessing import normalize
+
+        weighted = counts.astype(np.float32)
+        weighted.data = 1 + np.log(weighted.data)
+        return normalize(weighted.multiply(self.idf).tocsr())
+
+    def _set_model(self) -> None:
+        """Nombre del modelo a partir de la huella de los parámetros ajustados."""
+        digest = hashlib.sha256(self.idf.tobytes() + self.components.tobytes()).hexdigest()
+        self.model = f"hashing-svd-{digest[:12]}"
+        self.dimensions = self.components.shape[0]
+
+    def save(self) -> None:
+        """Guarda el IDF y la proyección de forma atómica."""
+        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
+        tmp_path = self.model_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, idf=self.idf, components=self.components)
+        os.replace(tmp_path, self.model_path)
+
+    def load(self) -> None:
+        """Carga el modelo ajustado si corresponde a la configuración actual."""
+        with np.load(self.model_path) as data:
+            idf, components = data["idf"], data["components"]
+        if components.shape[1] != self.n_features:
+            ai_logger.warning(
+                f"El modelo de embeddings local de {self.model_path} usa otro número de columnas; "
+                "se ajustará de nuevo"
+            )
+            return
+        self.idf, self.components = idf, components
+        self._set_model()
+
+
+class SentenceTransformerEmbeddingProvider(EmbeddingProvider):
+    """Embeddings locales con un modelo de sentence-transformers (nombre o ruta local)."""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model: str = LOCAL_EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.encoder = SentenceTransformer(model, device="cpu")
+        super().__init__(
+            os.path.basename(model.rstrip("/")),
+            self.encoder.get_sentence_embedding_dimension(),
+        )
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.encoder.encode(texts, normalize_embeddings=True).tolist()
+
+
+def _analyze(text: str) -> List[str]:
+    """Términos del texto y pares de términos consecutivos."""
+    terms = tokenize(text)
+    return terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+
+
+def create_embedding_provider(
+    name: str, client: Callable[[], Any], model: str, dimensions: int
+) -> EmbeddingProvider:
+    """
+    Crea el proveedor de embeddings configurado.
+
+    Con "local" se usa el modelo de sentence-transformers de
+    LOCAL_EMBEDDING_MODEL si está configurado e instalado y, si no, el
+    modelo TF-IDF + SVD, que no necesita descargas.
+
+    Args:
+        name: "fireworks" o "local"
+        client: Función que devuelve el FireworksClient compartido
+        model: Modelo de embeddings de Fireworks
+        dimensions: Dimensiones de los embeddings de Fireworks
+
+    Raises:
+        ValueError: Si el proveedor no existe
+    """
+    if name == "fireworks":
+        return FireworksEmbeddingProvider(client, model, dimensions)
+    if name == "local":
+        if LOCAL_EMBEDDING_MODEL:
+            try:
+                return SentenceTransformerEmbeddingProvider(LOCAL_EMBEDDING_MODEL)
+            except ImportError:
+                ai_logger.warning(
+                    "sentence-transformers no está instalado; se usa el modelo local TF-IDF + SVD"
+                )
+            except Exception as e:
+                ai_logger.error(
+                    f"No se pudo cargar {LOCAL_EMBEDDING_MODEL}; se usa el modelo local TF-IDF + SVD: {e}"
+                )
+        return HashingSVDEmbeddingProvider()
+    raise ValueError(f"Proveedor de embeddings desconocido: {name}")
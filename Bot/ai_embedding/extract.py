@@ -1,13 +1,63 @@
 import PyPDF2
-from sklearn.neighbors import NearestNeighbors
 import numpy as np
 import os
 import pickle
 import time
-from typing import List, Dict, Any, Optional, Tuple
+import bisect
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
 from logger import data_logger
-from ai_embedding.ai import generate_embeddings, embed_question
-from constants import EMBEDDINGS_FILE, INDEX_FILE, DOCUMENTS_FOLDER
+from ai_embedding.ai import (
+    embed_question,
+    generate_embeddings,
+    get_embedding_provider,
+    register_chunk_lookup,
+)
+from ai_embedding.chunk_lookup import ChunkLookup
+from ai_embedding.pdf_workers import extract_documents_parallel
+from ai_embedding.search_engine import CosineSearchEngine, QuantizedSearchEngine
+from ai_embedding.ann_index import IVFFlatIndex
+from ai_embedding.fine_index import FineIndex
+from ai_embedding.bm25_index import BM25Index
+from ai_embedding.checkpoint import EmbeddingCheckpoint, save_failed_chunks
+from ai_embedding.vector_store import (
+    ChunkStore,
+    convert_pickle_store,
+    store_signature,
+)
+from ai_embedding.manifest import (
+    bootstrap_manifest,
+    diff_documents,
+    hash_documents,
+    load_manifest,
+    save_manifest,
+)
+from constants import (
+    EMBEDDINGS_FILE,
+    EMBEDDINGS_MATRIX_FILE,
+    DOCUMENTS_FOLDER,
+    EXTRACTION_WORKERS,
+    EXTRACTION_TIMEOUT,
+    EXTRACTION_PAGES_PER_TASK,
+    EMBEDDING_CHECKPOINT_FILE,
+    FAILED_CHUNKS_FILE,
+    SEARCH_BACKEND,
+    ANN_INDEX_FILE,
+    IVF_N_LISTS,
+    IVF_N_PROBE,
+    IVF_MIN_VECTORS,
+    SEARCH_QUANTIZATION,
+    SEARCH_RESCORE_CANDIDATES,
+    FINE_INDEX,
+    FINE_TOP_K,
+    HYBRID_SEARCH,
+    HYBRID_CANDIDATES,
+    RRF_K,
+)
+
+# Índice de pasajes de los chunks actuales (solo con FINE_INDEX)
+_fine_index = None
+# Índice léxico BM25 de los chunks actuales (solo con HYBRID_SEARCH)
+_bm25_index = None
 
 
 def save_data(file_path, data):
@@ -28,7 +78,7 @@ def load_data(file_path):
 
 def extract_text_blocks_from_pdf(
     pdf_file, block_size=12500, overlap=500
-) -> List[Dict[str, Any]]:
+) -> Iterator[Dict[str, Any]]:
     """
     Extrae bloques de texto de tamaño fijo de un documento PDF.
     Aproximadamente 2500 palabras por bloque (asumiendo promedio de 5 caracteres por palabra)
@@ -38,65 +88,21 @@ def extract_text_blocks_from_pdf(
         block_size (int): Tamaño aproximado de cada bloque en caracteres.
         overlap (int): Solapamiento entre bloques para mantener contexto.
 
-    Returns:
-        list[dict]: Lista de bloques de texto con metadatos.
+    Yields:
+        dict: Bloques de texto con metadatos, según se completan.
     """
     try:
         reader = PyPDF2.PdfReader(pdf_file)
-        blocks = []
-        full_text = ""
-        page_ranges = {}
-
-        # Extraer todo el texto primero y rastrear rangos de páginas
-        for page_number, page in enumerate(reader.pages, start=1):
-            page_text = page.extract_text()
-            if page_text:
-                start_pos = len(full_text)
-                full_text += page_text + "\n\n"
-                end_pos = len(full_text)
-                page_ranges[page_number] = (start_pos, end_pos)
-
-        # Dividir el texto en bloques superpuestos
-        text_length = len(full_text)
-        start_positions = list(range(0, text_length, block_size - overlap))
-
-        for i, start_pos in enumerate(start_positions):
-            end_pos = min(start_pos + block_size, text_length)
-            if end_pos <= start_pos:  # Evitar bloques vacíos al final
-                break
-
-            block_text = full_text[start_pos:end_pos]
-            if len(block_text.strip()) < 100:  # Ignorar bloques muy pequeños
-                continue
-
-            # Determinar en qué páginas aparece este bloque
-            block_pages = []
-            for page_num, (page_start, page_end) in page_ranges.items():
-                # Si hay algún solapamiento entre el bloque y la página
-                if not (end_pos < page_start or start_pos > page_end):
-                    block_pages.append(page_num)
-
-            # Contar palabras aproximadas (para información)
-            word_count = len(block_text.split())
-
-            blocks.append(
-                {
-                    "chunk_id": f"Block-{i+1}",
-                    "section_number": f"B{i+1}",  # Identificador de bloque
-                    "header": f"Bloque de texto {i+1} (~{word_count} palabras)",
-                    "content": block_text,
-                    "text": block_text,
-                    "document": pdf_file.name,
-                    "pages": block_pages,
-                    "type": "text_block",
-                    "word_count": word_count,
-                }
-            )
-
-        data_logger.info(
-            f"Se extrajeron {len(blocks)} bloques de texto de {pdf_file.name}"
+        # Las páginas se extraen bajo demanda a medida que el chunker las consume
+        pages = (
+            (page_number, page.extract_text())
+            for page_number, page in enumerate(reader.pages, start=1)
         )
-        return blocks
+        count = 0
+        for block in iter_text_blocks(pages, pdf_file.name, block_size, overlap):
+            count += 1
+            yield block
+        data_logger.info(f"Se extrajeron {count} bloques de texto de {pdf_file.name}")
 
     except Exception as e:
         data_logger.error(
@@ -105,8 +111,150 @@ def extract_text_blocks_from_pdf(
         raise
 
 
+class TextBlockSplitter:
+    """
+    Divide el texto de las páginas de un documento en bloques superpuestos.
+
+    Las páginas se reciben de una en una (add_page) y los bloques se
+    devuelven en cuanto están completos, de modo que solo se mantiene en
+    memoria el texto pendiente (aproximadamente un bloque más el
+    solapamiento y la página en curso). Las páginas de cada bloque se
+    localizan con búsqueda binaria sobre los desplazamientos de inicio y
+    fin de cada página.
+    """
+
+    def __init__(self, document: str, block_size=12500, overlap=500):
+        """
+        Args:
+            document: Ruta del documento de origen
+            block_size (int): Tamaño aproximado de cada bloque en caracteres.
+            overlap (int): Solapamiento entre bloques para mantener contexto.
+        """
+        self.document = document
+        self.block_size = block_size
+        self.step = block_size - overlap
+        self.buffer = ""  # Texto desde buffer_offset hasta el final de lo leído
+        self.buffer_offset = 0
+        self.text_length = 0
+        self.block_start = 0
+        self.block_index = 0
+
+        # Desplazamientos de las páginas que aún pueden tocar bloques pendientes
+        self.page_numbers = []
+        self.page_starts = []
+        self.page_ends = []
+
+    def add_page(self, page_number: int, page_text: str) -> List[Dict[str, Any]]:
+        """
+        Añade el texto de la siguiente página.
+
+        Returns:
+            list[dict]: Bloques completados con esta página
+        """
+        if not page_text:
+            return []
+
+        self.page_starts.append(self.text_length)
+        self.buffer += page_text + "\n\n"
+        self.text_length = self.buffer_offset + len(self.buffer)
+        self.page_ends.append(self.text_length)
+        self.page_numbers.append(page_number)
+
+        # Un bloque se emite cuando ya se conoce el texto posterior a su final,
+        # ya que una página que empieza justo en su final también le pertenece
+        blocks = []
+        while self.block_start + self.block_size < self.text_length:
+            self._emit(self.block_start + self.block_size, blocks)
+        return blocks
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """
+        Termina el documento.
+
+        Returns:
+            list[dict]: Bloques finales, truncados al final del texto
+        """
+        blocks = []
+        while self.block_start < self.text_length:
+            self._emit(min(self.block_start + self.block_size, self.text_length), blocks)
+        return blocks
+
+    def _emit(self, end_pos: int, blocks: List[Dict[str, Any]]) -> None:
+        """Crea el bloque que termina en end_pos y avanza al siguiente."""
+        self.block_index += 1
+        block = self._make_block(end_pos)
+        if block:
+            blocks.append(block)
+        self._advance()
+
+    def _make_block(self, end_pos: int) -> Optional[Dict[str, Any]]:
+        block_start = self.block_start
+        block_text = self.buffer[block_start - self.buffer_offset : end_pos - self.buffer_offset]
+        if len(block_text.strip()) < 100:  # Ignorar bloques muy pequeños
+            return None
+
+        # Páginas con algún solapamiento con [block_start, end_pos]
+        first = bisect.bisect_left(self.page_ends, block_start)
+        last = bisect.bisect_right(self.page_starts, end_pos)
+        block_pages = self.page_numbers[first:last]
+        # Posición dentro del bloque en la que empieza cada una de esas páginas
+        page_offsets = [max(start - block_start, 0) for start in self.page_starts[first:last]]
+
+        # Contar palabras aproximadas (para información)
+        word_count = len(block_text.split())
+
+        block_index = self.block_index
+        return {
+            "chunk_id": f"Block-{block_index}",
+            "section_number": f"B{block_index}",  # Identificador de bloque
+            "header": f"Bloque de texto {block_index} (~{word_count} palabras)",
+            "content": block_text,
+            "text": block_text,
+            "document": self.document,
+            "pages": block_pages,
+            "page_offsets": page_offsets,
+            "type": "text_block",
+            "word_count": word_count,
+        }
+
+    def _advance(self) -> None:
+        self.block_start += self.step
+        # Descartar el texto y las páginas que ningún bloque futuro necesita
+        drop = min(self.block_start, self.text_length) - self.buffer_offset
+        if drop > 0:
+            self.buffer = self.buffer[drop:]
+            self.buffer_offset += drop
+        expired = bisect.bisect_left(self.page_ends, self.block_start)
+        if expired:
+            del self.page_numbers[:expired], self.page_starts[:expired], self.page_ends[:expired]
+
+
+def iter_text_blocks(
+    pages: Iterable[Tuple[int, str]], document: str, block_size=12500, overlap=500
+) -> Iterator[Dict[str, Any]]:
+    """
+    Divide el texto de las páginas de un documento en bloques superpuestos.
+
+    Las páginas se consumen de una en una y los bloques se generan en cuanto
+    están completos (ver TextBlockSplitter).
+
+    Args:
+        pages: Pares (número de página, texto) en orden
+        document: Ruta del documento de origen
+        block_size (int): Tamaño aproximado de cada bloque en caracteres.
+        overlap (int): Solapamiento entre bloques para mantener contexto.
+
+    Yields:
+        dict: Bloque de texto con metadatos.
+    """
+    splitter = TextBlockSplitter(document, block_size, overlap)
+    for page_number, page_text in pages:
+        yield from splitter.add_page(page_number, page_text)
+    yield from splitter.finish()
+
+
 def process_documents() -> (
-    Tuple[Optional[NearestNeighbors], Optional[List[Dict[str, Any]]]]
+    Tuple[Optional[CosineSearchEngine], Optional[List[Dict[str, Any]]]]
 ):
     """
     Procesa documentos y genera embeddings utilizando bloques de texto fijos.
@@ -130,7 +278,8 @@ def process_documents() -> (
 
     # Cargar datos existentes si están disponibles
     data_logger.info("Verificando datos existentes...")
-    existing_chunks, index = load_existing_data()
+    store = open_chunk_store() or ChunkStore()
+    existing_chunks = store.live_chunks()
 
     if existing_chunks:
         data_logger.info(
@@ -146,40 +295,120 @@ def process_documents() -> (
             "No se encontraron datos existentes, comenzando procesamiento desde cero"
         )
 
-    # Procesar nuevos documentos
+    # Comparar los documentos actuales con el manifiesto de la última ingesta
     data_logger.info(f"Verificando {len(pdf_files)} archivos PDF para procesamiento...")
-    new_chunks = get_new_chunks(pdf_files, existing_chunks)
+    manifest = load_manifest()
+    documents = hash_documents(pdf_files, manifest)
+    manifest_changed = False
+    # Sin manifiesto (datos antiguos, archivo perdido o dañado) se reconstruye con los chunks
+    if not manifest and existing_chunks:
+        manifest = bootstrap_manifest(documents, existing_chunks)
+        manifest_changed = True
+    diff = diff_documents(documents, manifest)
+
+    # Marcar como eliminados los chunks de documentos borrados o modificados;
+    # el resto conserva su fila y su identificador
+    stale = set(diff["stale"])
+    evicted = store.delete_where(
+        lambda chunk: chunk.get("content_hash") is None
+        or chunk["content_hash"] in stale
+    )
+    if evicted:
+        data_logger.info(f"Eliminados {evicted} chunks de documentos borrados o modificados")
+
+    # Actualizar la ruta de los documentos renombrados sin reprocesarlos
+    for chunk in store.live_chunks():
+        if chunk["content_hash"] in diff["renamed"]:
+            chunk["document"] = diff["renamed"][chunk["content_hash"]]
+
+    for content_hash in stale:
+        del manifest[content_hash]
+    for content_hash, path in diff["renamed"].items():
+        manifest[content_hash]["path"] = path
+        manifest[content_hash]["size"] = documents[path]["size"]
+        manifest[content_hash]["mtime"] = documents[path]["mtime"]
+    manifest_changed = manifest_changed or bool(stale or diff["renamed"])
+
+    # Procesar solo documentos nuevos o modificados
+    to_extract = diff["added"] + diff["changed"]
+    new_chunks, extracted_paths = get_new_chunks(to_extract, documents)
+    for path in extracted_paths:
+        info = documents[path]
+        manifest[info["hash"]] = {
+            "path": path,
+            "size": info["size"],
+            "mtime": info["mtime"],
+            "pages": info.get("pages"),
+        }
+    manifest_changed = manifest_changed or bool(extracted_paths)
+
+    # Los vectores de otro modelo nunca se comparan con los del actual: si el
+    # almacén se creó con otro proveedor, se vuelven a generar todos
+    provider = get_embedding_provider()
+    if not provider.ready:
+        provider.fit([chunk["text"] for chunk in store.live_chunks() + new_chunks])
+    model_changed = bool(store.embedding_model) and store.embedding_model != provider.identity
+    if model_changed:
+        store.reset_embeddings(provider.identity)
+        # Un checkpoint de una ingesta interrumpida tiene vectores del modelo anterior
+        EmbeddingCheckpoint(EMBEDDING_CHECKPOINT_FILE).clear()
+    store.embedding_model = provider.identity
+
+    # Reintentar también los chunks cuyo embedding falló en ingestas anteriores
+    retry_chunks = [chunk for chunk in store.live_chunks() if "embedding" not in chunk]
+    if retry_chunks:
+        data_logger.info(
+            f"Reintentando {len(retry_chunks)} chunks sin embedding de ingestas anteriores"
+        )
 
-    if new_chunks:
+    to_embed = retry_chunks + new_chunks
+    if to_embed:
         data_logger.info(
             f"Se encontraron {len(new_chunks)} nuevos fragmentos para procesar"
         )
         data_logger.info("Iniciando generación de embeddings para nuevos fragmentos...")
         embedding_start = time.time()
-        generate_embeddings(new_chunks)
+
+        # Los embeddings se registran según llegan para poder reanudar
+        checkpoint = EmbeddingCheckpoint(EMBEDDING_CHECKPOINT_FILE, provider.identity)
+        checkpoint.restore(to_embed)
+        try:
+            failed = generate_embeddings(to_embed, on_embedding=checkpoint.append)
+        finally:
+            checkpoint.close()
+        save_failed_chunks(FAILED_CHUNKS_FILE, failed)
+
         embedding_time = time.time() - embedding_start
         data_logger.info(
             f"Generación de embeddings completada en {embedding_time:.2f} segundos"
         )
-
-        # Actualizar índice con los nuevos fragmentos
-        all_chunks = (existing_chunks or []) + new_chunks
-        data_logger.info(
-            f"Creando índice vectorial con {len(all_chunks)} fragmentos totales..."
+        store.add(new_chunks)
+        recovered = len(retry_chunks) - sum(
+            1 for chunk in retry_chunks if "embedding" not in chunk
         )
-        index_start = time.time()
-        index, all_chunks = create_vector_store_sklearn(all_chunks)
-        index_time = time.time() - index_start
-        data_logger.info(f"Índice vectorial creado en {index_time:.2f} segundos")
+        manifest_changed = manifest_changed or bool(recovered)
 
+    if manifest_changed or evicted or model_changed:
         # Guardar datos actualizados
         save_start = time.time()
         data_logger.info("Guardando datos procesados en disco...")
-        save_data(EMBEDDINGS_FILE, all_chunks)
-        save_data(INDEX_FILE, index)
+        store.save()
+        save_manifest(manifest)
+        EmbeddingCheckpoint(EMBEDDING_CHECKPOINT_FILE).clear()
         save_time = time.time() - save_start
         data_logger.info(f"Datos guardados en {save_time:.2f} segundos")
 
+        # Reabrir el almacén mapeado y reconstruir el índice sobre él
+        data_logger.info(
+            f"Creando índice vectorial con {len(store)} fragmentos totales..."
+        )
+        index_start = time.time()
+        all_chunks, index = load_existing_data()
+        index_time = time.time() - index_start
+        data_logger.info(f"Índice vectorial creado en {index_time:.2f} segundos")
+        refresh_fine_index(all_chunks)
+        refresh_bm25_index(all_chunks)
+
         total_time = time.time() - start_time
         data_logger.info(
             f"=== PROCESAMIENTO COMPLETADO EN {total_time:.2f} SEGUNDOS ==="
@@ -187,120 +416,147 @@ def process_documents() -> (
         return index, all_chunks
 
     data_logger.info("No hay nuevos documentos para procesar")
+    chunks, index = index_chunk_store(store) if store.chunks else (None, None)
+    refresh_fine_index(chunks)
+    refresh_bm25_index(chunks)
     total_time = time.time() - start_time
     data_logger.info(
         f"=== PROCESAMIENTO COMPLETADO EN {total_time:.2f} SEGUNDOS (SIN CAMBIOS) ==="
     )
-    return index, existing_chunks
+    return index, chunks
 
 
 def get_new_chunks(
     pdf_files: List[str],
-    existing_chunks: Optional[List[Dict[str, Any]]],
-) -> List[Dict[str, Any]]:
+    documents: Dict[str, Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], List[str]]:
     """
-    Identifica y procesa nuevos documentos no procesados.
+    Extrae los fragmentos de los documentos nuevos o modificados.
 
     Args:
-        pdf_files: Lista de rutas a archivos PDF
-        existing_chunks: Fragmentos ya procesados
+        pdf_files: Rutas de los PDFs a procesar
+        documents: {ruta: {"hash", "size", "mtime"}} de los archivos actuales
+
+    Returns:
+        Tuple: (nuevos fragmentos, rutas procesadas correctamente)
     """
     start_time = time.time()
-    data_logger.info("Iniciando búsqueda de nuevos documentos...")
-
-    # Crear set de documentos ya procesados para búsqueda más eficiente
-    processed_docs = set()
-    if existing_chunks:
-        for chunk in existing_chunks:
-            doc_name = chunk.get("document")
-            if doc_name:
-                base_name = os.path.basename(doc_name)
-                processed_docs.add(base_name)
-        data_logger.info(
-            f"Se encontraron {len(processed_docs)} documentos ya procesados"
-        )
-
     new_chunks = []
-    new_docs_count = 0
+    extracted_paths = []
+
+    if not pdf_files:
+        return new_chunks, extracted_paths
 
-    # Procesar solo documentos nuevos
-    for pdf_path in pdf_files:
+    # Extraer el texto en procesos paralelos; las páginas llegan por lotes
+    data_logger.info(
+        f"Extrayendo {len(pdf_files)} documentos con hasta {EXTRACTION_WORKERS} procesos"
+    )
+    extracted = extract_documents_parallel(
+        pdf_files,
+        max_workers=EXTRACTION_WORKERS,
+        timeout=EXTRACTION_TIMEOUT,
+        pages_per_task=EXTRACTION_PAGES_PER_TASK,
+    )
+    # Cada documento se divide en bloques según llegan sus páginas; sus bloques
+    # se añaden a los nuevos fragmentos solo si la extracción termina sin error
+    splitters = {}  # ruta -> (TextBlockSplitter, bloques ya completados)
+    failed_paths = set()
+    for pdf_path, event, payload in extracted:
         base_name = os.path.basename(pdf_path)
-        if base_name in processed_docs:
-            data_logger.debug(f"Documento ya procesado (omitido): {base_name}")
+        if pdf_path in failed_paths:
             continue
-
         try:
-            new_docs_count += 1
+            if pdf_path not in splitters:
+                data_logger.info(f"Procesando documento: {base_name}")
+                splitters[pdf_path] = (TextBlockSplitter(pdf_path), [])
+            splitter, chunks = splitters[pdf_path]
+
+            if event == "pages":
+                for page_number, page_text in payload:
+                    chunks.extend(splitter.add_page(page_number, page_text))
+                continue
+            del splitters[pdf_path]
+            if event == "error":
+                data_logger.error(f"Error procesando {base_name}: {payload}")
+                continue
+
+            chunks.extend(splitter.finish())
+            for chunk in chunks:
+                chunk["content_hash"] = documents[pdf_path]["hash"]
+            documents[pdf_path]["pages"] = payload
+            new_chunks.extend(chunks)
+            extracted_paths.append(pdf_path)
             data_logger.info(
-                f"Procesando nuevo documento [{new_docs_count}/{len(pdf_files) - len(processed_docs)}]: {base_name}"
+                f"Añadidos {len(chunks)} bloques de {base_name} "
+                f"[{len(extracted_paths)}/{len(pdf_files)}]"
             )
-            with open(pdf_path, "rb") as f:
-                chunks = extract_text_blocks_from_pdf(f)
-                new_chunks.extend(chunks)
-                data_logger.info(f"Añadidos {len(chunks)} bloques de {base_name}")
         except Exception as e:
+            splitters.pop(pdf_path, None)
+            if event == "pages":
+                failed_paths.add(pdf_path)
             data_logger.error(f"Error procesando {base_name}: {str(e)}")
 
     elapsed_time = time.time() - start_time
     data_logger.info(
-        f"Procesamiento completado: {len(new_chunks)} nuevos chunks de {new_docs_count} documentos en {elapsed_time:.2f} segundos"
+        f"Procesamiento completado: {len(new_chunks)} nuevos chunks de {len(extracted_paths)} documentos en {elapsed_time:.2f} segundos"
     )
-    return new_chunks
+    return new_chunks, extracted_paths
 
 
 def create_vector_store_sklearn(chunks_to_index, new_chunks=None):
     """
-    Crea un índice vectorial para búsqueda rápida usando sklearn.
+    Crea el motor de búsqueda vectorial para una lista de fragmentos en memoria.
+
+    Conserva el nombre histórico; ya no usa sklearn sino CosineSearchEngine.
+    Las filas del motor coinciden con las posiciones de chunks_to_index y los
+    chunks sin embedding nunca aparecen en los resultados.
 
     Args:
         chunks_to_index: Lista completa de fragmentos
         new_chunks: Nuevos fragmentos (parámetro opcional, para compatibilidad)
 
     Returns:
-        Tuple: (modelo de vecinos más cercanos, lista de chunks indexados)
+        Tuple: (motor de búsqueda, lista de chunks indexados)
     """
-    # Filtrar solo los chunks que tienen embedding
-    indexable_chunks = []
-    for chunk in chunks_to_index:
-        if "embedding" in chunk:
-            indexable_chunks.append(chunk)
-        else:
-            data_logger.warning(
-                f"Chunk sin embedding encontrado: {chunk.get('chunk_id', 'desconocido')}"
-            )
-
-    if not indexable_chunks:
+    embedded = np.array(["embedding" in chunk for chunk in chunks_to_index], dtype=bool)
+    if not embedded.any():
         data_logger.error("No hay fragmentos con embeddings para indexar")
         return None, chunks_to_index
 
-    # Convertir embeddings a matriz numpy
-    embeddings = np.array([chunk["embedding"] for chunk in indexable_chunks])
+    missing = len(chunks_to_index) - int(embedded.sum())
+    if missing:
+        data_logger.warning(f"{missing} chunks sin embedding quedan fuera del índice")
+
+    dimensions = next(
+        len(chunk["embedding"]) for chunk in chunks_to_index if "embedding" in chunk
+    )
+    matrix = np.zeros((len(chunks_to_index), dimensions), dtype=np.float32)
+    for row, chunk in enumerate(chunks_to_index):
+        if embedded[row]:
+            matrix[row] = chunk["embedding"]
 
-    # Crear y entrenar modelo de vecinos más cercanos
-    data_logger.info(f"Creando índice con {len(indexable_chunks)} vectores")
+    data_logger.info(f"Creando índice con {int(embedded.sum())} vectores")
     try:
-        nbrs = NearestNeighbors(
-            n_neighbors=min(5, len(indexable_chunks)), algorithm="ball_tree"
-        ).fit(embeddings)
-        return nbrs, chunks_to_index
+        return CosineSearchEngine(matrix, embedded), chunks_to_index
     except Exception as e:
         data_logger.error(f"Error creando índice vectorial: {e}")
         return None, chunks_to_index
 
 
-def search_similar_chunks_sklearn(question, index_model, chunks, top_k=5):
+def search_similar_chunks_with_scores(
+    question, index_model, chunks, top_k=5
+) -> List[Tuple[Dict[str, Any], float]]:
     """
-    Busca fragmentos similares a una pregunta usando el índice vectorial.
+    Busca fragmentos similares a una pregunta y devuelve su similitud.
 
     Args:
         question: Pregunta o texto de búsqueda (string o embedding)
-        index_model: Modelo de vecinos más cercanos
+        index_model: Motor de búsqueda vectorial
         chunks: Lista completa de fragmentos
         top_k: Número de resultados a retornar
 
     Returns:
-        list: Fragmentos más similares ordenados por relevancia
+        list: Pares (fragmento, similitud coseno) ordenados por relevancia
     """
     if not index_model or not chunks:
         data_logger.warning("Índice o fragmentos no disponibles para búsqueda")
@@ -315,23 +571,12 @@ def search_similar_chunks_sklearn(question, index_model, chunks, top_k=5):
     else:
         question_embedding = question  # Ya es un embedding
 
-    # Asegurar formato correcto para la búsqueda
-    question_embedding = np.array(question_embedding).reshape(1, -1)
-
-    # Realizar búsqueda de vecinos más cercanos
     try:
-        # Limitar top_k al número de vecinos del modelo
-        actual_k = min(top_k, index_model.n_neighbors)
-        distances, indices = index_model.kneighbors(
-            question_embedding, n_neighbors=actual_k
-        )
-
-        # Extraer resultados
-        results = []
-        for idx in indices[0]:
-            if idx < len(chunks):
-                results.append(chunks[idx])
-
+        results = [
+            (chunks[row], score)
+            for row, score in index_model.search(question_embedding, top_k)
+            if row < len(chunks) and not chunks[row].get("deleted")
+        ]
         data_logger.info(f"Búsqueda completada: {len(results)} resultados encontrados")
         return results
     except Exception as e:
@@ -339,18 +584,320 @@ def search_similar_chunks_sklearn(question, index_model, chunks, top_k=5):
         return []
 
 
+def search_fine_passages(
+    question_embedding, top_k: int = FINE_TOP_K
+) -> List[Dict[str, Any]]:
+    """
+    Busca en el índice de pasajes y devuelve secciones con el contexto justo.
+
+    Args:
+        question_embedding: Embedding de la pregunta
+        top_k: Número de pasajes a recuperar
+
+    Returns:
+        list: Secciones (pasajes ampliados con su documento y páginas) ordenadas
+        por relevancia, o una lista vacía si el índice de pasajes no está activo
+    """
+    if _fine_index is None or not question_embedding:
+        return []
+    try:
+        sections = _fine_index.search(question_embedding, top_k)
+        data_logger.info(f"Búsqueda de pasajes completada: {len(sections)} secciones")
+        return sections
+    except Exception as e:
+        data_logger.error(f"Error en la búsqueda de pasajes: {e}")
+        return []
+
+
+def search_lexical(question: str, top_k: int = HYBRID_CANDIDATES) -> List[Dict[str, Any]]:
+    """
+    Busca en el índice léxico BM25, sin llamar a la API.
+
+    Returns:
+        list: Bloques ordenados por relevancia, o una lista vacía si el
+        índice léxico no está activo
+    """
+    if _bm25_index is None or not question:
+        return []
+    try:
+        results = _bm25_index.search(question, top_k)
+        data_logger.info(f"Búsqueda léxica completada: {len(results)} resultados")
+        return [chunk for chunk, _ in results]
+    except Exception as e:
+        data_logger.error(f"Error en la búsqueda léxica: {e}")
+        return []
+
+
+def lexical_search_available() -> bool:
+    """Indica si /search puede responder con el índice léxico cuando falla la API."""
+    return _bm25_index is not None and _bm25_index.size > 0
+
+
+def _fusion_key(chunk: Dict[str, Any]):
+    """Bloque del que procede un resultado (las secciones de pasajes apuntan a su padre)."""
+    if "parent_id" in chunk:
+        return chunk["parent_id"]
+    if "row_id" in chunk:
+        return chunk["row_id"]
+    return (chunk.get("document"), chunk.get("chunk_id"))
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[Dict[str, Any]]], top_k: int = 5, k: int = RRF_K
+) -> List[Dict[str, Any]]:
+    """
+    Combina varias listas de resultados por fusión de rango recíproco (RRF).
+
+    Cada bloque suma 1 / (k + rango) por cada lista en la que aparece, de
+    modo que no hace falta que las puntuaciones de los distintos buscadores
+    sean comparables. Los resultados se agrupan por bloque: si un bloque
+    aparece en varias listas se devuelve con la forma de la primera (por
+    ejemplo, las secciones del índice de pasajes en lugar del bloque entero).
+
+    Args:
+        rankings: Listas de resultados, cada una de más a menos relevante
+        top_k: Número de bloques a retornar
+        k: Constante de suavizado de RRF
+
+    Returns:
+        list: Resultados de los top_k bloques con mayor puntuación fusionada
+    """
+    scores: Dict[Any, float] = {}
+    items: Dict[Any, Tuple[int, List[Dict[str, Any]]]] = {}
+    for source, ranking in enumerate(rankings):
+        ranked = set()
+        for chunk in ranking:
+            key = _fusion_key(chunk)
+            if key not in ranked:
+                ranked.add(key)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (k + len(ranked))
+            first_source, group = items.setdefault(key, (source, []))
+            if first_source == source:
+                group.append(chunk)
+
+    best = sorted(scores, key=lambda key: -scores[key])[:top_k]
+    return [chunk for key in best for chunk in items[key][1]]
+
+
+def retrieve_context(
+    question: str, question_embedding, index_model, chunks, top_k=5
+) -> List[Dict[str, Any]]:
+    """
+    Recupera el contexto de una pregunta.
+
+    Con el índice de pasajes activo se buscan pasajes y solo se amplían con
+    el texto vecino cuando son demasiado cortos; si no, o si no hay
+    resultados, se buscan los bloques completos más similares. Con la
+    búsqueda híbrida activa, estos resultados se fusionan con los del
+    índice léxico BM25; si no hay embedding de la pregunta (API lenta o
+    caída) se responde solo con el índice léxico.
+
+    Args:
+        question: Texto de la pregunta
+        question_embedding: Embedding de la pregunta, o None si no está disponible
+        index_model: Motor de búsqueda vectorial
+        chunks: Lista completa de fragmentos
+        top_k: Número de bloques a retornar
+
+    Returns:
+        list: Pasajes o bloques ordenados por relevancia
+    """
+    lexical = search_lexical(question) if HYBRID_SEARCH else []
+
+    semantic = []
+    if question_embedding:
+        semantic = search_fine_passages(question_embedding)
+        if not semantic:
+            depth = max(top_k, HYBRID_CANDIDATES) if lexical else top_k
+            semantic = search_similar_chunks_sklearn(
+                question_embedding, index_model, chunks, depth
+            )
+
+    if not lexical:
+        return semantic
+    if not semantic:
+        data_logger.info("Sin resultados por embeddings: se usa solo la búsqueda léxica")
+        return lexical[:top_k]
+    return reciprocal_rank_fusion([semantic, lexical], top_k)
+
+
+def refresh_bm25_index(chunks: Optional[List[Dict[str, Any]]]) -> None:
+    """
+    Pone al día el índice léxico con los chunks actuales y lo deja listo para buscar.
+
+    Solo se tokenizan los bloques que aún no están indexados; los bloques
+    eliminados se retiran. También se indexan los bloques sin embedding.
+    """
+    global _bm25_index
+    if not HYBRID_SEARCH or not chunks:
+        return
+    try:
+        index = BM25Index.load() or BM25Index()
+        if index.update(chunks):
+            index.save()
+        else:
+            index.attach(chunks)
+        _bm25_index = index
+    except Exception as e:
+        data_logger.error(f"Error actualizando el índice léxico: {e}")
+
+
+def refresh_fine_index(chunks: Optional[List[Dict[str, Any]]]) -> None:
+    """
+    Pone al día el índice de pasajes con los chunks actuales y lo deja listo para buscar.
+
+    Solo embebe los pasajes de los bloques que aún no están indexados; los
+    de bloques eliminados se descartan.
+    """
+    global _fine_index
+    if not FINE_INDEX or not chunks:
+        return
+    try:
+        identity = get_embedding_provider().identity
+        index = FineIndex.load()
+        if index is not None and index.embedding_model != identity:
+            data_logger.info(
+                f"El índice de pasajes es de {index.embedding_model}; se regenera con {identity}"
+            )
+            index = None
+        index = index or FineIndex(embedding_model=identity)
+        if index.update(chunks, generate_embeddings):
+            index.save()
+            # Reabrir para que la matriz quede mapeada en lugar de en memoria
+            index = FineIndex.load()
+        index.attach(chunks)
+        _fine_index = index
+    except Exception as e:
+        data_logger.error(f"Error actualizando el índice de pasajes: {e}")
+
+
+def search_similar_chunks_sklearn(question, index_model, chunks, top_k=5):
+    """
+    Busca fragmentos similares a una pregunta usando el índice vectorial.
+
+    Args:
+        question: Pregunta o texto de búsqueda (string o embedding)
+        index_model: Motor de búsqueda vectorial
+        chunks: Lista completa de fragmentos
+        top_k: Número de resultados a retornar
+
+    Returns:
+        list: Fragmentos más similares ordenados por relevancia
+    """
+    return [
+        chunk
+        for chunk, _ in search_similar_chunks_with_scores(
+            question, index_model, chunks, top_k
+        )
+    ]
+
+
 def load_existing_data() -> (
-    Tuple[Optional[List[Dict[str, Any]]], Optional[NearestNeighbors]]
+    Tuple[Optional[List[Dict[str, Any]]], Optional[CosineSearchEngine]]
 ):
-    """Carga datos existentes de embeddings e índice."""
+    """
+    Carga los chunks del almacén columnar y crea el motor de búsqueda.
+
+    El índice no se guarda en disco: se reconstruye directamente sobre la
+    matriz mapeada, lo que solo requiere calcular la norma de cada fila.
+    """
+    store = open_chunk_store()
+    if store:
+        data_logger.info("Cargando datos existentes...")
+        return index_chunk_store(store)
+    return None, None
+
+
+def open_chunk_store() -> Optional[ChunkStore]:
+    """
+    Abre el almacén de chunks, migrando antes el pickle antiguo si hace falta.
+
+    Returns:
+        Optional[ChunkStore]: None si no hay datos o no se pudieron leer
+    """
     try:
-        if os.path.exists(EMBEDDINGS_FILE) and os.path.exists(INDEX_FILE):
-            data_logger.info("Cargando datos existentes...")
-            return load_data(EMBEDDINGS_FILE), load_data(INDEX_FILE)
+        # Migrar una sola vez el pickle antiguo al almacén columnar
+        if not os.path.exists(EMBEDDINGS_MATRIX_FILE) and os.path.exists(
+            EMBEDDINGS_FILE
+        ):
+            convert_pickle_store()
+        return ChunkStore.load()
     except Exception as e:
         data_logger.error(f"Error cargando datos existentes: {e}")
+        return None
 
-    return None, None
+
+def index_chunk_store(
+    store: ChunkStore,
+) -> Tuple[List[Dict[str, Any]], Optional[CosineSearchEngine]]:
+    """
+    Crea el motor de búsqueda sobre las filas buscables del almacén.
+
+    Las filas de la lista devuelta coinciden con las del índice; las
+    eliminadas y las que no tienen embedding nunca aparecen en los resultados.
+    Si los embeddings del almacén son de otro modelo no se crea el motor.
+
+    Returns:
+        Tuple: (chunks en orden de fila, motor de búsqueda)
+    """
+    searchable = store.searchable()
+    register_chunk_lookup(ChunkLookup(store.chunks, store.matrix, searchable))
+    provider = get_embedding_provider()
+    if store.embedding_model and store.embedding_model != provider.identity:
+        data_logger.error(
+            f"El almacén se creó con {store.embedding_model} y el proveedor actual es "
+            f"{provider.identity}: la búsqueda por embeddings queda desactivada hasta reprocesar"
+        )
+        return store.chunks, None
+    try:
+        return store.chunks, build_search_index(store.matrix, searchable)
+    except Exception as e:
+        data_logger.error(f"Error creando índice vectorial: {e}")
+        return store.chunks, None
+
+
+def build_search_index(matrix: np.ndarray, embedded: np.ndarray):
+    """
+    Crea el índice de búsqueda configurado en SEARCH_BACKEND.
+
+    Con "ivf" y suficientes vectores se usa el índice aproximado IVF-flat,
+    que se carga de disco si corresponde al almacén actual o se reconstruye
+    y guarda en caso contrario. En cualquier otro caso, o si el índice
+    aproximado falla, se usa la búsqueda exacta: sobre la matriz float32
+    o, con SEARCH_QUANTIZATION, en dos pasadas (copia cuantizada en
+    memoria y rescoring de los candidatos en float32).
+
+    Returns:
+        Motor de búsqueda con métodos search(query, top_k) y atributo size
+    """
+    if SEARCH_BACKEND == "ivf" and int(embedded.sum()) >= IVF_MIN_VECTORS:
+        try:
+            signature = store_signature()
+            if os.path.exists(ANN_INDEX_FILE):
+                index = IVFFlatIndex.load(ANN_INDEX_FILE, matrix)
+                if index.signature == signature:
+                    index.n_probe = IVF_N_PROBE
+                    data_logger.info(f"Índice IVF cargado desde {ANN_INDEX_FILE}")
+                    return index
+                data_logger.info("El índice IVF no corresponde al almacén actual, se reconstruye")
+
+            index = IVFFlatIndex(n_lists=IVF_N_LISTS, n_probe=IVF_N_PROBE)
+            index.build(matrix, embedded)
+            index.signature = signature
+            index.save(ANN_INDEX_FILE)
+            return index
+        except Exception as e:
+            data_logger.error(f"Error con el índice IVF, se usa búsqueda exacta: {e}")
+
+    if SEARCH_QUANTIZATION != "none":
+        try:
+            return QuantizedSearchEngine(
+                matrix, embedded, SEARCH_QUANTIZATION, SEARCH_RESCORE_CANDIDATES
+            )
+        except Exception as e:
+            data_logger.error(f"Error con la búsqueda cuantizada, se usa la exacta en float32: {e}")
+
+    return CosineSearchEngine(matrix, embedded)
 
 
 def find_pdf_files(folder: str) -> List[str]:
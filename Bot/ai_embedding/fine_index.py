@@ -0,0 +1,323 @@
+import hashlib
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from logger import data_logger
+from ai_embedding.checkpoint import chunk_key
+from ai_embedding.embedding_provider import LEGACY_EMBEDDING_MODEL
+from ai_embedding.context_packer import make_passage, split_passages
+from constants import (
+    FINE_INDEX_META_FILE,
+    FINE_INDEX_VECTORS_FILE,
+    FINE_MIN_CONTEXT_CHARS,
+    FINE_PASSAGE_CHARS,
+)
+
+# Filas procesadas por bloque al puntuar, para no convertir toda la matriz a float32
+SCORE_BLOCK = 65536
+
+
+def parent_hash(chunk: Dict[str, Any]) -> int:
+    """Hash de 64 bits de la chunk_key de un bloque, guardado con cada uno de sus pasajes."""
+    digest = hashlib.blake2b(chunk_key(chunk).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class FineIndex:
+    """
+    Índice de pasajes (nivel fino) enlazados a sus bloques (nivel grueso).
+
+    Cada bloque del almacén se divide en pasajes de unos pocos cientos de
+    palabras con su propio embedding. Por pasaje solo se guarda el vector
+    normalizado en float16, el row_id estable de su bloque padre, un hash de
+    64 bits de la chunk_key del bloque al indexarlo y el tramo [inicio, fin)
+    que ocupa en el texto del bloque: el texto y las páginas se obtienen del
+    bloque al devolver los resultados. Un pasaje solo es válido si el bloque
+    con su row_id conserva la misma clave (el almacén puede haberse
+    regenerado y reutilizar los ids). La matriz se abre con mmap como la del
+    almacén de bloques.
+    """
+
+    def __init__(
+        self,
+        vectors: Optional[np.ndarray] = None,
+        parent_ids: Optional[np.ndarray] = None,
+        starts: Optional[np.ndarray] = None,
+        ends: Optional[np.ndarray] = None,
+        embedding_model: Optional[str] = None,
+        parent_hashes: Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            vectors: Matriz (n, d) float16 de embeddings normalizados
+            parent_ids: row_id del bloque de cada pasaje
+            starts: Inicio de cada pasaje en el texto del bloque
+            ends: Fin de cada pasaje en el texto del bloque
+            embedding_model: Identidad del modelo que generó los vectores
+            parent_hashes: Hash (uint64) de la chunk_key del bloque de cada
+                pasaje al indexarlo
+        """
+        self.vectors = vectors if vectors is not None else np.zeros((0, 0), dtype=np.float16)
+        self.parent_ids = parent_ids if parent_ids is not None else np.zeros(0, dtype=np.int64)
+        self.starts = starts if starts is not None else np.zeros(0, dtype=np.int32)
+        self.ends = ends if ends is not None else np.zeros(0, dtype=np.int32)
+        self.embedding_model = embedding_model
+        self.parent_hashes = (
+            parent_hashes if parent_hashes is not None else np.zeros(self.size, dtype=np.uint64)
+        )
+        self.parents: Dict[int, Dict[str, Any]] = {}
+        self.live = np.zeros(self.size, dtype=bool)  # pasajes cuyo bloque existe y no ha cambiado
+
+    @property
+    def size(self) -> int:
+        return len(self.parent_ids)
+
+    def attach(self, chunks: List[Dict[str, Any]]) -> None:
+        """Asocia el índice a los bloques actuales para resolver el texto de los pasajes."""
+        self.parents = {
+            chunk["row_id"]: chunk
+            for chunk in chunks
+            if "row_id" in chunk and not chunk.get("deleted")
+        }
+        hashes = {row_id: parent_hash(chunk) for row_id, chunk in self.parents.items()}
+        self.live = np.array(
+            [
+                hashes.get(parent_id) == key_hash
+                for parent_id, key_hash in zip(
+                    self.parent_ids.tolist(), self.parent_hashes.tolist()
+                )
+            ],
+            dtype=bool,
+        )
+
+    def update(
+        self,
+        chunks: List[Dict[str, Any]],
+        embed: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+        passage_chars: int = FINE_PASSAGE_CHARS,
+    ) -> bool:
+        """
+        Añade los pasajes de los bloques nuevos y descarta los de bloques eliminados.
+
+        Los pasajes de un row_id cuyo bloque ha cambiado (por ejemplo, si el
+        almacén se ha regenerado desde cero) se descartan y el bloque se
+        vuelve a dividir y embeber.
+
+        Args:
+            chunks: Bloques del almacén (con "row_id")
+            embed: Función que añade "embedding" a cada pasaje y devuelve los fallidos
+                (p. ej. generate_embeddings)
+            passage_chars: Tamaño máximo de cada pasaje
+
+        Returns:
+            bool: True si el índice ha cambiado
+        """
+        self.attach(chunks)
+        keep = self.live
+        indexed = set(self.parent_ids[keep].tolist())
+
+        passages = []
+        for row_id, chunk in self.parents.items():
+            if row_id in indexed:
+                continue
+            for passage in split_passages(chunk, passage_chars):
+                passage["parent_id"] = row_id
+                passages.append(passage)
+
+        dropped = int((~keep).sum())
+        if not passages and not dropped:
+            return False
+
+        failed = embed(passages) if passages else []
+        # Un bloque con algún pasaje fallido se reintenta entero en la siguiente ingesta
+        failed_parents = {passage["parent_id"] for passage in failed}
+        passages = [
+            passage
+            for passage in passages
+            if passage["parent_id"] not in failed_parents and "embedding" in passage
+        ]
+
+        old_vectors = np.asarray(self.vectors[keep], dtype=np.float16)
+        dimensions = (
+            len(passages[0]["embedding"]) if passages else old_vectors.shape[1]
+        )
+        if old_vectors.size and old_vectors.shape[1] != dimensions:
+            raise ValueError("Los embeddings nuevos no tienen las dimensiones del índice de pasajes")
+        old_vectors = old_vectors.reshape(-1, dimensions)
+        new_vectors = np.zeros((len(passages), dimensions), dtype=np.float32)
+        for row, passage in enumerate(passages):
+            new_vectors[row] = passage["embedding"]
+        norms = np.linalg.norm(new_vectors, axis=1, keepdims=True)
+        new_vectors /= np.where(norms > 0, norms, 1.0)
+
+        self.vectors = np.concatenate([old_vectors, new_vectors.astype(np.float16)])
+        self.parent_ids = np.concatenate(
+            [self.parent_ids[keep], np.array([p["parent_id"] for p in passages], dtype=np.int64)]
+        )
+        self.starts = np.concatenate(
+            [self.starts[keep], np.array([p["start"] for p in passages], dtype=np.int32)]
+        )
+        self.ends = np.concatenate(
+            [self.ends[keep], np.array([p["end"] for p in passages], dtype=np.int32)]
+        )
+        self.parent_hashes = np.concatenate(
+            [
+                self.parent_hashes[keep],
+                np.array(
+                    [parent_hash(self.parents[p["parent_id"]]) for p in passages],
+                    dtype=np.uint64,
+                ),
+            ]
+        )
+        self.live = np.ones(self.size, dtype=bool)
+        data_logger.info(
+            f"Índice de pasajes actualizado: {len(passages)} añadidos, {dropped} eliminados, "
+            f"{self.size} en total ({self.vectors.nbytes / 1024**2:.1f} MB)"
+        )
+        return True
+
+    def search(
+        self, query, top_k: int = 8, min_context_chars: int = FINE_MIN_CONTEXT_CHARS
+    ) -> List[Dict[str, Any]]:
+        """
+        Busca los pasajes más similares y los expande con sus vecinos si hace falta.
+
+        Los pasajes contiguos del mismo bloque se unen en una sola sección, y
+        una sección más corta que min_context_chars se amplía con el texto
+        que la rodea en su bloque.
+
+        Args:
+            query: Embedding de la consulta
+            top_k: Número de pasajes a recuperar
+            min_context_chars: Longitud mínima de cada sección devuelta
+
+        Returns:
+            List[Dict[str, Any]]: Secciones con el formato de un chunk
+            ("document", "pages", "text", "score"), de mayor a menor similitud
+        """
+        if not self.size:
+            return []
+        query = np.asarray(query, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0 or query.shape[0] != self.vectors.shape[1]:
+            return []
+        query /= norm
+
+        scores = np.empty(self.size, dtype=np.float32)
+        for start in range(0, self.size, SCORE_BLOCK):
+            block = np.asarray(self.vectors[start : start + SCORE_BLOCK], dtype=np.float32)
+            scores[start : start + len(block)] = block @ query
+        # Pasajes de bloques eliminados desde la última actualización
+        scores[~self.live] = -np.inf
+
+        k = min(top_k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = [int(row) for row in top[np.argsort(-scores[top])] if np.isfinite(scores[row])]
+        return self._sections(top, scores, min_context_chars)
+
+    def _sections(
+        self, rows: List[int], scores: np.ndarray, min_context_chars: int
+    ) -> List[Dict[str, Any]]:
+        """Agrupa los pasajes encontrados por bloque y los convierte en secciones."""
+        groups: Dict[int, List[Tuple[int, int, float]]] = {}
+        for row in rows:
+            groups.setdefault(int(self.parent_ids[row]), []).append(
+                (int(self.starts[row]), int(self.ends[row]), float(scores[row]))
+            )
+
+        sections = []
+        for parent_id, spans in groups.items():
+            parent = self.parents[parent_id]
+            text = parent.get("text", "")
+            merged = []
+            for start, end, score in sorted(spans):
+                if merged and start <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end), max(merged[-1][2], score))
+                else:
+                    merged.append((start, end, score))
+
+            for start, end, score in merged:
+                missing = min_context_chars - (end - start)
+                if missing > 0:
+                    start = max(start - missing // 2, 0)
+                    end = min(start + min_context_chars, len(text))
+                section = make_passage(parent, start, end)
+                if not section["text"]:
+                    continue
+                section.update(
+                    {
+                        "chunk_id": f"{parent.get('chunk_id')}@{start}",
+                        "parent_id": parent_id,
+                        "score": score,
+                    }
+                )
+                sections.append(section)
+
+        sections.sort(key=lambda section: -section["score"])
+        return sections
+
+    def save(
+        self,
+        vectors_path: str = FINE_INDEX_VECTORS_FILE,
+        meta_path: str = FINE_INDEX_META_FILE,
+    ) -> None:
+        """Guarda el índice de forma atómica: la matriz en .npy y los enlaces en .npz."""
+        os.makedirs(os.path.dirname(vectors_path), exist_ok=True)
+        tmp_vectors = vectors_path + ".tmp"
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, np.ascontiguousarray(self.vectors, dtype=np.float16))
+        tmp_meta = meta_path + ".tmp"
+        with open(tmp_meta, "wb") as f:
+            np.savez(
+                f,
+                parent_ids=self.parent_ids,
+                starts=self.starts,
+                ends=self.ends,
+                embedding_model=np.array(self.embedding_model or ""),
+                parent_hashes=self.parent_hashes,
+            )
+        os.replace(tmp_vectors, vectors_path)
+        os.replace(tmp_meta, meta_path)
+        data_logger.info(f"Índice de pasajes guardado en {vectors_path} ({self.size} pasajes)")
+
+    @classmethod
+    def load(
+        cls,
+        vectors_path: str = FINE_INDEX_VECTORS_FILE,
+        meta_path: str = FINE_INDEX_META_FILE,
+    ) -> Optional["FineIndex"]:
+        """
+        Abre el índice guardado, con la matriz mapeada en solo lectura.
+
+        Returns:
+            Optional[FineIndex]: None si no existe
+        """
+        if not (os.path.exists(vectors_path) and os.path.exists(meta_path)):
+            return None
+        start_time = time.time()
+        vectors = np.load(vectors_path, mmap_mode="r")
+        with np.load(meta_path) as data:
+            embedding_model = (
+                str(data["embedding_model"])
+                if "embedding_model" in data.files
+                else LEGACY_EMBEDDING_MODEL
+            )
+            # Sin hashes (índices anteriores) ningún pasaje se da por válido y se regeneran
+            parent_hashes = data["parent_hashes"] if "parent_hashes" in data.files else None
+            index = cls(
+                vectors,
+                data["parent_ids"],
+                data["starts"],
+                data["ends"],
+                embedding_model,
+                parent_hashes,
+            )
+        if vectors.shape[0] != index.size:
+            raise ValueError(
+                f"Índice de pasajes inconsistente: {vectors.shape[0]} vectores para {index.size} pasajes"
+            )
+        data_logger.info(
+            f"Índice de pasajes cargado: {index.size} pasajes en {time.time() - start_time:.2f} segundos"
+        )
+        return index
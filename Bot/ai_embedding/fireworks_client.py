@@ -0,0 +1,439 @@
+import json
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from logger import ai_logger
+from ai_embedding.embedding_pool import is_retryable_error, retry_after_seconds
+from constants import (
+    CHAT_TIMEOUT,
+    EMBEDDING_TIMEOUT,
+    FIREWORKS_BASE_URL,
+    FIREWORKS_BREAKER_FAILURES,
+    FIREWORKS_BREAKER_RESET,
+    FIREWORKS_CONNECT_TIMEOUT,
+    FIREWORKS_MAX_RETRIES,
+    FIREWORKS_POOL_SIZE,
+)
+
+ENDPOINTS = {
+    "embeddings": "/embeddings",
+    "chat": "/chat/completions",
+}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """La API se considera caída y la petición se rechaza sin enviarse."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            f"Circuito abierto: API no disponible, reintentar en {retry_after:.1f} s"
+        )
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker para una API remota, seguro entre hilos.
+
+    Tras failure_threshold fallos transitorios consecutivos el circuito se
+    abre y las peticiones fallan de inmediato durante reset_timeout
+    segundos. Después deja pasar una única petición de prueba: si tiene
+    éxito el circuito se cierra y, si falla, vuelve a abrirse.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Fallos consecutivos que abren el circuito (0 lo desactiva)
+            reset_timeout: Segundos que el circuito permanece abierto
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Estado actual: "closed", "open" o "half-open"."""
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return "open"
+            return "half-open"
+
+    def before_request(self) -> bool:
+        """
+        Comprueba si se puede enviar una petición.
+
+        Returns:
+            bool: True si es la petición de prueba del circuito semiabierto;
+            su resultado debe registrarse o, si se cancela, liberarse con
+            release_probe()
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto o ya hay una
+            petición de prueba en curso
+        """
+        if self.failure_threshold <= 0:
+            return False
+        with self.lock:
+            if self.opened_at is None:
+                return False
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+            if self.probing:
+                raise CircuitOpenError(self.reset_timeout)
+            self.probing = True
+            return True
+
+    def release_probe(self) -> None:
+        """Libera la petición de prueba cancelada sin resultado para que otra pueda probar."""
+        with self.lock:
+            self.probing = False
+
+    def record_success(self) -> None:
+        """Registra una petición correcta y cierra el circuito."""
+        with self.lock:
+            if self.opened_at is not None:
+                ai_logger.info("Circuito de la API cerrado: servicio recuperado")
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self) -> None:
+        """Registra un fallo transitorio y abre el circuito si se supera el umbral."""
+        if self.failure_threshold <= 0:
+            return
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    ai_logger.error(
+                        f"Circuito de la API abierto tras {self.failures} fallos consecutivos"
+                    )
+                self.opened_at = time.monotonic()
+                self.probing = False
+
+
+class FireworksClient:
+    """
+    Cliente HTTP único para los endpoints de embeddings y chat de Fireworks.
+
+    Reutiliza conexiones keep-alive mediante una Session con pool, aplica
+    timeouts de conexión y lectura por endpoint, reintenta los errores
+    transitorios (429, 5xx, red) con backoff exponencial y jitter, corta
+    las peticiones mientras la API está caída mediante un circuit breaker y
+    registra métricas de latencia y errores por endpoint.
+    """
+
+    def __init__(
+        self,
+        base_url: str = FIREWORKS_BASE_URL,
+        headers: Optional[Dict[str, str]] = None,
+        timeouts: Optional[Dict[str, Tuple[float, float]]] = None,
+        max_retries: int = FIREWORKS_MAX_RETRIES,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        pool_size: int = FIREWORKS_POOL_SIZE,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        """
+        Args:
+            base_url: URL base de la API (p. ej. la del servidor simulado)
+            headers: Cabeceras comunes, incluida la autorización
+            timeouts: {endpoint: (timeout de conexión, timeout de lectura)}
+            max_retries: Reintentos por defecto ante errores transitorios
+            base_delay: Espera inicial del backoff en segundos
+            max_delay: Espera máxima del backoff en segundos
+            pool_size: Conexiones keep-alive conservadas
+            breaker: Circuit breaker compartido por ambos endpoints
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = timeouts or {
+            "embeddings": (FIREWORKS_CONNECT_TIMEOUT, EMBEDDING_TIMEOUT),
+            "chat": (FIREWORKS_CONNECT_TIMEOUT, CHAT_TIMEOUT),
+        }
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker(
+            FIREWORKS_BREAKER_FAILURES, FIREWORKS_BREAKER_RESET
+        )
+
+        self.session = requests.Session()
+        if headers:
+            self.session.headers.update(headers)
+        # Los reintentos los gestiona el cliente, no urllib3
+        adapter = HTTPAdapter(
+            pool_connections=len(ENDPOINTS), pool_maxsize=pool_size, max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.metrics_lock = threading.Lock()
+        self.stats = {
+            endpoint: {
+                "requests": 0,
+                "errors": 0,
+                "retries": 0,
+                "rejected": 0,
+                "latency_total": 0.0,
+                "latency_max": 0.0,
+            }
+            for endpoint in ENDPOINTS
+        }
+
+    def url(self, endpoint: str) -> str:
+        """URL completa de un endpoint."""
+        return self.base_url + ENDPOINTS[endpoint]
+
+    def embeddings(self, payload: Dict[str, Any], max_retries: Optional[int] = None) -> Dict[str, Any]:
+        """Petición al endpoint de embeddings; devuelve la respuesta JSON."""
+        return self.post("embeddings", payload, max_retries)
+
+    def chat(self, payload: Dict[str, Any], max_retries: Optional[int] = None) -> Dict[str, Any]:
+        """Petición al endpoint de chat; devuelve la respuesta JSON."""
+        return self.post("chat", payload, max_retries)
+
+    def post(
+        self, endpoint: str, payload: Dict[str, Any], max_retries: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Envía una petición con reintentos, timeouts y circuit breaker.
+
+        Args:
+            endpoint: "embeddings" o "chat"
+            payload: Cuerpo JSON de la petición
+            max_retries: Reintentos para esta petición (None = los del cliente)
+
+        Returns:
+            Dict[str, Any]: Respuesta JSON
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto
+            requests.exceptions.RequestException: Si la petición falla tras los reintentos
+        """
+        return self._send(endpoint, payload, max_retries, lambda response: response.json())
+
+    def chat_stream(
+        self, payload: Dict[str, Any], max_retries: Optional[int] = None
+    ) -> Iterator[str]:
+        """
+        Petición al endpoint de chat con stream=True.
+
+        Los reintentos y el circuit breaker se aplican hasta recibir la
+        cabecera de la respuesta; después se leen los eventos SSE conforme
+        llegan.
+
+        Yields:
+            str: Fragmentos de texto de la respuesta, en orden
+        """
+        response = self._send(
+            "chat", dict(payload, stream=True), max_retries, lambda response: response, stream=True
+        )
+        with response:
+            response.encoding = "utf-8"
+            # chunk_size=None entrega cada chunk HTTP en cuanto llega
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:") :].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    def _send(
+        self,
+        endpoint: str,
+        payload: Dict[str, Any],
+        max_retries: Optional[int],
+        read: Callable[[requests.Response], Any],
+        stream: bool = False,
+    ) -> Any:
+        """Envía la petición con reintentos y devuelve read(respuesta)."""
+        attempt = 0
+        while True:
+            probe = self.before_attempt(endpoint)
+            start = time.perf_counter()
+            try:
+                response = self.session.post(
+                    self.url(endpoint),
+                    json=payload,
+                    timeout=self.timeouts[endpoint],
+                    stream=stream,
+                )
+                response.raise_for_status()
+                data = read(response)
+            except Exception as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                delay = self.attempt_failed(
+                    endpoint,
+                    e,
+                    time.perf_counter() - start,
+                    attempt,
+                    max_retries,
+                    is_retryable_error(e),
+                    status,
+                    retry_after_seconds(e),
+                )
+                if delay is None:
+                    raise
+                attempt += 1
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Interrupción sin resultado: no cuenta como fallo de la API
+                self.attempt_cancelled(probe)
+                raise
+
+            self.attempt_succeeded(endpoint, time.perf_counter() - start)
+            return data
+
+    # Política de reintentos, circuit breaker y métricas, compartida con el
+    # transporte asíncrono (ai_async), que solo se encarga de enviar y esperar
+
+    def before_attempt(self, endpoint: str) -> bool:
+        """
+        Comprueba el circuito antes de cada intento.
+
+        Returns:
+            bool: True si el intento es la petición de prueba del circuito
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto (la petición se cuenta como rechazada)
+        """
+        try:
+            return self.breaker.before_request()
+        except CircuitOpenError:
+            self._record(endpoint, rejected=True)
+            raise
+
+    def attempt_cancelled(self, probe: bool) -> None:
+        """
+        Registra un intento interrumpido sin resultado (cancelación o
+        KeyboardInterrupt): si era la petición de prueba se libera, o el
+        circuito rechazaría todas las peticiones siguientes.
+        """
+        if probe:
+            self.breaker.release_probe()
+
+    def attempt_succeeded(self, endpoint: str, latency: float) -> None:
+        """Registra un intento correcto y cierra el circuito."""
+        self.breaker.record_success()
+        self._record(endpoint, latency=latency)
+
+    def attempt_failed(
+        self,
+        endpoint: str,
+        error: Exception,
+        latency: float,
+        attempt: int,
+        max_retries: Optional[int],
+        retryable: bool,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+    ) -> Optional[float]:
+        """
+        Registra un intento fallido y decide si se reintenta.
+
+        Args:
+            endpoint: "embeddings" o "chat"
+            error: Error del intento
+            latency: Duración del intento en segundos
+            attempt: Reintentos ya realizados
+            max_retries: Reintentos para esta petición (None = los del cliente)
+            retryable: Si el error es transitorio (429, 5xx o de red)
+            status: Código HTTP de la respuesta, si la hubo
+            retry_after: Espera indicada por la API (Retry-After), si la hubo
+
+        Returns:
+            Optional[float]: Segundos de espera antes del reintento, o None si
+            el error debe propagarse
+        """
+        retries = self.max_retries if max_retries is None else max_retries
+        self._record(endpoint, latency=latency, error=True)
+        # Un 429 o un error no transitorio indican que el servicio responde
+        if retryable and status != 429:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if not retryable or attempt >= retries:
+            return None
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2**attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self._record(endpoint, retry=True)
+        ai_logger.warning(
+            f"Error transitorio en {endpoint} ({error}); reintento {attempt + 1}/{retries} en {delay:.2f} s"
+        )
+        return delay
+
+    def _record(
+        self,
+        endpoint: str,
+        latency: Optional[float] = None,
+        error: bool = False,
+        retry: bool = False,
+        rejected: bool = False,
+    ) -> None:
+        """Actualiza las métricas de un endpoint."""
+        with self.metrics_lock:
+            stats = self.stats[endpoint]
+            if latency is not None:
+                stats["requests"] += 1
+                stats["latency_total"] += latency
+                stats["latency_max"] = max(stats["latency_max"], latency)
+            stats["errors"] += error
+            stats["retries"] += retry
+            stats["rejected"] += rejected
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        Métricas acumuladas por endpoint.
+
+        Returns:
+            Dict: {endpoint: {requests, errors, retries, rejected,
+            latency_avg, latency_max}} y el estado del circuito
+        """
+        with self.metrics_lock:
+            result = {}
+            for endpoint, stats in self.stats.items():
+                result[endpoint] = {
+                    "requests": stats["requests"],
+                    "errors": stats["errors"],
+                    "retries": stats["retries"],
+                    "rejected": stats["rejected"],
+                    "latency_avg": (
+                        stats["latency_total"] / stats["requests"] if stats["requests"] else 0.0
+                    ),
+                    "latency_max": stats["latency_max"],
+                }
+        result["circuit"] = self.breaker.state
+        return result
+
+    def log_metrics(self) -> None:
+        """Registra un resumen de las métricas en el log de IA."""
+        metrics = self.metrics()
+        for endpoint in ENDPOINTS:
+            stats = metrics[endpoint]
+            ai_logger.info(
+                f"API {endpoint}: {stats['requests']} peticiones, {stats['errors']} errores, "
+                f"{stats['retries']} reintentos, {stats['rejected']} rechazadas, "
+                f"latencia media {stats['latency_avg'] * 1000:.0f} ms (máx. {stats['latency_max'] * 1000:.0f} ms)"
+            )
+        ai_logger.info(f"Circuito de la API: {metrics['circuit']}")
+
+    def close(self) -> None:
+        """Cierra las conexiones del pool."""
+        self.session.close()
@@ -0,0 +1,166 @@
+import argparse
+import hashlib
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable, Optional, Tuple
+import numpy as np
+
+
+def stub_embedding(text: str, dimensions: int = 768) -> list:
+    """Embedding determinista y normalizado derivado del hash del texto."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class StubState:
+    """Configuración y contadores compartidos por las peticiones al servidor simulado."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        failures: Optional[Iterable[int]] = None,
+        token_delay: float = 0.0,
+    ):
+        """
+        Args:
+            latency: Segundos de espera antes de cada respuesta
+            token_delay: Segundos entre fragmentos de una respuesta en streaming
+            failures: Códigos HTTP que devolverán las siguientes peticiones,
+                en orden, antes de volver a responder con normalidad
+        """
+        self.latency = latency
+        self.token_delay = token_delay
+        self.failures = deque(failures or [])
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def fail_next(self, *status_codes: int) -> None:
+        """Programa errores HTTP para las siguientes peticiones."""
+        with self.lock:
+            self.failures.extend(status_codes)
+
+    def next_failure(self) -> Optional[int]:
+        """Cuenta la petición y devuelve el error programado, si lo hay."""
+        with self.lock:
+            self.requests += 1
+            return self.failures.popleft() if self.failures else None
+
+
+class FireworksStubHandler(BaseHTTPRequestHandler):
+    """Imita los endpoints de embeddings y chat de la API de Fireworks."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        state: StubState = self.server.state
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if state.latency:
+            time.sleep(state.latency)
+
+        failure = state.next_failure()
+        if failure is not None:
+            self._send_json(failure, {"error": f"Error simulado {failure}"})
+            return
+
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "JSON inválido"})
+            return
+
+        if self.path.endswith("/embeddings"):
+            inputs = payload.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            dimensions = payload.get("dimensions", 768)
+            data = [
+                {"index": i, "embedding": stub_embedding(text, dimensions)}
+                for i, text in enumerate(inputs)
+            ]
+            self._send_json(200, {"data": data, "model": payload.get("model")})
+        elif self.path.endswith("/chat/completions"):
+            question = payload.get("messages", [{}])[-1].get("content", "")
+            content = f"Respuesta simulada ({len(question)} caracteres de prompt)."
+            if payload.get("stream"):
+                self._send_stream(content, state.token_delay)
+                return
+            self._send_json(
+                200, {"choices": [{"message": {"role": "assistant", "content": content}}]}
+            )
+        else:
+            self._send_json(404, {"error": f"Ruta desconocida: {self.path}"})
+
+    def _send_json(self, status: int, data: dict) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, content: str, token_delay: float) -> None:
+        """Envía la respuesta como eventos SSE (una palabra por evento) en chunks HTTP."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [
+            json.dumps({"choices": [{"index": 0, "delta": {"content": word + " "}}]})
+            for word in content.split(" ")
+        ]
+        for data in events + ["[DONE]"]:
+            chunk = f"data: {data}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+            self.wfile.flush()
+            if token_delay:
+                time.sleep(token_delay)
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(
+    host: str = "127.0.0.1", port: int = 0, state: Optional[StubState] = None
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Arranca el servidor simulado en un hilo en segundo plano.
+
+    Args:
+        host: Dirección de escucha
+        port: Puerto (0 = uno libre cualquiera)
+        state: Configuración de latencia y errores
+
+    Returns:
+        Tuple: (servidor, URL base para FIREWORKS_BASE_URL); server.shutdown() lo detiene
+    """
+    server = ThreadingHTTPServer((host, port), FireworksStubHandler)
+    server.daemon_threads = True
+    server.state = state or StubState()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{host}:{server.server_address[1]}/inference/v1"
+    return server, base_url
+
+
+if __name__ == "__main__":
+    # Servidor local para probar sin red: python -m ai_embedding.fireworks_stub (desde Bot/)
+    parser = argparse.ArgumentParser(description="Servidor simulado de la API de Fireworks")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(
+        port=args.port, state=StubState(args.latency, token_delay=args.token_delay)
+    )
+    print(f"Servidor simulado en {base_url} (FIREWORKS_BASE_URL={base_url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+from logger import data_logger
+from constants import MANIFEST_FILE
+
+
+def file_sha256(file_path: str, block_size: int = 1 << 20) -> str:
+    """Calcula el hash SHA-256 del contenido de un archivo."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(file_path: str = MANIFEST_FILE) -> Dict[str, Dict[str, Any]]:
+    """
+    Carga el manifiesto de ingesta.
+
+    Returns:
+        Dict: {hash de contenido: {"path", "size", "mtime"}} (vacío si no existe)
+    """
+    if not os.path.exists(file_path):
+        return {}
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("documents", {})
+    except Exception as e:
+        data_logger.error(f"Error cargando manifiesto {file_path}: {e}")
+        return {}
+
+
+def save_manifest(
+    documents: Dict[str, Dict[str, Any]], file_path: str = MANIFEST_FILE
+) -> None:
+    """Guarda el manifiesto de forma atómica."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "documents": documents}, f, indent=1)
+    os.replace(tmp_path, file_path)
+    data_logger.info(f"Manifiesto guardado en {file_path} ({len(documents)} documentos)")
+
+
+def hash_documents(
+    pdf_files: List[str], manifest: Dict[str, Dict[str, Any]]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Obtiene el hash de contenido de cada PDF.
+
+    Si la ruta, el tamaño y la fecha de modificación coinciden con el
+    manifiesto, se reutiliza el hash guardado sin leer el archivo.
+
+    Returns:
+        Dict: {ruta: {"hash", "size", "mtime"}} para los archivos legibles
+    """
+    known = {entry["path"]: (content_hash, entry) for content_hash, entry in manifest.items()}
+    documents = {}
+    hashed = 0
+    for pdf_path in pdf_files:
+        try:
+            stat = os.stat(pdf_path)
+            cached = known.get(pdf_path)
+            if (
+                cached
+                and cached[1].get("size") == stat.st_size
+                and cached[1].get("mtime") == stat.st_mtime
+            ):
+                content_hash = cached[0]
+            else:
+                content_hash = file_sha256(pdf_path)
+                hashed += 1
+            documents[pdf_path] = {
+                "hash": content_hash,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+            }
+        except OSError as e:
+            data_logger.error(f"No se pudo leer {pdf_path}: {e}")
+
+    data_logger.info(
+        f"Hashes de contenido: {hashed} calculados, {len(documents) - hashed} reutilizados del manifiesto"
+    )
+    return documents
+
+
+def bootstrap_manifest(
+    documents: Dict[str, Dict[str, Any]],
+    existing_chunks: Optional[List[Dict[str, Any]]],
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Construye un manifiesto inicial a partir de los chunks ya procesados.
+
+    Se usa con datos creados antes de existir el manifiesto y cuando el
+    manifiesto falta o está dañado. Los chunks que ya tienen hash de
+    contenido se registran con la ruta que guardan, de modo que
+    diff_documents detecta si el documento sigue igual, se ha movido o se
+    ha eliminado. Los chunks antiguos solo conocen el nombre del documento,
+    así que se asocian al archivo actual con el mismo nombre base y se
+    marcan con su hash.
+
+    Returns:
+        Dict: Manifiesto con los documentos ya presentes en los chunks
+    """
+    by_basename = {os.path.basename(path): path for path in documents}
+    manifest = {}
+    for chunk in existing_chunks or []:
+        content_hash = chunk.get("content_hash")
+        if content_hash is None:
+            path = by_basename.get(os.path.basename(chunk.get("document", "")))
+            if not path:
+                continue
+            content_hash = documents[path]["hash"]
+            chunk["content_hash"] = content_hash
+        else:
+            path = chunk.get("document", "")
+        if content_hash in manifest:
+            continue
+
+        info = documents.get(path)
+        if info is None or info["hash"] != content_hash:
+            info = {"size": None, "mtime": None}
+        manifest[content_hash] = {
+            "path": path,
+            "size": info["size"],
+            "mtime": info["mtime"],
+        }
+
+    if manifest:
+        data_logger.info(
+            f"Manifiesto inicial creado a partir de {len(manifest)} documentos ya procesados"
+        )
+    return manifest
+
+
+def diff_documents(
+    documents: Dict[str, Dict[str, Any]], manifest: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Compara los documentos actuales con el manifiesto.
+
+    Args:
+        documents: {ruta: {"hash", "size", "mtime"}} de los archivos actuales
+        manifest: Manifiesto de la última ingesta
+
+    Returns:
+        Dict con las claves:
+            added: rutas de documentos nuevos
+            changed: rutas cuyo contenido ha cambiado
+            renamed: {hash: ruta nueva} de documentos movidos o renombrados
+            deleted: hashes de documentos que ya no existen
+            stale: hashes cuyos chunks deben eliminarse (borrados o modificados)
+            unchanged: rutas sin cambios
+    """
+    manifest_paths = {entry["path"]: content_hash for content_hash, entry in manifest.items()}
+    current_hashes = set()
+    diff = {
+        "added": [],
+        "changed": [],
+        "renamed": {},
+        "deleted": [],
+        "stale": [],
+        "unchanged": [],
+    }
+
+    for path, info in documents.items():
+        content_hash = info["hash"]
+        if content_hash in current_hashes:
+            data_logger.warning(f"Documento duplicado (omitido): {path}")
+            continue
+        current_hashes.add(content_hash)
+
+        entry = manifest.get(content_hash)
+        if entry is None:
+            if path in manifest_paths:
+                diff["changed"].append(path)
+            else:
+                diff["added"].append(path)
+        elif entry["path"] != path:
+            diff["renamed"][content_hash] = path
+        else:
+            diff["unchanged"].append(path)
+
+    for content_hash in manifest:
+        if content_hash not in current_hashes:
+            diff["stale"].append(content_hash)
+            # Si su ruta sigue existiendo con otro contenido es una modificación
+            if manifest[content_hash]["path"] not in documents:
+                diff["deleted"].append(content_hash)
+
+    data_logger.info(
+        f"Cambios detectados: {len(diff['added'])} nuevos, {len(diff['changed'])} modificados, "
+        f"{len(diff['renamed'])} renombrados, {len(diff['deleted'])} eliminados, "
+        f"{len(diff['unchanged'])} sin cambios"
+    )
+    return diff
@@ -0,0 +1,235 @@
+import multiprocessing
+import time
+from multiprocessing.connection import wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import PyPDF2
+from logger import data_logger
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """Devuelve el número de páginas de un PDF sin extraer su texto."""
+    with open(pdf_path, "rb") as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+# Páginas por mensaje enviado desde cada proceso de extracción
+PAGE_BATCH = 8
+
+
+def iter_pages(
+    pdf_path: str, first_page: int = 1, last_page: Optional[int] = None
+) -> Iterator[Tuple[int, str]]:
+    """
+    Extrae el texto de un rango de páginas de un PDF, página a página.
+
+    Args:
+        pdf_path: Ruta del archivo PDF
+        first_page: Primera página a extraer (empezando en 1)
+        last_page: Última página a extraer, incluida (None = hasta el final)
+
+    Yields:
+        Tuple[int, str]: Pares (número de página, texto) en orden
+    """
+    with open(pdf_path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        last_page = len(reader.pages) if last_page is None else last_page
+        for page_number in range(first_page, last_page + 1):
+            yield page_number, reader.pages[page_number - 1].extract_text()
+
+
+def extract_pages(
+    pdf_path: str, first_page: int = 1, last_page: Optional[int] = None
+) -> List[Tuple[int, str]]:
+    """
+    Extrae el texto de un rango de páginas de un PDF.
+
+    Returns:
+        List[Tuple[int, str]]: Pares (número de página, texto) en orden
+    """
+    return list(iter_pages(pdf_path, first_page, last_page))
+
+
+def _extraction_worker(
+    conn, pdf_path: str, first_page: int, last_page: Optional[int], batch_size: int
+) -> None:
+    """
+    Punto de entrada del proceso hijo: envía las páginas por la tubería en
+    lotes según se extraen y termina con ("done", None) o ("error", mensaje).
+    """
+    try:
+        batch = []
+        for page in iter_pages(pdf_path, first_page, last_page):
+            batch.append(page)
+            if len(batch) >= batch_size:
+                conn.send(("pages", batch))
+                batch = []
+        if batch:
+            conn.send(("pages", batch))
+        conn.send(("done", None))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def run_extraction_tasks(
+    tasks: List[Tuple[str, int, Optional[int]]],
+    max_workers: int,
+    timeout: float,
+    batch_size: int = PAGE_BATCH,
+) -> Iterator[Tuple[int, Tuple[str, Any]]]:
+    """
+    Ejecuta tareas de extracción en procesos independientes.
+
+    Cada tarea corre en su propio proceso con un tiempo límite medido desde
+    su arranque; si lo supera, el proceso se termina y la tarea se marca
+    como fallida sin afectar al resto. Las páginas se entregan en lotes
+    según llegan, sin esperar a que termine la tarea: el proceso padre
+    nunca reúne un documento entero, y un hijo que produce más rápido de lo
+    que se consume queda bloqueado en la tubería.
+
+    Args:
+        tasks: Tareas (ruta del PDF, primera página, última página)
+        max_workers: Número máximo de procesos simultáneos
+        timeout: Segundos máximos por tarea
+        batch_size: Páginas por mensaje
+
+    Yields:
+        Tuple: (posición de la tarea, evento), con los eventos de cada tarea
+        en orden: ("pages", [(página, texto), ...]) y al final ("done", None)
+        o ("error", mensaje)
+    """
+    ctx = multiprocessing.get_context()
+    pending = list(enumerate(tasks))
+    pending.reverse()
+    running = {}  # conn -> (posición, proceso, instante de inicio)
+
+    def stop(conn) -> None:
+        _, process, _ = running.pop(conn)
+        conn.close()
+        process.join()
+
+    while pending or running:
+        # Lanzar procesos hasta ocupar todos los huecos disponibles
+        while pending and len(running) < max(1, max_workers):
+            position, (pdf_path, first_page, last_page) = pending.pop()
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            process = ctx.Process(
+                target=_extraction_worker,
+                args=(child_conn, pdf_path, first_page, last_page, batch_size),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            running[parent_conn] = (position, process, time.monotonic())
+
+        now = time.monotonic()
+        next_deadline = min(start + timeout for _, _, start in running.values())
+        ready = wait(list(running), timeout=max(0.0, next_deadline - now))
+
+        for conn in ready:
+            position, process, _ = running[conn]
+            try:
+                event = conn.recv()
+            except EOFError:
+                process.join()
+                event = (
+                    "error",
+                    f"el proceso terminó inesperadamente (código {process.exitcode})",
+                )
+            if event[0] != "pages":
+                stop(conn)
+            yield position, event
+
+        # Terminar las tareas que han superado su tiempo límite
+        now = time.monotonic()
+        for conn, (position, process, start) in list(running.items()):
+            if now - start >= timeout:
+                process.terminate()
+                stop(conn)
+                yield position, ("error", f"tiempo límite de {timeout:.0f} s superado")
+
+
+def extract_documents_parallel(
+    pdf_paths: List[str],
+    max_workers: int,
+    timeout: float,
+    pages_per_task: int = 0,
+) -> Iterator[Tuple[str, str, Any]]:
+    """
+    Extrae el texto de varios PDFs en paralelo, aislando los errores.
+
+    Las páginas de cada documento se entregan en orden y en lotes según se
+    extraen, intercaladas con las de los demás documentos. Solo se retienen
+    en memoria las páginas de una tarea que termina antes que la anterior
+    del mismo documento (como mucho pages_per_task páginas por tarea).
+
+    Args:
+        pdf_paths: Rutas de los PDFs a extraer
+        max_workers: Número máximo de procesos simultáneos
+        timeout: Segundos máximos por tarea
+        pages_per_task: Páginas por tarea (0 = una tarea por documento)
+
+    Yields:
+        Tuple: (ruta, evento, datos) con evento "pages" y una lista de pares
+        (página, texto), "done" y el número de páginas extraídas, o "error"
+        y el mensaje. Tras "done" o "error" no hay más eventos del documento,
+        y las páginas ya entregadas de un documento con error deben descartarse.
+    """
+    tasks = []
+    owners = []  # posición del documento al que pertenece cada tarea
+    doc_tasks = {}  # posición del documento -> sus tareas, en orden de páginas
+    for doc_position, pdf_path in enumerate(pdf_paths):
+        if pages_per_task <= 0:
+            ranges = [(1, None)]
+        else:
+            try:
+                page_count = count_pdf_pages(pdf_path)
+            except Exception as e:
+                yield pdf_path, "error", f"{type(e).__name__}: {e}"
+                continue
+            ranges = [
+                (first_page, min(first_page + pages_per_task - 1, page_count))
+                for first_page in range(1, page_count + 1, pages_per_task)
+            ]
+            if not ranges:
+                yield pdf_path, "done", 0
+                continue
+        for first_page, last_page in ranges:
+            doc_tasks.setdefault(doc_position, []).append(len(tasks))
+            tasks.append((pdf_path, first_page, last_page))
+            owners.append(doc_position)
+
+    current = {doc_position: 0 for doc_position in doc_tasks}  # tarea que se entrega
+    waiting = {}  # tarea posterior a la actual -> sus eventos recibidos
+    page_counts = {doc_position: 0 for doc_position in doc_tasks}
+    failed = set()
+
+    for position, event in run_extraction_tasks(tasks, max_workers, timeout):
+        doc_position = owners[position]
+        pdf_path = pdf_paths[doc_position]
+        if doc_position in failed:
+            continue
+        if event[0] == "error":
+            failed.add(doc_position)
+            data_logger.error(f"Error extrayendo páginas de {pdf_path}: {event[1]}")
+            yield pdf_path, "error", event[1]
+            continue
+
+        order = doc_tasks[doc_position]
+        if position != order[current[doc_position]]:
+            waiting.setdefault(position, []).append(event)
+            continue
+
+        events = [event]
+        while events:
+            kind, payload = events.pop(0)
+            if kind == "pages":
+                page_counts[doc_position] += len(payload)
+                yield pdf_path, "pages", payload
+                continue
+            current[doc_position] += 1
+            if current[doc_position] == len(order):
+                yield pdf_path, "done", page_counts[doc_position]
+            else:
+                events.extend(waiting.pop(order[current[doc_position]], []))
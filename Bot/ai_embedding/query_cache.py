@@ -0,0 +1,161 @@
+import os
+import pickle
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from logger import ai_logger
+
+
+def normalize_query(text: str) -> str:
+    """
+    Forma normalizada de una consulta para usarla como clave de caché.
+
+    Ignora mayúsculas, acentos, espacios repetidos y los signos de
+    interrogación o exclamación de los extremos, de modo que
+    "¿Qué es  BLAST?" y "que es blast" comparten entrada.
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    folded = " ".join(without_accents.casefold().split())
+    return folded.strip("¿?¡!.,;: ")
+
+
+class QueryEmbeddingCache:
+    """
+    Caché en memoria de embeddings de consultas con desalojo LRU y TTL.
+
+    Es segura entre hilos, cuenta aciertos y fallos y, opcionalmente, se
+    guarda en disco para sobrevivir a reinicios del bot.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl: float = 7 * 24 * 3600,
+        persist_path: Optional[str] = None,
+        model: str = "",
+        save_every: int = 32,
+    ):
+        """
+        Args:
+            max_entries: Número máximo de consultas en caché
+            ttl: Segundos de validez de cada entrada
+            persist_path: Archivo donde guardar la caché (None = solo memoria)
+            model: Modelo de embeddings; una caché guardada con otro se descarta
+            save_every: Entradas nuevas entre cada guardado en disco
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self.model = model
+        self.save_every = save_every
+        self.entries = OrderedDict()  # clave -> (instante de creación, embedding)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.unsaved = 0
+        if persist_path:
+            self.load()
+
+    def get(self, query: str) -> Optional[List[float]]:
+        """Devuelve el embedding en caché de la consulta, o None."""
+        key = normalize_query(query)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, embedding: List[float]) -> None:
+        """Guarda el embedding de una consulta, desalojando la menos reciente si hace falta."""
+        key = normalize_query(query)
+        with self.lock:
+            self.entries[key] = (time.time(), embedding)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.unsaved += 1
+            should_save = self.persist_path and self.unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def get_or_compute(
+        self, query: str, compute: Callable[[str], Optional[List[float]]]
+    ) -> Optional[List[float]]:
+        """
+        Devuelve el embedding en caché o lo calcula con compute y lo guarda.
+
+        Los resultados vacíos (errores de la API) no se guardan.
+        """
+        embedding = self.get(query)
+        if embedding is not None:
+            return embedding
+        embedding = compute(query)
+        if embedding:
+            self.put(query, embedding)
+        return embedding
+
+    def use_model(self, model: str) -> None:
+        """Cambia de modelo de embeddings, descartando las entradas del anterior."""
+        with self.lock:
+            if model == self.model:
+                return
+            self.entries.clear()
+            self.model = model
+            self.unsaved = 0
+        ai_logger.info(f"Caché de consultas vaciada: nuevo modelo de embeddings {model}")
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores de uso de la caché."""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def save(self) -> None:
+        """Guarda en disco las entradas vigentes."""
+        if not self.persist_path:
+            return
+        with self.lock:
+            snapshot = list(self.entries.items())
+            self.unsaved = 0
+        try:
+            os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
+            tmp_path = self.persist_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"model": self.model, "entries": snapshot}, f)
+            os.replace(tmp_path, self.persist_path)
+        except Exception as e:
+            ai_logger.error(f"Error guardando caché de consultas: {e}")
+
+    def load(self) -> None:
+        """Carga las entradas guardadas que no hayan caducado."""
+        if not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "rb") as f:
+                data = pickle.load(f)
+            if data.get("model") != self.model:
+                ai_logger.info("Caché de consultas de otro modelo descartada")
+                return
+            now = time.time()
+            with self.lock:
+                for key, (created, embedding) in data["entries"]:
+                    if now - created < self.ttl:
+                        self.entries[key] = (created, embedding)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            ai_logger.info(f"Caché de consultas cargada: {len(self.entries)} entradas")
+        except Exception as e:
+            ai_logger.error(f"Error cargando caché de consultas: {e}")
@@ -0,0 +1,215 @@
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+from logger import data_logger
+
+
+class CosineSearchEngine:
+    """
+    Búsqueda exacta por similitud coseno sobre una matriz float32.
+
+    En lugar de normalizar una copia de la matriz se guarda el inverso de
+    la norma de cada fila, de modo que la matriz puede seguir mapeada desde
+    disco. Cada consulta es un único producto matriz-vector (BLAS) seguido
+    de argpartition para el top-k.
+    """
+
+    def __init__(self, matrix: np.ndarray, valid: Optional[np.ndarray] = None):
+        """
+        Args:
+            matrix: Matriz (n, d) de embeddings, una fila por chunk
+            valid: Máscara booleana de filas que pueden aparecer en resultados
+        """
+        start_time = time.time()
+        self.matrix = matrix
+        # einsum evita materializar matrix ** 2 completo en memoria
+        norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix, dtype=np.float32))
+        usable = norms > 0
+        if valid is not None:
+            usable &= np.asarray(valid, dtype=bool)
+        self.inv_norms = np.zeros(len(norms), dtype=np.float32)
+        self.inv_norms[usable] = 1.0 / norms[usable]
+        self.usable = usable
+        self.size = int(usable.sum())
+        data_logger.info(
+            f"Motor de búsqueda coseno creado con {self.size} vectores en {(time.time() - start_time) * 1000:.1f} ms"
+        )
+
+    def search(self, query, top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Devuelve las filas más similares a la consulta.
+
+        Args:
+            query: Embedding de la consulta
+            top_k: Número de resultados
+
+        Returns:
+            List[Tuple[int, float]]: (fila, similitud coseno) de mayor a menor
+        """
+        k = min(top_k, self.size)
+        if k <= 0:
+            return []
+
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return []
+
+        scores = self.matrix @ (query / query_norm)
+        scores *= self.inv_norms
+        scores[~self.usable] = -np.inf
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+
+# Filas procesadas por bloque al cuantizar y en la primera pasada
+QUANTIZED_BLOCK = 8192
+# Candidatos que se vuelven a puntuar en float32 según la cuantización
+DEFAULT_RESCORE_CANDIDATES = {"float16": 20, "int8": 50, "binary": 500}
+# Bits a 1 de cada byte, para numpy sin bitwise_count
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(codes: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(codes)
+    return _POPCOUNT[codes]
+
+
+class QuantizedSearchEngine:
+    """
+    Búsqueda coseno en dos pasadas sobre vectores cuantizados.
+
+    La primera pasada recorre una copia comprimida en memoria de las filas
+    normalizadas: float16 (la mitad que float32), int8 con una escala por
+    fila (la cuarta parte) o binaria con un bit de signo por dimensión (la
+    trigésimo segunda parte, comparada por distancia de Hamming). Los
+    mejores candidatos se vuelven a puntuar con la matriz float32 mapeada
+    desde disco, de la que solo se leen esas filas, de modo que las
+    similitudes devueltas son exactas.
+    """
+
+    CODECS = ("float16", "int8", "binary")
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        valid: Optional[np.ndarray] = None,
+        codec: str = "int8",
+        rescore_candidates: int = 0,
+    ):
+        """
+        Args:
+            matrix: Matriz (n, d) float32 de embeddings, una fila por chunk
+            valid: Máscara booleana de filas que pueden aparecer en resultados
+            codec: "float16", "int8" o "binary"
+            rescore_candidates: Candidatos de la primera pasada que se vuelven
+                a puntuar en float32 (0 = valor por defecto del codec)
+        """
+        if codec not in self.CODECS:
+            raise ValueError(f"Cuantización desconocida: {codec}")
+        start_time = time.time()
+        self.matrix = matrix
+        self.codec = codec
+        self.rescore_candidates = rescore_candidates or DEFAULT_RESCORE_CANDIDATES[codec]
+
+        n, dimensions = matrix.shape
+        self.inv_norms = np.zeros(n, dtype=np.float32)
+        self.scales = np.ones(n, dtype=np.float32) if codec == "int8" else None
+        if codec == "binary":
+            self.codes = np.zeros((n, (dimensions + 7) // 8), dtype=np.uint8)
+        else:
+            self.codes = np.zeros((n, dimensions), dtype=np.dtype(codec))
+
+        for start in range(0, n, QUANTIZED_BLOCK):
+            block = np.asarray(matrix[start : start + QUANTIZED_BLOCK], dtype=np.float32)
+            rows = slice(start, start + len(block))
+            norms = np.linalg.norm(block, axis=1)
+            inv = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+            self.inv_norms[rows] = inv
+            block = block * inv[:, None]
+            if codec == "float16":
+                self.codes[rows] = block
+            elif codec == "int8":
+                peaks = np.abs(block).max(axis=1)
+                scales = np.where(peaks > 0, peaks / 127.0, 1.0).astype(np.float32)
+                self.scales[rows] = scales
+                self.codes[rows] = np.rint(block / scales[:, None])
+            else:
+                self.codes[rows] = np.packbits(block > 0, axis=1)
+
+        usable = self.inv_norms > 0
+        if valid is not None:
+            usable &= np.asarray(valid, dtype=bool)
+        self.usable = usable
+        self.size = int(usable.sum())
+        self.dimensions = dimensions
+        data_logger.info(
+            f"Motor de búsqueda cuantizado ({codec}) creado con {self.size} vectores, "
+            f"{self.nbytes / 1024**2:.1f} MB en memoria, en {(time.time() - start_time) * 1000:.1f} ms"
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria de la copia cuantizada (sin la matriz mapeada)."""
+        extra = self.scales.nbytes if self.scales is not None else 0
+        return self.codes.nbytes + self.inv_norms.nbytes + extra
+
+    def approximate_scores(self, query: np.ndarray) -> np.ndarray:
+        """
+        Puntuaciones de la primera pasada para una consulta normalizada.
+
+        En binario es el número de bits coincidentes; en el resto, la
+        similitud coseno aproximada.
+        """
+        n = len(self.codes)
+        scores = np.empty(n, dtype=np.float32)
+        if self.codec == "binary":
+            query_bits = np.packbits(query > 0)
+            for start in range(0, n, QUANTIZED_BLOCK):
+                block = self.codes[start : start + QUANTIZED_BLOCK]
+                distance = _popcount(block ^ query_bits).sum(axis=1, dtype=np.int32)
+                scores[start : start + len(block)] = self.dimensions - distance
+            return scores
+
+        for start in range(0, n, QUANTIZED_BLOCK):
+            block = self.codes[start : start + QUANTIZED_BLOCK].astype(np.float32)
+            scores[start : start + len(block)] = block @ query
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def search(self, query, top_k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Devuelve las filas más similares a la consulta.
+
+        Args:
+            query: Embedding de la consulta
+            top_k: Número de resultados
+
+        Returns:
+            List[Tuple[int, float]]: (fila, similitud coseno exacta) de mayor a menor
+        """
+        k = min(top_k, self.size)
+        if k <= 0:
+            return []
+
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query_norm = np.linalg.norm(query)
+        if query_norm == 0:
+            return []
+        query = query / query_norm
+
+        scores = self.approximate_scores(query)
+        scores[~self.usable] = -np.inf
+        n_candidates = min(max(self.rescore_candidates, k), self.size)
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        # Filas en orden para que la lectura del mmap sea secuencial
+        candidates = np.sort(candidates)
+
+        exact = np.asarray(self.matrix[candidates], dtype=np.float32) @ query
+        exact *= self.inv_norms[candidates]
+        top = np.argsort(-exact)[:k]
+        return [(int(candidates[i]), float(exact[i])) for i in top]
@@ -0,0 +1,398 @@
+import os
+import pickle
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from logger import data_logger
+from ai_embedding.embedding_provider import LEGACY_EMBEDDING_MODEL
+from constants import (
+    CHUNK_STORE_COMPACT_RATIO,
+    CHUNKS_META_FILE,
+    EMBEDDINGS_FILE,
+    EMBEDDINGS_MATRIX_FILE,
+)
+
+STORE_VERSION = 2
+
+
+def save_embedding_store(
+    chunks: List[Dict[str, Any]],
+    matrix_path: str = EMBEDDINGS_MATRIX_FILE,
+    meta_path: str = CHUNKS_META_FILE,
+    ids: Optional[np.ndarray] = None,
+    deleted: Optional[np.ndarray] = None,
+    next_id: Optional[int] = None,
+    embedding_model: Optional[str] = None,
+) -> None:
+    """
+    Guarda los chunks en formato columnar.
+
+    Los embeddings se escriben como una matriz float32 contigua (.npy), con
+    una fila por chunk en el mismo orden que la lista; los metadatos se
+    guardan aparte sin los vectores. Los chunks sin embedding ocupan una
+    fila de ceros y quedan marcados en el sidecar.
+
+    Args:
+        chunks: Lista de fragmentos con metadatos y embeddings
+        matrix_path: Ruta de la matriz de embeddings
+        meta_path: Ruta del sidecar de metadatos
+        ids: Identificador estable de cada fila (por defecto, su posición)
+        deleted: Máscara de filas eliminadas (tombstones)
+        next_id: Siguiente identificador libre
+        embedding_model: Identidad del modelo que generó los embeddings
+    """
+    n = len(chunks)
+    ids = np.arange(n, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+    deleted = np.zeros(n, dtype=bool) if deleted is None else np.asarray(deleted, dtype=bool)
+    next_id = int(ids.max()) + 1 if next_id is None and n else (next_id or 0)
+    dimensions = next(
+        (len(chunk["embedding"]) for chunk in chunks if "embedding" in chunk), 0
+    )
+
+    os.makedirs(os.path.dirname(matrix_path), exist_ok=True)
+    os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+
+    # Escritura atómica: los procesos que tengan la matriz mapeada siguen
+    # leyendo el archivo anterior hasta que la vuelvan a abrir. La matriz se
+    # escribe fila a fila sobre un mmap para no duplicarla en memoria.
+    tmp_matrix = matrix_path + ".tmp"
+    matrix = np.lib.format.open_memmap(
+        tmp_matrix, mode="w+", dtype=np.float32, shape=(n, dimensions)
+    )
+    embedded = np.zeros(n, dtype=bool)
+    metadata = []
+    for row, chunk in enumerate(chunks):
+        if "embedding" in chunk:
+            matrix[row] = chunk["embedding"]
+            embedded[row] = True
+        metadata.append(
+            {
+                key: value
+                for key, value in chunk.items()
+                if key not in ("embedding", "row_id", "deleted")
+            }
+        )
+    matrix.flush()
+    del matrix
+
+    tmp_meta = meta_path + ".tmp"
+    with open(tmp_meta, "wb") as f:
+        pickle.dump(
+            {
+                "version": STORE_VERSION,
+                "dimensions": dimensions,
+                "embedded": embedded,
+                "deleted": deleted,
+                "ids": ids,
+                "next_id": next_id,
+                "embedding_model": embedding_model,
+                "chunks": metadata,
+            },
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp_matrix, matrix_path)
+    os.replace(tmp_meta, meta_path)
+    data_logger.info(
+        f"Almacén de embeddings guardado: {n} chunks ({int(deleted.sum())} eliminados), matriz {(n, dimensions)} en {matrix_path}"
+    )
+
+
+def load_embedding_store(
+    matrix_path: str = EMBEDDINGS_MATRIX_FILE,
+    meta_path: str = CHUNKS_META_FILE,
+) -> Optional[Tuple[List[Dict[str, Any]], np.ndarray, np.ndarray]]:
+    """
+    Carga los chunks desde el formato columnar.
+
+    Returns:
+        Optional[Tuple]: (chunks con sus embeddings, matriz mapeada, máscara
+        de filas buscables), o None si no existe el almacén
+    """
+    store = ChunkStore.load(matrix_path, meta_path)
+    if store is None:
+        return None
+    return store.chunks, store.matrix, store.searchable()
+
+
+class ChunkStore:
+    """
+    Almacén de chunks con identificadores de fila estables.
+
+    Cada chunk recibe un identificador entero ("row_id") que no cambia
+    mientras exista y nunca se reutiliza. La matriz de embeddings y los
+    metadatos comparten el orden de filas; un array id -> fila permite
+    acceder a cualquier chunk en O(1). Eliminar un chunk solo lo marca
+    (tombstone): su fila deja de ser buscable y se descarta al compactar,
+    lo que ocurre al guardar cuando la fracción de filas eliminadas supera
+    compact_ratio.
+    """
+
+    def __init__(
+        self,
+        chunks: Optional[List[Dict[str, Any]]] = None,
+        matrix: Optional[np.ndarray] = None,
+        ids: Optional[np.ndarray] = None,
+        deleted: Optional[np.ndarray] = None,
+        next_id: Optional[int] = None,
+        matrix_path: str = EMBEDDINGS_MATRIX_FILE,
+        meta_path: str = CHUNKS_META_FILE,
+        embedding_model: Optional[str] = None,
+    ):
+        """
+        Args:
+            chunks: Chunks en orden de fila
+            matrix: Matriz (mapeada) de embeddings de esos chunks
+            ids: Identificador estable de cada fila
+            deleted: Máscara de filas eliminadas
+            next_id: Siguiente identificador libre
+            matrix_path: Ruta de la matriz de embeddings
+            meta_path: Ruta del sidecar de metadatos
+            embedding_model: Identidad del modelo de los embeddings (None si aún no hay)
+        """
+        self.chunks = chunks if chunks is not None else []
+        n = len(self.chunks)
+        self.matrix = matrix
+        self.ids = np.arange(n, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        self.deleted = np.zeros(n, dtype=bool) if deleted is None else np.array(deleted, dtype=bool)
+        if next_id is None:
+            next_id = int(self.ids.max()) + 1 if n else 0
+        self.next_id = next_id
+        self.matrix_path = matrix_path
+        self.meta_path = meta_path
+        self.embedding_model = embedding_model
+        for row, chunk in enumerate(self.chunks):
+            chunk["row_id"] = int(self.ids[row])
+            if self.deleted[row]:
+                chunk["deleted"] = True
+        self._index_rows()
+
+    @classmethod
+    def load(
+        cls,
+        matrix_path: str = EMBEDDINGS_MATRIX_FILE,
+        meta_path: str = CHUNKS_META_FILE,
+    ) -> Optional["ChunkStore"]:
+        """
+        Abre el almacén guardado.
+
+        La matriz se abre con mmap en modo solo lectura: no se lee del disco
+        hasta que se usa y sus páginas se comparten entre procesos. El
+        embedding de cada chunk es una vista de su fila, sin copias.
+
+        Returns:
+            Optional[ChunkStore]: None si no existe el almacén
+        """
+        if not (os.path.exists(matrix_path) and os.path.exists(meta_path)):
+            return None
+
+        start_time = time.time()
+        matrix = np.load(matrix_path, mmap_mode="r")
+        with open(meta_path, "rb") as f:
+            store = pickle.load(f)
+
+        chunks = store["chunks"]
+        if matrix.shape[0] != len(chunks):
+            raise ValueError(
+                f"Almacén inconsistente: {matrix.shape[0]} filas para {len(chunks)} chunks"
+            )
+
+        for row, chunk in enumerate(chunks):
+            if store["embedded"][row]:
+                chunk["embedding"] = matrix[row]
+
+        # Los almacenes de la versión 1 no tienen ids ni tombstones, y los
+        # anteriores a los proveedores de embeddings no guardan el modelo
+        chunk_store = cls(
+            chunks,
+            matrix,
+            ids=store.get("ids"),
+            deleted=store.get("deleted"),
+            next_id=store.get("next_id"),
+            matrix_path=matrix_path,
+            meta_path=meta_path,
+            embedding_model=store.get("embedding_model", LEGACY_EMBEDDING_MODEL),
+        )
+        data_logger.info(
+            f"Almacén de embeddings cargado: {len(chunks)} chunks ({chunk_store.deleted_count} eliminados) en {time.time() - start_time:.2f} segundos"
+        )
+        return chunk_store
+
+    def _index_rows(self) -> None:
+        """Reconstruye el array id -> fila (-1 para ids inexistentes)."""
+        self.row_of_id = np.full(self.next_id, -1, dtype=np.int64)
+        self.row_of_id[self.ids] = np.arange(len(self.ids), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.chunks) - self.deleted_count
+
+    @property
+    def deleted_count(self) -> int:
+        return int(self.deleted.sum())
+
+    def get(self, row_id: int) -> Optional[Dict[str, Any]]:
+        """Devuelve el chunk con el identificador indicado, o None si no existe o fue eliminado."""
+        if not 0 <= row_id < len(self.row_of_id):
+            return None
+        row = self.row_of_id[row_id]
+        if row < 0 or self.deleted[row]:
+            return None
+        return self.chunks[row]
+
+    def live_chunks(self) -> List[Dict[str, Any]]:
+        """Chunks no eliminados, en orden de fila."""
+        return [chunk for row, chunk in enumerate(self.chunks) if not self.deleted[row]]
+
+    def searchable(self) -> np.ndarray:
+        """Máscara de filas con embedding y no eliminadas."""
+        embedded = np.array(["embedding" in chunk for chunk in self.chunks], dtype=bool)
+        return embedded & ~self.deleted
+
+    def add(self, chunks: List[Dict[str, Any]]) -> List[int]:
+        """
+        Añade chunks al final del almacén y les asigna identificadores nuevos.
+
+        Returns:
+            List[int]: Identificadores asignados
+        """
+        new_ids = list(range(self.next_id, self.next_id + len(chunks)))
+        for chunk, row_id in zip(chunks, new_ids):
+            chunk["row_id"] = row_id
+        self.chunks.extend(chunks)
+        self.ids = np.concatenate([self.ids, np.array(new_ids, dtype=np.int64)])
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(chunks), dtype=bool)])
+        self.next_id += len(chunks)
+        self._index_rows()
+        return new_ids
+
+    def delete(self, row_ids: Iterable[int]) -> int:
+        """
+        Marca chunks como eliminados (tombstone).
+
+        Returns:
+            int: Número de chunks eliminados
+        """
+        removed = 0
+        for row_id in row_ids:
+            chunk = self.get(row_id)
+            if chunk is None:
+                continue
+            self.deleted[self.row_of_id[row_id]] = True
+            chunk["deleted"] = True
+            removed += 1
+        return removed
+
+    def delete_where(self, predicate: Callable[[Dict[str, Any]], bool]) -> int:
+        """Marca como eliminados los chunks que cumplen el predicado."""
+        return self.delete(
+            [chunk["row_id"] for chunk in self.live_chunks() if predicate(chunk)]
+        )
+
+    def reset_embeddings(self, embedding_model: str) -> int:
+        """
+        Descarta los embeddings de otro modelo para generarlos de nuevo.
+
+        Los chunks quedan sin embedding (no buscables) hasta que se vuelven
+        a generar con embedding_model; al guardar, la matriz toma las
+        dimensiones del nuevo modelo.
+
+        Returns:
+            int: Chunks cuyo embedding se ha descartado
+        """
+        reset = 0
+        for chunk in self.chunks:
+            if chunk.pop("embedding", None) is not None:
+                reset += 1
+        data_logger.warning(
+            f"Almacén creado con {self.embedding_model}; se descartan {reset} embeddings "
+            f"para generarlos con {embedding_model}"
+        )
+        self.embedding_model = embedding_model
+        return reset
+
+    def compact(self) -> int:
+        """
+        Descarta físicamente las filas eliminadas, conservando los ids del resto.
+
+        Returns:
+            int: Filas descartadas
+        """
+        dropped = self.deleted_count
+        if not dropped:
+            return 0
+        keep = np.flatnonzero(~self.deleted)
+        self.chunks = [self.chunks[row] for row in keep]
+        self.ids = self.ids[keep]
+        self.deleted = np.zeros(len(keep), dtype=bool)
+        self._index_rows()
+        data_logger.info(f"Almacén compactado: {dropped} filas eliminadas descartadas")
+        return dropped
+
+    def save(self, compact_ratio: float = CHUNK_STORE_COMPACT_RATIO) -> None:
+        """
+        Guarda el almacén, compactándolo si hay demasiadas filas eliminadas.
+
+        Args:
+            compact_ratio: Fracción de filas eliminadas a partir de la cual se compacta
+        """
+        if self.chunks and self.deleted_count / len(self.chunks) >= compact_ratio:
+            self.compact()
+        save_embedding_store(
+            self.chunks,
+            self.matrix_path,
+            self.meta_path,
+            ids=self.ids,
+            deleted=self.deleted,
+            next_id=self.next_id,
+            embedding_model=self.embedding_model,
+        )
+
+
+def store_signature(
+    matrix_path: str = EMBEDDINGS_MATRIX_FILE,
+    meta_path: str = CHUNKS_META_FILE,
+) -> str:
+    """
+    Identificador de la versión del almacén en disco.
+
+    Cambia cada vez que se reescribe el almacén, lo que permite saber si
+    un índice derivado guardado en disco sigue siendo válido.
+    """
+    parts = []
+    for path in (matrix_path, meta_path):
+        stat = os.stat(path)
+        parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def convert_pickle_store(
+    pickle_path: str = EMBEDDINGS_FILE,
+    matrix_path: str = EMBEDDINGS_MATRIX_FILE,
+    meta_path: str = CHUNKS_META_FILE,
+) -> bool:
+    """
+    Convierte el pickle antiguo (lista de dicts con embeddings) al formato columnar.
+
+    Returns:
+        bool: True si se realizó la conversión
+    """
+    if not os.path.exists(pickle_path):
+        data_logger.warning(f"No existe el archivo a convertir: {pickle_path}")
+        return False
+
+    data_logger.info(f"Convirtiendo {pickle_path} al formato columnar...")
+    with open(pickle_path, "rb") as f:
+        chunks = pickle.load(f)
+    save_embedding_store(
+        chunks, matrix_path, meta_path, embedding_model=LEGACY_EMBEDDING_MODEL
+    )
+    data_logger.info(f"Conversión completada: {len(chunks)} chunks")
+    return True
+
+
+if __name__ == "__main__":
+    # Conversión manual: python -m ai_embedding.vector_store (desde Bot/)
+    if convert_pickle_store():
+        print(f"Convertido {EMBEDDINGS_FILE} -> {EMBEDDINGS_MATRIX_FILE}, {CHUNKS_META_FILE}")
+    else:
+        print(f"No se encontró {EMBEDDINGS_FILE}")
@@ -0,0 +1,444 @@
+import asyncio
+import io
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from ai_embedding.ai_async import (
+    answer_general_question_async,
+    close_session,
+    embed_question_async,
+    generate_answer_async,
+)
+from ai_embedding.ai import API_ERROR_ANSWER, extractive_answer
+from ai_embedding.extract import lexical_search_available, retrieve_context
+from bot_handler import (
+    QUEUE_EXPIRED_MESSAGE,
+    QUEUE_FULL_MESSAGE,
+    BotHandler,
+    queue_position_message,
+    sanitize_markdown,
+)
+from constants import QUERY_EMBEDDING_TIMEOUT, STREAM_RESPONSES
+from federated_search import federated_sparql_query, format_results
+from protein_visual import analyze_pdb, cleanup_files
+from request_scheduler import AsyncFairScheduler, QueueFullError
+from telegram_stream import AsyncStreamingReply
+
+
+def _analyze_pdb_file(pdb_bytes):
+    """
+    Analiza un PDB en un proceso auxiliar y devuelve el resumen y la gráfica.
+
+    analyze_pdb escribe la gráfica en un archivo fijo del directorio actual,
+    por lo que se lee y se elimina dentro del mismo proceso.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".pdb", delete=False) as f:
+        f.write(pdb_bytes)
+        temp_file = f.name
+    try:
+        num_chains, num_residues, sequence = analyze_pdb(temp_file)
+        with open("chain_lengths.png", "rb") as img:
+            image = img.read()
+        return num_chains, num_residues, sequence, image
+    finally:
+        cleanup_files()
+        os.remove(temp_file)
+
+
+class AsyncBotHandler:
+    """
+    Manejador del bot para el cliente asíncrono de Telegram.
+
+    Las llamadas lentas a la API (/ask y /search) se hacen con aiohttp sobre
+    el bucle de eventos, de modo que cientos de consultas pueden estar en
+    curso sin ocupar un hilo cada una. El trabajo bloqueante se delega en
+    ejecutores: el análisis de PDB en un proceso auxiliar y los comandos
+    ligeros, que reutilizan BotHandler con un cliente síncrono, en un pool
+    de hilos.
+    """
+
+    def __init__(self, bot, bot_handler: BotHandler, executor: ThreadPoolExecutor):
+        """
+        Args:
+            bot: Instancia de AsyncTeleBot
+            bot_handler: Manejador síncrono con los datos ya cargados
+            executor: Pool de hilos para el trabajo bloqueante
+        """
+        self.logger = logging.getLogger(__name__)
+        self.bot = bot
+        self.bot_handler = bot_handler
+        self.executor = executor
+        # Un único proceso: analyze_pdb escribe siempre en el mismo archivo
+        self.cpu_executor = ProcessPoolExecutor(max_workers=1)
+        # Cola de /ask y /search: límite global de consultas y turnos por usuario
+        self.scheduler = AsyncFairScheduler()
+        # Embeddings de consultas que siguen en curso tras agotar su tiempo límite
+        self.embedding_tasks = set()
+
+    async def run_blocking(self, func, *args):
+        """Ejecuta una función bloqueante en el pool de hilos."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def close(self):
+        """Guarda la caché de consultas y libera la sesión HTTP y los ejecutores."""
+        # La caché de consultas solo se guarda cada save_every entradas nuevas
+        self.bot_handler.query_cache.save()
+        await close_session()
+        self.cpu_executor.shutdown(wait=False)
+        self.executor.shutdown(wait=False)
+
+    async def embed_search_query(self, question):
+        """
+        Embedding de una consulta de /search (ver BotHandler.embed_search_query).
+
+        Si la API tarda más de QUERY_EMBEDDING_TIMEOUT y hay índice léxico se
+        devuelve None; la petición continúa y guarda el resultado en la caché.
+        """
+        embedding = self.bot_handler.query_cache.get(question)
+        if embedding is not None:
+            return embedding
+        task = asyncio.ensure_future(self._embed_and_cache(question))
+        if not lexical_search_available():
+            return await task
+        self.embedding_tasks.add(task)
+        task.add_done_callback(self.embedding_tasks.discard)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), QUERY_EMBEDDING_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.logger.warning(
+                f"El embedding de la consulta tarda más de {QUERY_EMBEDDING_TIMEOUT:g} s; "
+                "se responde con la búsqueda léxica"
+            )
+            return None
+
+    async def _embed_and_cache(self, question):
+        embedding = await embed_question_async(question)
+        if embedding:
+            self.bot_handler.query_cache.put(question, embedding)
+        return embedding
+
+    async def schedule(self, message, func, question):
+        """Encola una consulta del usuario e informa de su posición en la cola"""
+        chat_id = message.chat.id
+        try:
+            position = self.scheduler.submit(
+                message.from_user.id,
+                func,
+                message,
+                question,
+                on_expire=lambda: self.bot.send_message(chat_id, QUEUE_EXPIRED_MESSAGE),
+            )
+        except QueueFullError as e:
+            self.logger.warning(f"Consulta rechazada de {message.from_user.id}: {e}")
+            await self.bot.send_message(chat_id, QUEUE_FULL_MESSAGE)
+            return
+        if position:
+            await self.bot.send_message(chat_id, queue_position_message(position))
+
+    async def handle_general_question(self, message):
+        """Maneja preguntas generales con la IA - SOLO CON /ask"""
+        question = message.text.replace("/ask ", "")
+        if not question or question == "/ask":
+            await self.bot.send_message(
+                message.chat.id,
+                "❌ *Formato correcto:* `/ask [tu pregunta]`",
+                parse_mode="Markdown",
+            )
+            return
+
+        await self.schedule(message, self._answer_general_question, question)
+
+    async def _answer_general_question(self, message, question):
+        """Genera la respuesta de /ask cuando le llega el turno en la cola"""
+        start_time = time.perf_counter()
+        try:
+            await self.bot.send_chat_action(message.chat.id, "typing")
+            self.logger.info(f"Generando respuesta general para: {question[:50]}...")
+            reply = AsyncStreamingReply(self.bot, message.chat.id)
+            await reply.start()
+            respuesta = await answer_general_question_async(
+                question, on_text=reply.update if STREAM_RESPONSES else None
+            )
+
+            # Sanitizar la respuesta para evitar errores de formato
+            await reply.finish(sanitize_markdown(respuesta), parse_mode="Markdown")
+
+        except Exception as e:
+            self.logger.error(f"Error en handle_general_question: {str(e)}")
+            await self.bot.send_message(
+                message.chat.id,
+                "❌ No pude generar una respuesta. Por favor, intenta reformular tu pregunta.",
+            )
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.logger.info(
+                f"Tiempo de respuesta de handle_general_question: {elapsed:.3f} segundos"
+            )
+            self.scheduler.log_metrics()
+
+    async def handle_embedding_search(self, message):
+        """Busca documentos relevantes y genera respuesta basada en ellos"""
+        question = message.text.replace("/search ", "")
+        if not question or question == "/search":
+            await self.bot.send_message(
+                message.chat.id, "❌ Formato correcto: /search [tu consulta]"
+            )
+            return
+
+        await self.schedule(message, self._answer_embedding_search, question)
+
+    async def _answer_embedding_search(self, message, question):
+        """Busca y genera la respuesta de /search cuando le llega el turno en la cola"""
+        start_time = time.perf_counter()
+        handler = self.bot_handler
+        try:
+            await self.bot.send_chat_action(message.chat.id, "typing")
+            self.logger.info(f"Buscando documentos para: {question[:50]}...")
+
+            if not handler.chunks or not (
+                handler.index_model or lexical_search_available()
+            ):
+                await self.bot.send_message(
+                    message.chat.id,
+                    "⚠️ No hay documentos procesados disponibles para búsqueda.",
+                )
+                return
+
+            # Embedding de la consulta (o reutilización de la caché)
+            question_embedding = await self.embed_search_query(question)
+            if not question_embedding and not lexical_search_available():
+                await self.bot.send_message(
+                    message.chat.id,
+                    "❌ No pude procesar tu consulta. Intenta con otra pregunta.",
+                )
+                return
+
+            # La búsqueda lee la matriz mapeada y puede tocar disco
+            similar_chunks = await self.run_blocking(
+                retrieve_context,
+                question,
+                question_embedding,
+                handler.index_model,
+                handler.chunks,
+                5,
+            )
+            if not similar_chunks:
+                await self.bot.send_message(
+                    message.chat.id,
+                    "❓ No encontré documentos relacionados con tu consulta.",
+                )
+                return
+
+            reply = AsyncStreamingReply(
+                self.bot,
+                message.chat.id,
+                "⏳ Generando respuesta basada en los documentos relevantes...",
+            )
+            await reply.start()
+
+            cached = (
+                handler.answer_cache.get(question, question_embedding, similar_chunks)
+                if question_embedding
+                else None
+            )
+            if cached is not None:
+                answer, references = cached
+                self.logger.info("Respuesta servida desde la caché")
+            else:
+                answer, references = await generate_answer_async(
+                    question,
+                    similar_chunks,
+                    handler.chunks,
+                    on_text=reply.update if STREAM_RESPONSES else None,
+                    question_embedding=question_embedding,
+                )
+                if answer == API_ERROR_ANSWER:
+                    # Sin servicio de respuestas: se citan los pasajes encontrados
+                    answer, references = await self.run_blocking(
+                        extractive_answer, question, similar_chunks, handler.chunks
+                    )
+                elif question_embedding:
+                    handler.answer_cache.put(
+                        question, question_embedding, similar_chunks, answer, references
+                    )
+
+            await reply.finish(answer)
+
+            ref_text, keyboard = await self.run_blocking(
+                handler.build_references, similar_chunks
+            )
+            if ref_text:
+                await self.bot.send_message(message.chat.id, ref_text)
+            if keyboard:
+                await self.bot.send_message(
+                    message.chat.id,
+                    "Selecciona un documento para descargar:",
+                    reply_markup=keyboard,
+                )
+
+        except Exception as e:
+            self.logger.error(f"Error en handle_embedding_search: {str(e)}")
+            await self.bot.send_message(message.chat.id, "❌ Error al procesar tu búsqueda.")
+        finally:
+            elapsed = time.perf_counter() - start_time
+            self.logger.info(
+                f"Tiempo de respuesta de handle_embedding_search: {elapsed:.3f} segundos"
+            )
+            handler.log_cache_stats()
+            self.scheduler.log_metrics()
+
+    async def handle_protein_file(self, message):
+        """Analiza un archivo PDB en un proceso auxiliar"""
+        if message.document.mime_type != "chemical/x-pdb":
+            await self.bot.reply_to(message, "Por favor, envía un archivo PDB válido.")
+            return
+
+        try:
+            file_info = await self.bot.get_file(message.document.file_id)
+            downloaded_file = await self.bot.download_file(file_info.file_path)
+
+            loop = asyncio.get_running_loop()
+            num_chains, num_residues, sequence, image = await loop.run_in_executor(
+                self.cpu_executor, _analyze_pdb_file, downloaded_file
+            )
+            response = (
+                f"Estructura analizada:\n"
+                f"- Número de cadenas: {num_chains}\n"
+                f"- Número total de residuos: {num_residues}\n"
+                f"- Secuencia primera cadena (primeros 100 aa): {sequence[:100]}"
+            )
+            await self.bot.send_message(message.chat.id, response)
+            await self.bot.send_photo(
+                message.chat.id, io.BytesIO(image), caption="Longitud de cadenas"
+            )
+        except Exception as e:
+            self.logger.error(f"Error analizando PDB: {e}")
+            await self.bot.reply_to(
+                message,
+                "Error procesando la estructura. Asegúrate de enviar un archivo PDB válido.",
+            )
+
+    async def handle_federate(self, message):
+        """Ejecuta la búsqueda federada SPARQL sin bloquear el bucle de eventos"""
+        await self.bot.reply_to(message, "Buscando en bases federadas, por favor espera...")
+        try:
+            results = await self.run_blocking(federated_sparql_query)
+            response = format_results(results)
+            if not response:
+                await self.bot.send_message(message.chat.id, "No se encontraron resultados.")
+                return
+            archivo = io.BytesIO(response.encode("utf-8"))
+            archivo.name = "federated_results.txt"
+            await self.bot.send_document(
+                message.chat.id,
+                archivo,
+                caption="Resultados de la búsqueda federada en TXT",
+            )
+        except Exception as e:
+            self.logger.error(f"Error en la búsqueda federada: {e}")
+            await self.bot.reply_to(message, f"Error en la búsqueda federada: {e}")
+
+
+def register_async_handlers(bot, handler: AsyncBotHandler):
+    """Registra todos los handlers en el cliente asíncrono"""
+    logger = logging.getLogger(__name__)
+    start_time = time.time()
+    logger.info("Iniciando registro de handlers asíncronos...")
+    sync_handler = handler.bot_handler
+
+    @bot.message_handler(commands=["start"])
+    async def start(message):
+        logger.info(f"Comando /start recibido de usuario {message.from_user.id}")
+        await handler.run_blocking(sync_handler.start, message)
+
+    @bot.message_handler(commands=["ask"])
+    async def ask(message):
+        logger.info(
+            f"Comando /ask recibido de usuario {message.from_user.id}: '{message.text}'"
+        )
+        await handler.handle_general_question(message)
+
+    @bot.message_handler(commands=["search"])
+    async def search(message):
+        logger.info(
+            f"Comando /search recibido de usuario {message.from_user.id}: '{message.text}'"
+        )
+        await handler.handle_embedding_search(message)
+
+    @bot.message_handler(commands=["help"])
+    async def help_command(message):
+        logger.info(f"Comando /help recibido de usuario {message.from_user.id}")
+        await handler.run_blocking(sync_handler.show_help, message)
+
+    @bot.message_handler(commands=["doi"])
+    async def doi(message):
+        logger.info(
+            f"Comando /doi recibido de usuario {message.from_user.id}: '{message.text}'"
+        )
+        await handler.run_blocking(sync_handler.handle_message, message)
+
+    @bot.message_handler(commands=["federate"])
+    async def federate(message):
+        logger.info(f"Comando /federate recibido de usuario {message.from_user.id}")
+        await handler.handle_federate(message)
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("list_"))
+    async def callback_list(call):
+        logger.info(
+            f"Callback list_{call.data[5:]} recibido de usuario {call.from_user.id}"
+        )
+        await handler.run_blocking(sync_handler.handle_list, call)
+
+    @bot.message_handler(commands=["visualize"])
+    async def request_protein(message):
+        await bot.reply_to(message, "Por favor, envíame el archivo PDB de la estructura proteica.")
+
+    @bot.message_handler(content_types=["document"])
+    async def handle_protein_file(message):
+        await handler.handle_protein_file(message)
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("download#"))
+    async def callback_download(call):
+        doc_path = call.data.replace("download#", "")
+        logger.info(
+            f"Solicitud de descarga recibida de usuario {call.from_user.id}: {doc_path}"
+        )
+        await handler.run_blocking(sync_handler.handle_pdf_download, call)
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith("back_"))
+    async def callback_back(call):
+        logger.info(
+            f"Callback back recibido de usuario {call.from_user.id}: {call.data}"
+        )
+        await handler.run_blocking(sync_handler.handle_back, call)
+
+    @bot.callback_query_handler(func=lambda call: call.data == "show_help")
+    async def callback_show_help(call):
+        logger.info(f"Callback show_help recibido de usuario {call.from_user.id}")
+        await handler.run_blocking(sync_handler.show_help, call)
+
+    @bot.callback_query_handler(func=lambda call: call.data == "search_help")
+    async def callback_search_help(call):
+        logger.info(f"Callback search_help recibido de usuario {call.from_user.id}")
+        await handler.run_blocking(sync_handler.start, call)
+
+    @bot.message_handler(func=lambda message: True, content_types=["text"])
+    async def handle_text(message):
+        if message.text.startswith("/"):
+            logger.info(
+                f"Comando desconocido recibido de usuario {message.from_user.id}: '{message.text}'"
+            )
+            await handler.run_blocking(sync_handler.show_help, message)
+        else:
+            logger.info(
+                f"Mensaje de texto recibido de usuario {message.from_user.id} ({len(message.text)} caracteres)"
+            )
+            await handler.run_blocking(sync_handler.handle_message, message)
+
+    elapsed_time = time.time() - start_time
+    logger.info(
+        f"Registrados manejadores asíncronos de comandos, callbacks y mensajes en {elapsed_time:.2f} segundos"
+    )
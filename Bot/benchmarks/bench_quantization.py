@@ -0,0 +1,104 @@
+"""
+Benchmark de la búsqueda cuantizada (float16, int8, binaria) frente a float32.
+
+Para cada cuantización informa la memoria de la copia en memoria, el
+rendimiento de la primera pasada en millones de vectores por segundo, la
+latencia de consulta con rescoring (p50/p99) y recall@k respecto a la
+búsqueda exacta en float32, sin y con rescoring. La matriz float32 se
+guarda en un .npy temporal y se abre mapeada, como el almacén real.
+
+Uso (desde Bot/):
+    python -m benchmarks.bench_quantization
+    python -m benchmarks.bench_quantization --sizes 100000 --rescore 100
+"""
+import argparse
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+from ai_embedding.search_engine import CosineSearchEngine, QuantizedSearchEngine
+from benchmarks.bench_ann import clustered_embeddings, timed_search
+
+
+def recall(results, truth):
+    return np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)])
+
+
+def first_pass(engine, queries, top_k):
+    """Primera pasada sola: filas con mejor puntuación aproximada y tiempo de cada recorrido."""
+    latencies = []
+    results = []
+    for query in queries:
+        query = query / np.linalg.norm(query)
+        start = time.perf_counter()
+        scores = engine.approximate_scores(query)
+        latencies.append(time.perf_counter() - start)
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        results.append(top.tolist())
+    return np.array(latencies), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--spread", type=float, default=1.0)
+    parser.add_argument(
+        "--rescore", type=int, default=0, help="Candidatos a repuntuar (0 = según el tipo)"
+    )
+    args = parser.parse_args()
+
+    sample = clustered_embeddings(100, args.dimensions, 10, args.spread, seed=2)
+    legacy_kb = np.mean([len(pickle.dumps(row.tolist())) for row in sample]) / 1024
+    print(
+        f"Formato antiguo (pickle de listas): {legacy_kb:.1f} KB por vector; "
+        f"float32: {args.dimensions * 4 / 1024:.1f} KB\n"
+    )
+
+    k = args.top_k
+    print(
+        f"{'n':>8} {'tipo':>8} {'MB':>8} {'Mvec/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{f'r@{k} 1ª':>8} {f'r@{k}':>8}"
+    )
+    for n in args.sizes:
+        data = clustered_embeddings(
+            n + args.queries, args.dimensions, args.clusters, args.spread, seed=0
+        )
+        queries = data[n:]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "embeddings.npy")
+            np.save(path, data[:n])
+            del data
+            matrix = np.load(path, mmap_mode="r")
+
+            exact = CosineSearchEngine(matrix)
+            latencies, truth = timed_search(exact, queries, k)
+            throughput = n / np.percentile(latencies, 50) / 1e6
+            print(
+                f"{n:>8} {'float32':>8} {matrix.nbytes / 1024**2:>8.1f} {throughput:>8.1f} "
+                f"{np.percentile(latencies, 50) * 1000:>8.2f} "
+                f"{np.percentile(latencies, 99) * 1000:>8.2f} {'1.000':>8} {'1.000':>8}"
+            )
+
+            for codec in QuantizedSearchEngine.CODECS:
+                engine = QuantizedSearchEngine(matrix, codec=codec, rescore_candidates=args.rescore)
+                scan, approximate = first_pass(engine, queries, k)
+                latencies, results = timed_search(engine, queries, k)
+                print(
+                    f"{n:>8} {f'{codec}/{engine.rescore_candidates}':>8} "
+                    f"{engine.nbytes / 1024**2:>8.1f} "
+                    f"{n / np.percentile(scan, 50) / 1e6:>8.1f} "
+                    f"{np.percentile(latencies, 50) * 1000:>8.2f} "
+                    f"{np.percentile(latencies, 99) * 1000:>8.2f} "
+                    f"{recall(approximate, truth):>8.3f} {recall(results, truth):>8.3f}"
+                )
+            del exact, engine, matrix
+
+
+if __name__ == "__main__":
+    main()
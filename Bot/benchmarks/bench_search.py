@@ -0,0 +1,99 @@
+"""
+Benchmark de búsqueda exacta: CosineSearchEngine frente al índice ball_tree de sklearn.
+
+Uso (desde Bot/):
+    python -m benchmarks.bench_search
+    python -m benchmarks.bench_search --sizes 1000 10000 50000 --queries 200
+"""
+import argparse
+import time
+import numpy as np
+from ai_embedding.search_engine import CosineSearchEngine
+
+
+def random_embeddings(n: int, dimensions: int, seed: int) -> np.ndarray:
+    """Vectores aleatorios normalizados, como los que devuelve la API."""
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((n, dimensions), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+def bench_engine(matrix, queries, top_k):
+    start = time.perf_counter()
+    engine = CosineSearchEngine(matrix)
+    build = time.perf_counter() - start
+
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([row for row, _ in engine.search(query, top_k)])
+        latencies.append(time.perf_counter() - start)
+    return build, np.array(latencies), results
+
+
+def bench_sklearn(matrix, queries, top_k):
+    from sklearn.neighbors import NearestNeighbors
+
+    # Mismo uso que el código anterior: float64 y distancia euclídea
+    start = time.perf_counter()
+    model = NearestNeighbors(n_neighbors=top_k, algorithm="ball_tree").fit(
+        matrix.astype(np.float64)
+    )
+    build = time.perf_counter() - start
+
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, indices = model.kneighbors(query.reshape(1, -1).astype(np.float64))
+        latencies.append(time.perf_counter() - start)
+        results.append(indices[0].tolist())
+    return build, np.array(latencies), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--dimensions", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    try:
+        import sklearn  # noqa: F401
+
+        has_sklearn = True
+    except ImportError:
+        has_sklearn = False
+        print("sklearn no está instalado: solo se mide CosineSearchEngine\n")
+
+    print(
+        f"{'n':>8} {'motor':>10} {'build ms':>10} {'p50 ms':>8} {'p99 ms':>8} {'coincidencia':>12}"
+    )
+    for n in args.sizes:
+        matrix = random_embeddings(n, args.dimensions, seed=0)
+        queries = random_embeddings(args.queries, args.dimensions, seed=1)
+
+        build, latencies, engine_results = bench_engine(matrix, queries, args.top_k)
+        rows = [("coseno", build, latencies, None)]
+        if has_sklearn:
+            build, latencies, sk_results = bench_sklearn(matrix, queries, args.top_k)
+            # Con vectores normalizados el orden euclídeo y el coseno coinciden
+            agreement = np.mean(
+                [set(a) == set(b) for a, b in zip(engine_results, sk_results)]
+            )
+            rows.append(("ball_tree", build, latencies, agreement))
+
+        for name, build, latencies, agreement in rows:
+            agreement_str = f"{agreement * 100:.1f}%" if agreement is not None else "-"
+            print(
+                f"{n:>8} {name:>10} {build * 1000:>10.1f} "
+                f"{np.percentile(latencies, 50) * 1000:>8.2f} "
+                f"{np.percentile(latencies, 99) * 1000:>8.2f} {agreement_str:>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,55 @@
-import os
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from telebot import types
-from ai_embedding.extract import process_documents, search_similar_chunks_sklearn
-from ai_embedding.ai import answer_general_question, embed_question
-from constants import DOCUMENTS_FOLDER
+from telebot.apihelper import ApiTelegramException
+from ai_embedding.extract import (
+    lexical_search_available,
+    process_documents,
+    retrieve_context,
+)
+from ai_embedding.ai import (
+    API_ERROR_ANSWER,
+    answer_general_question,
+    embed_question,
+    extractive_answer,
+    get_embedding_provider,
+)
+from ai_embedding.query_cache import QueryEmbeddingCache
+from ai_embedding.answer_cache import AnswerCache
+from ai_embedding.vector_store import store_signature
+from ai_embedding.document_catalog import DocumentCatalog, pretty_document_name
+from constants import (
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_TTL,
+    QUERY_CACHE_FILE,
+    QUERY_CACHE_PERSIST,
+    QUERY_CACHE_SIZE,
+    QUERY_CACHE_TTL,
+    QUERY_EMBEDDING_TIMEOUT,
+    SCHEDULER_MAX_CONCURRENT,
+    STREAM_RESPONSES,
+)
+from telegram_stream import StreamingReply
+from telegram_files import TelegramFileCache
+from request_scheduler import FairScheduler, QueueFullError
 from scihub.scihub_handler import handle_scihub_command, process_doi_command
 
+QUEUE_FULL_MESSAGE = (
+    "⏳ Tienes demasiadas consultas en espera. Por favor espera a que terminen las anteriores."
+)
+QUEUE_EXPIRED_MESSAGE = (
+    "⌛ Tu consulta se canceló tras esperar demasiado en la cola. Por favor, inténtalo de nuevo."
+)
+
+
+def queue_position_message(position):
+    """Aviso de la posición de una consulta en la cola"""
+    return f"🕒 Tu consulta está en la cola (posición {position}). Te responderé en cuanto llegue su turno."
+
+
 class BotHandler:
     def __init__(self, bot=None):
         """
@@ -17,9 +60,48 @@ class BotHandler:
         """
         self._init_logging()
         self.bot = bot  # Recibe la instancia del bot desde main.py
-        self.processing_users = set()
-        print("hola")  # Controla usuarios con procesamiento activo
+        # La cola de /ask y /search y el pool de embeddings se crean al usarse:
+        # el cliente asíncrono reutiliza este manejador sin necesitarlos
+        self._lazy_lock = threading.Lock()
+        self._scheduler = None
+        self._embedding_executor = None
+        # Embeddings de consultas repetidas sin volver a llamar a la API
+        self.query_cache = QueryEmbeddingCache(
+            max_entries=QUERY_CACHE_SIZE,
+            ttl=QUERY_CACHE_TTL,
+            persist_path=QUERY_CACHE_FILE if QUERY_CACHE_PERSIST else None,
+            model=get_embedding_provider().identity,
+        )
+        # Respuestas ya generadas para la misma pregunta y los mismos documentos
+        self.answer_cache = AnswerCache(
+            max_entries=ANSWER_CACHE_SIZE,
+            ttl=ANSWER_CACHE_TTL,
+            similarity_threshold=ANSWER_CACHE_SIMILARITY,
+        )
         self._init_data()
+        # Documentos disponibles para listados y descargas, sin recorrer el disco en cada petición
+        self.catalog = DocumentCatalog()
+        # Documentos ya subidos a Telegram, para reenviarlos sin volver a subirlos
+        self.file_cache = TelegramFileCache()
+        self.file_cache.prune(self.catalog.by_hash)
+
+    @property
+    def scheduler(self):
+        """Cola de /ask y /search: límite global de consultas y turnos por usuario"""
+        with self._lazy_lock:
+            if self._scheduler is None:
+                self._scheduler = FairScheduler()
+            return self._scheduler
+
+    @property
+    def embedding_executor(self):
+        """Embeddings de /search con tiempo límite: si la API tarda, se responde con el índice léxico"""
+        with self._lazy_lock:
+            if self._embedding_executor is None:
+                self._embedding_executor = ThreadPoolExecutor(
+                    max_workers=SCHEDULER_MAX_CONCURRENT, thread_name_prefix="query-embedding"
+                )
+            return self._embedding_executor
 
     def _init_logging(self):
         """Configura el logger para esta clase"""
@@ -36,10 +118,23 @@ class BotHandler:
             self.logger.error(f"Error inicializando datos: {str(e)}")
             self.index_model = None
             self.chunks = []
+        self._refresh_caches()
+
+    def _refresh_caches(self):
+        """Invalida las cachés si el almacén o el modelo de embeddings han cambiado"""
+        # Un modelo local ajustado en esta ingesta cambia la identidad del proveedor
+        self.query_cache.use_model(get_embedding_provider().identity)
+        try:
+            version = store_signature()
+        except OSError:
+            version = None
+        self.answer_cache.set_index_version(version)
 
     def process_all_pdfs(self):
         """Procesa todos los PDFs para crear embeddings e índices"""
         self.index_model, self.chunks = process_documents()
+        self._refresh_caches()
+        self.catalog.refresh(force=True)
         return bool(self.index_model and self.chunks)
 
     def start(self, message_or_call):
@@ -73,7 +168,6 @@ class BotHandler:
 
     def handle_general_question(self, message):
         """Maneja preguntas generales con la IA - SOLO CON /ask"""
-        start_time = time.perf_counter()
         question = message.text.replace("/ask ", "")
         if not question or question == "/ask":
             self.bot.send_message(
@@ -83,32 +177,25 @@ class BotHandler:
             )
             return
 
-        user_id = message.from_user.id
-        if user_id in self.processing_users:
-            self.bot.send_message(
-                message.chat.id,
-                "⏳ Ya estoy procesando tu consulta anterior. Por favor espera...",
-            )
-            return
+        self.schedule(message, self._answer_general_question, question)
 
-        self.processing_users.add(user_id)
+    def _answer_general_question(self, message, question):
+        """Genera la respuesta de /ask cuando le llega el turno en la cola"""
+        start_time = time.perf_counter()
         self.bot.send_chat_action(message.chat.id, "typing")
 
         try:
             self.logger.info(f"Generando respuesta general para: {question[:50]}...")
-            respuesta = answer_general_question(question)
+            # El texto se muestra en plano mientras llega y con formato al final
+            reply = StreamingReply(self.bot, message.chat.id)
+            reply.start()
+            respuesta = answer_general_question(
+                question, on_text=reply.update if STREAM_RESPONSES else None
+            )
 
             # Sanitizar la respuesta para evitar errores de formato
             safe_response = sanitize_markdown(respuesta)
-
-            # Manejar respuestas que podrían dividirse en múltiples mensajes
-            if isinstance(safe_response, list):
-                for part in safe_response:
-                    self.bot.send_message(message.chat.id, part, parse_mode="Markdown")
-            else:
-                self.bot.send_message(
-                    message.chat.id, safe_response, parse_mode="Markdown"
-                )
+            reply.finish(safe_response, parse_mode="Markdown")
 
         except Exception as e:
             self.logger.error(f"Error en handle_general_question: {str(e)}")
@@ -121,11 +208,10 @@ class BotHandler:
             self.logger.info(
                 f"Tiempo de respuesta de handle_general_question: {elapsed:.3f} segundos"
             )
-            self.processing_users.remove(user_id)
+            self.scheduler.log_metrics()
 
     def handle_embedding_search(self, message):
         """Busca documentos relevantes y genera respuesta basada en ellos"""
-        start_time = time.perf_counter()
         question = message.text.replace("/search ", "")
         if not question or question == "/search":
             self.bot.send_message(
@@ -133,40 +219,36 @@ class BotHandler:
             )
             return
 
-        user_id = message.from_user.id
-        if user_id in self.processing_users:
-            self.bot.send_message(
-                message.chat.id,
-                "⏳ Ya estoy procesando tu consulta anterior. Por favor espera...",
-            )
-            return
+        self.schedule(message, self._answer_embedding_search, question)
 
-        self.processing_users.add(user_id)
+    def _answer_embedding_search(self, message, question):
+        """Busca y genera la respuesta de /search cuando le llega el turno en la cola"""
+        start_time = time.perf_counter()
         self.bot.send_chat_action(message.chat.id, "typing")
 
         try:
             self.logger.info(f"Buscando documentos para: {question[:50]}...")
 
             # Verificación de datos disponibles
-            if not self.index_model or not self.chunks:
+            if not self.chunks or not (self.index_model or lexical_search_available()):
                 self.bot.send_message(
                     message.chat.id,
                     "⚠️ No hay documentos procesados disponibles para búsqueda.",
                 )
                 return
 
-            # Generación de embedding para la búsqueda
-            question_embedding = embed_question(question)
-            if not question_embedding:
+            # Generación de embedding para la búsqueda (o reutilización de la caché)
+            question_embedding = self.embed_search_query(question)
+            if not question_embedding and not lexical_search_available():
                 self.bot.send_message(
                     message.chat.id,
                     "❌ No pude procesar tu consulta. Intenta con otra pregunta.",
                 )
                 return
 
-            # Búsqueda semántica de documentos relevantes
-            similar_chunks = search_similar_chunks_sklearn(
-                question_embedding, self.index_model, self.chunks, top_k=5
+            # Búsqueda semántica y léxica de documentos relevantes
+            similar_chunks = retrieve_context(
+                question, question_embedding, self.index_model, self.chunks, top_k=5
             )
 
             if not similar_chunks:
@@ -176,97 +258,56 @@ class BotHandler:
                 )
                 return
 
-            # Indicar al usuario que estamos generando la respuesta
-            self.bot.send_message(
+            # Mensaje provisional que se irá completando con la respuesta
+            reply = StreamingReply(
+                self.bot,
                 message.chat.id,
                 "⏳ Generando respuesta basada en los documentos relevantes...",
             )
+            reply.start()
 
             # Generar respuesta usando los chunks encontrados
             from ai_embedding.ai import generate_answer
 
-            answer, references = generate_answer(question, similar_chunks, self.chunks)
-
-            # Enviar la respuesta principal (dividida si es necesaria)
-            if len(answer) > 4000:  # Cambiado de plain_answer a answer
-                chunks = [answer[i : i + 4000] for i in range(0, len(answer), 4000)]
-                for chunk in chunks:
-                    self.bot.send_message(message.chat.id, chunk)
+            cached = (
+                self.answer_cache.get(question, question_embedding, similar_chunks)
+                if question_embedding
+                else None
+            )
+            if cached is not None:
+                answer, references = cached
+                self.logger.info("Respuesta servida desde la caché")
             else:
+                answer, references = generate_answer(
+                    question,
+                    similar_chunks,
+                    self.chunks,
+                    on_text=reply.update if STREAM_RESPONSES else None,
+                    question_embedding=question_embedding,
+                )
+                if answer == API_ERROR_ANSWER:
+                    # Sin servicio de respuestas: se citan los pasajes encontrados
+                    answer, references = extractive_answer(
+                        question, similar_chunks, self.chunks
+                    )
+                elif question_embedding:
+                    self.answer_cache.put(
+                        question, question_embedding, similar_chunks, answer, references
+                    )
+
+            # Respuesta final (dividida si supera el límite de Telegram)
+            reply.finish(answer)
+
+            # Referencias agrupadas por documento y botones de descarga
+            ref_text, keyboard = self.build_references(similar_chunks)
+            if ref_text:
+                self.bot.send_message(message.chat.id, ref_text)
+            if keyboard:
                 self.bot.send_message(
-                    message.chat.id, answer
-                )  # Cambiado de plain_answer a answer
-
-            # NUEVA IMPLEMENTACIÓN: Manejo mejorado de referencias
-            if similar_chunks:
-                # Diccionario para agrupar referencias por documento
-                doc_refs = {}  # {documento: set(páginas)}
-
-                # Extraer información única de documentos y páginas
-                for chunk in similar_chunks:
-                    doc_name = chunk.get("document", "")
-                    if not doc_name:
-                        continue
-
-                    # Convertir a nombre base del documento
-                    base_name = os.path.basename(doc_name)
-                    pretty_name = base_name.replace(".pdf", "").replace("_", " ")
-
-                    # Extraer páginas únicas
-                    pages = chunk.get("pages", [])
-
-                    # Agregar al diccionario, combinando las páginas si ya existe
-                    if pretty_name in doc_refs:
-                        doc_refs[pretty_name].update(pages)
-                    else:
-                        doc_refs[pretty_name] = set(pages)
-
-                # Crear mensaje de referencias
-                if doc_refs:
-                    ref_text = "📚 Referencias consultadas:\n\n"
-
-                    for doc_name, pages in doc_refs.items():
-                        # Ordenar páginas para presentación
-                        sorted_pages = sorted(pages)
-                        pages_str = (
-                            ", ".join(map(str, sorted_pages)) if sorted_pages else "N/A"
-                        )
-                        ref_text += f"• {doc_name} (Pág: {pages_str})\n"
-
-                    # Enviar mensaje con referencias únicas
-                    self.bot.send_message(message.chat.id, ref_text)
-
-                    # Crear botones de descarga (solo uno por documento)
-                    keyboard = types.InlineKeyboardMarkup()
-
-                    for doc_pretty_name in doc_refs.keys():
-                        # Buscar documento en sistema de archivos
-                        found = False
-                        for pdf_path in self.find_pdf_files(DOCUMENTS_FOLDER):
-                            base_name = os.path.basename(pdf_path)
-                            pdf_pretty_name = base_name.replace(".pdf", "").replace(
-                                "_", " "
-                            )
-
-                            if pdf_pretty_name == doc_pretty_name:
-                                # Encontramos el documento, crear botón de descarga
-                                rel_path = os.path.relpath(pdf_path, DOCUMENTS_FOLDER)
-                                keyboard.add(
-                                    types.InlineKeyboardButton(
-                                        f"📥 Descargar {doc_pretty_name}",
-                                        callback_data=f"download#{rel_path}",
-                                    )
-                                )
-                                found = True
-                                break
-
-                    # Enviar botones solo si hay documentos para descargar
-                    if keyboard.keyboard:
-                        self.bot.send_message(
-                            message.chat.id,
-                            "Selecciona un documento para descargar:",
-                            reply_markup=keyboard,
-                        )
+                    message.chat.id,
+                    "Selecciona un documento para descargar:",
+                    reply_markup=keyboard,
+                )
 
         except Exception as e:
             self.logger.error(f"Error en handle_embedding_search: {str(e)}")
@@ -276,7 +317,124 @@ class BotHandler:
             self.logger.info(
                 f"Tiempo de respuesta de handle_embedding_search: {elapsed:.3f} segundos"
             )
-            self.processing_users.remove(user_id)
+            self.log_cache_stats()
+            self.scheduler.log_metrics()
+
+    def embed_search_query(self, question):
+        """
+        Embedding de una consulta de /search, esperando como mucho QUERY_EMBEDDING_TIMEOUT.
+
+        Sin índice léxico se espera a la API como siempre. Con él, si la API
+        tarda más del límite se devuelve None y la búsqueda continúa solo con
+        el índice léxico; la petición sigue en segundo plano y su resultado
+        queda en la caché para la próxima vez.
+
+        Returns:
+            Optional[List[float]]: Embedding de la consulta, o None
+        """
+        if not lexical_search_available():
+            return self.query_cache.get_or_compute(question, embed_question)
+        future = self.embedding_executor.submit(
+            self.query_cache.get_or_compute, question, embed_question
+        )
+        try:
+            return future.result(timeout=QUERY_EMBEDDING_TIMEOUT)
+        except FuturesTimeout:
+            self.logger.warning(
+                f"El embedding de la consulta tarda más de {QUERY_EMBEDDING_TIMEOUT:g} s; "
+                "se responde con la búsqueda léxica"
+            )
+            return None
+
+    def schedule(self, message, func, question):
+        """
+        Encola una consulta del usuario e informa de su posición en la cola.
+
+        Args:
+            message: Mensaje de Telegram con la consulta
+            func: Método que atiende la consulta, func(message, question)
+            question: Texto de la consulta
+        """
+        chat_id = message.chat.id
+        try:
+            position = self.scheduler.submit(
+                message.from_user.id,
+                func,
+                message,
+                question,
+                on_expire=lambda: self.bot.send_message(chat_id, QUEUE_EXPIRED_MESSAGE),
+            )
+        except QueueFullError as e:
+            self.logger.warning(f"Consulta rechazada de {message.from_user.id}: {e}")
+            self.bot.send_message(chat_id, QUEUE_FULL_MESSAGE)
+            return
+        if position:
+            self.bot.send_message(chat_id, queue_position_message(position))
+
+    def log_cache_stats(self):
+        """Registra el uso de las cachés de consultas y respuestas"""
+        stats = self.query_cache.stats()
+        self.logger.info(
+            f"Caché de consultas: {stats['hits']} aciertos, {stats['misses']} fallos "
+            f"({stats['hit_rate'] * 100:.1f}%), {stats['entries']} entradas"
+        )
+        stats = self.answer_cache.stats()
+        self.logger.info(
+            f"Caché de respuestas: {stats['exact_hits']} exactos, "
+            f"{stats['semantic_hits']} semánticos, {stats['misses']} fallos "
+            f"({stats['hit_rate'] * 100:.1f}%), {stats['entries']} entradas"
+        )
+
+    def build_references(self, similar_chunks):
+        """
+        Agrupa las páginas consultadas por documento y crea los botones de descarga.
+
+        Args:
+            similar_chunks: Fragmentos usados para la respuesta
+
+        Returns:
+            tuple: (texto de referencias o None, teclado de descarga o None)
+        """
+        # Diccionario para agrupar referencias por documento
+        doc_refs = {}  # {documento: set(páginas)}
+
+        # Extraer información única de documentos y páginas
+        for chunk in similar_chunks:
+            doc_name = chunk.get("document", "")
+            if not doc_name:
+                continue
+
+            # Convertir a nombre base del documento
+            pretty_name = pretty_document_name(doc_name)
+
+            # Agregar al diccionario, combinando las páginas si ya existe
+            doc_refs.setdefault(pretty_name, set()).update(chunk.get("pages", []))
+
+        if not doc_refs:
+            return None, None
+
+        ref_text = "📚 Referencias consultadas:\n\n"
+        for doc_name, pages in doc_refs.items():
+            # Ordenar páginas para presentación
+            sorted_pages = sorted(pages)
+            pages_str = ", ".join(map(str, sorted_pages)) if sorted_pages else "N/A"
+            ref_text += f"• {doc_name} (Pág: {pages_str})\n"
+
+        # Crear botones de descarga (solo uno por documento)
+        keyboard = types.InlineKeyboardMarkup()
+        self.catalog.refresh()
+        for doc_pretty_name in doc_refs.keys():
+            # Buscar documento en el catálogo
+            document = self.catalog.find_by_name(doc_pretty_name)
+            if document:
+                keyboard.add(
+                    types.InlineKeyboardButton(
+                        f"📥 Descargar {doc_pretty_name}",
+                        callback_data=f"download#{document['rel_path']}",
+                    )
+                )
+
+        return ref_text, (keyboard if keyboard.keyboard else None)
 
     def show_help(self, message_or_call):
         """Muestra ayuda del bot"""
@@ -320,6 +478,8 @@ class BotHandler:
         folder_mapping = {
             "BIO": "Bioinformatica",
             "PRO": "Programacion",
+            "bioinformatics": "Bioinformatica",
+            "programming": "Programacion",
         }
 
         folder = folder_mapping.get(category)
@@ -328,28 +488,22 @@ class BotHandler:
             return
 
         try:
-            folder_path = os.path.join(DOCUMENTS_FOLDER, folder)
-            if not os.path.exists(folder_path):
-                self.bot.send_message(chat_id, f"No se encontró la carpeta {folder}")
-                return
-
-            pdf_files = [
-                f for f in os.listdir(folder_path) if f.lower().endswith(".pdf")
-            ]
+            self.catalog.refresh()
+            documents = self.catalog.list_category(folder)
 
-            if not pdf_files:
+            if not documents:
                 self.bot.send_message(
                     chat_id, f"No hay documentos disponibles en {folder}"
                 )
                 return
 
             keyboard = types.InlineKeyboardMarkup()
-            for pdf in pdf_files[:10]:  # Limitamos a 10 resultados
-                # Usamos el nombre del archivo como texto del botón y la ruta en el callback
-                pretty_name = pdf.replace(".pdf", "").replace("_", " ")
+            for document in documents[:10]:  # Limitamos a 10 resultados
+                # Usamos el nombre legible como texto del botón y la ruta en el callback
                 keyboard.add(
                     types.InlineKeyboardButton(
-                        pretty_name, callback_data=f"download#{folder}/{pdf}"
+                        document["pretty_name"],
+                        callback_data=f"download#{document['rel_path']}",
                     )
                 )
             keyboard.add(
@@ -372,13 +526,26 @@ class BotHandler:
         path = call.data.replace("download#", "")
 
         try:
-            file_path = os.path.join(DOCUMENTS_FOLDER, path)
-            if not os.path.exists(file_path):
+            document = self.catalog.verify(path)
+            if not document:
                 self.bot.send_message(chat_id, "❌ El archivo solicitado no existe")
                 return
 
-            with open(file_path, "rb") as pdf:
-                self.bot.send_document(chat_id, pdf)
+            # Reenviar por file_id si el documento ya se subió con este contenido
+            file_id = self.file_cache.get(document["hash"])
+            if file_id:
+                try:
+                    self.bot.send_document(chat_id, file_id)
+                    self.logger.info(f"Enviado documento por file_id: {path}")
+                    return
+                except ApiTelegramException as e:
+                    self.logger.warning(f"Telegram rechazó el file_id de {path}, se vuelve a subir: {e}")
+                    self.file_cache.discard(document["hash"])
+
+            with open(document["path"], "rb") as pdf:
+                sent = self.bot.send_document(chat_id, pdf)
+            if getattr(sent, "document", None):
+                self.file_cache.put(document["hash"], sent.document.file_id, document["name"])
 
             self.logger.info(f"Enviado documento: {path}")
         except Exception as e:
@@ -476,23 +643,6 @@ class BotHandler:
             url_pattern = r"(https?://[^\s]+)"
             return bool(re.search(doi_pattern, text, re.I) or re.search(url_pattern, text, re.I))
 
-    def find_pdf_files(self, folder_path):
-        """
-        Busca archivos PDF en una carpeta y sus subcarpetas.
-
-        Args:
-            folder_path: Ruta de la carpeta donde buscar archivos PDF.
-
-        Returns:
-            Lista de rutas de archivos PDF encontrados.
-        """
-        pdf_files = []
-        for root, _, files in os.walk(folder_path):
-            for file in files:
-                if file.lower().endswith(".pdf"):
-                    pdf_files.append(os.path.join(root, file))
-        return pdf_files
-
     def remove_markdown(self, text):
         """
         Elimina completamente el formato Markdown del texto.
@@ -1,11 +1,144 @@
 # constants.py
 import os
+from dotenv import load_dotenv
+
+# Cargar .env antes de leer la configuración: los módulos la leen al importarse
+load_dotenv()
 
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 EMBEDDINGS_FILE = os.path.join(ROOT_DIR, "Bot", "data", "embeddings_data.pkl")
-INDEX_FILE = os.path.join(ROOT_DIR, "Bot", "data", "vector_index.pkl")
+EMBEDDINGS_MATRIX_FILE = os.path.join(ROOT_DIR, "Bot", "data", "embeddings.npy")
+CHUNKS_META_FILE = os.path.join(ROOT_DIR, "Bot", "data", "chunks_meta.pkl")
+MANIFEST_FILE = os.path.join(ROOT_DIR, "Bot", "data", "manifest.json")
+EMBEDDING_CACHE_FILE = os.path.join(ROOT_DIR, "Bot", "data", "embedding_cache.sqlite")
+EMBEDDING_CHECKPOINT_FILE = os.path.join(ROOT_DIR, "Bot", "data", "embedding_checkpoint.log")
+FAILED_CHUNKS_FILE = os.path.join(ROOT_DIR, "Bot", "data", "failed_chunks.json")
+QUERY_CACHE_FILE = os.path.join(ROOT_DIR, "Bot", "data", "query_cache.pkl")
+ANN_INDEX_FILE = os.path.join(ROOT_DIR, "Bot", "data", "ann_index.npz")
+FINE_INDEX_VECTORS_FILE = os.path.join(ROOT_DIR, "Bot", "data", "fine_vectors.npy")
+FINE_INDEX_META_FILE = os.path.join(ROOT_DIR, "Bot", "data", "fine_meta.npz")
+BM25_INDEX_FILE = os.path.join(ROOT_DIR, "Bot", "data", "bm25_index.pkl")
+LOCAL_EMBEDDING_MODEL_FILE = os.path.join(ROOT_DIR, "Bot", "data", "local_embedding_model.npz")
+TELEGRAM_FILE_CACHE_FILE = os.path.join(ROOT_DIR, "Bot", "data", "telegram_files.json")
 DOCUMENTS_FOLDER = os.path.join(ROOT_DIR, "Bot", "Libros")
 LOGS_FOLDER = os.path.join(ROOT_DIR, "Bot", "logs")
+
+# Generación de embeddings por lotes
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))
+EMBEDDING_MAX_BATCH_CHARS = int(os.getenv("EMBEDDING_MAX_BATCH_CHARS", "150000"))
+
+# Generación concurrente de embeddings
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))
+EMBEDDING_REQUESTS_PER_SECOND = float(os.getenv("EMBEDDING_REQUESTS_PER_SECOND", "5"))
+
+# Extracción de texto de PDFs en procesos paralelos
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "600"))
+# Páginas por tarea de extracción (0 = una tarea por documento)
+EXTRACTION_PAGES_PER_TASK = int(os.getenv("EXTRACTION_PAGES_PER_TASK", "0"))
+
+# Caché persistente de embeddings (0 la desactiva)
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "2048"))
+
+# Índice de búsqueda: "exact" (coseno exhaustivo) o "ivf" (aproximado IVF-flat)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "exact")
+IVF_N_LISTS = int(os.getenv("IVF_N_LISTS", "0"))  # 0 = automático
+IVF_N_PROBE = int(os.getenv("IVF_N_PROBE", "8"))
+# Por debajo de este número de vectores la búsqueda exacta es suficiente
+IVF_MIN_VECTORS = int(os.getenv("IVF_MIN_VECTORS", "20000"))
+
+# Caché de embeddings de consultas de /search
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", str(7 * 24 * 3600)))
+QUERY_CACHE_PERSIST = os.getenv("QUERY_CACHE_PERSIST", "1") == "1"
+
+# Caché de respuestas de /search (exacta y por similitud de la pregunta)
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+# Modo de ejecución del bot: "threaded" (TeleBot con hilos) o "async" (AsyncTeleBot + aiohttp)
+BOT_RUNTIME = os.getenv("BOT_RUNTIME", "threaded")
+# Hilos para el trabajo bloqueante en el modo asíncrono
+ASYNC_BLOCKING_WORKERS = int(os.getenv("ASYNC_BLOCKING_WORKERS", "8"))
+# Conexiones simultáneas a la API en el modo asíncrono
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("ASYNC_HTTP_MAX_CONNECTIONS", "200"))
+# Tiempos máximos (segundos) de las peticiones a la API
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "30"))
+CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", "120"))
+
+# Cliente de la API de Fireworks
+FIREWORKS_BASE_URL = os.getenv(
+    "FIREWORKS_BASE_URL", "https://api.fireworks.ai/inference/v1"
+)
+FIREWORKS_CONNECT_TIMEOUT = float(os.getenv("FIREWORKS_CONNECT_TIMEOUT", "5"))
+FIREWORKS_MAX_RETRIES = int(os.getenv("FIREWORKS_MAX_RETRIES", "3"))
+FIREWORKS_POOL_SIZE = int(os.getenv("FIREWORKS_POOL_SIZE", "16"))
+# Fallos consecutivos que abren el circuito (0 lo desactiva) y segundos abierto
+FIREWORKS_BREAKER_FAILURES = int(os.getenv("FIREWORKS_BREAKER_FAILURES", "5"))
+FIREWORKS_BREAKER_RESET = float(os.getenv("FIREWORKS_BREAKER_RESET", "30"))
+
+# Respuestas de la IA en streaming, editando el mensaje a medida que llega el texto
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "1") == "1"
+# Segundos mínimos entre ediciones de un mismo mensaje (límite de Telegram)
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
+# Fracción de filas eliminadas (tombstones) que provoca la compactación del almacén
+CHUNK_STORE_COMPACT_RATIO = float(os.getenv("CHUNK_STORE_COMPACT_RATIO", "0.2"))
+
+# Segundos mínimos entre comprobaciones de cambios en la carpeta de documentos
+CATALOG_POLL_INTERVAL = float(os.getenv("CATALOG_POLL_INTERVAL", "30"))
+
+# Planificador de /ask y /search: consultas simultáneas, en espera por usuario
+# y en total, y segundos de espera tras los que una consulta se cancela
+SCHEDULER_MAX_CONCURRENT = int(os.getenv("SCHEDULER_MAX_CONCURRENT", "8"))
+SCHEDULER_MAX_QUEUE_PER_USER = int(os.getenv("SCHEDULER_MAX_QUEUE_PER_USER", "3"))
+SCHEDULER_MAX_PENDING = int(os.getenv("SCHEDULER_MAX_PENDING", "200"))
+SCHEDULER_MAX_WAIT = float(os.getenv("SCHEDULER_MAX_WAIT", "300"))
+
+# Contexto de /search: tokens máximos de los pasajes enviados al modelo
+# (0 = bloques completos) y tamaño de cada pasaje en caracteres
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_PASSAGE_CHARS = int(os.getenv("CONTEXT_PASSAGE_CHARS", "1200"))
+# Puntuar cada pasaje con su propio embedding (una llamada extra a la API de
+# embeddings por consulta); por defecto se usa la puntuación léxica combinada
+# con el embedding ya guardado del chunk de origen
+CONTEXT_EMBED_PASSAGES = os.getenv("CONTEXT_EMBED_PASSAGES", "0") == "1"
+
+# Índice de pasajes (nivel fino) para /search: activación, tamaño de los pasajes,
+# pasajes recuperados y longitud mínima de cada sección devuelta
+FINE_INDEX = os.getenv("FINE_INDEX", "0") == "1"
+FINE_PASSAGE_CHARS = int(os.getenv("FINE_PASSAGE_CHARS", "1000"))
+FINE_TOP_K = int(os.getenv("FINE_TOP_K", "8"))
+FINE_MIN_CONTEXT_CHARS = int(os.getenv("FINE_MIN_CONTEXT_CHARS", "600"))
+
+# Búsqueda híbrida de /search: índice léxico BM25 fusionado con la búsqueda por
+# embeddings (fusión por rango recíproco), candidatos de cada lado, parámetros
+# de BM25 y segundos de espera del embedding de la consulta antes de responder
+# solo con el índice léxico
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+QUERY_EMBEDDING_TIMEOUT = float(os.getenv("QUERY_EMBEDDING_TIMEOUT", "5"))
+
+# Proveedor de embeddings: "fireworks" (API) o "local" (CPU, sin red). El modelo
+# local es el de sentence-transformers indicado en LOCAL_EMBEDDING_MODEL (nombre o
+# ruta) si está instalado y, si no, TF-IDF con hashing y proyección SVD, con sus
+# dimensiones, columnas de hashing y textos máximos para el ajuste
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "fireworks")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "")
+LOCAL_EMBEDDING_DIMENSIONS = int(os.getenv("LOCAL_EMBEDDING_DIMENSIONS", "256"))
+LOCAL_EMBEDDING_FEATURES = int(os.getenv("LOCAL_EMBEDDING_FEATURES", "32768"))
+LOCAL_EMBEDDING_FIT_SAMPLES = int(os.getenv("LOCAL_EMBEDDING_FIT_SAMPLES", "20000"))
+
+# Búsqueda exacta en dos pasadas: cuantización de la copia en memoria ("none",
+# "float16", "int8" o "binary") y candidatos que se vuelven a puntuar en float32
+# con la matriz mapeada (0 = valor por defecto de cada cuantización)
+SEARCH_QUANTIZATION = os.getenv("SEARCH_QUANTIZATION", "none")
+SEARCH_RESCORE_CANDIDATES = int(os.getenv("SEARCH_RESCORE_CANDIDATES", "0"))
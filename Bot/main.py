@@ -1,9 +1,11 @@
 import os
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import telebot
-from dotenv import load_dotenv
 from bot_handler import BotHandler
 from handlers import register_handlers
+from constants import ASYNC_BLOCKING_WORKERS, BOT_RUNTIME
 
 def setup_logging():
     """Configura logging avanzado"""
@@ -22,7 +24,6 @@ def setup_logging():
 
 
 def main():
-    load_dotenv()
     logger = setup_logging()
     logger.info("=== INICIANDO BOT ===")
 
@@ -33,6 +34,13 @@ def main():
         logger.critical("ERROR: No se encontró el TOKEN en las variables de entorno")
         return
 
+    if BOT_RUNTIME == "async":
+        try:
+            asyncio.run(run_async_bot(token, logger))
+        except Exception as e:
+            logger.critical(f"ERROR FATAL iniciando el bot: {str(e)}", exc_info=True)
+        return
+
     try:
         logger.info("Inicializando cliente de Telegram...")
         # Inicializar el bot sin parse_mode Markdown para evitar errores de formato
@@ -43,10 +51,43 @@ def main():
         register_handlers(bot, bot_handler)
 
         logger.info("Bot listo, iniciando polling...")
-        bot.infinity_polling()
+        try:
+            bot.infinity_polling()
+        finally:
+            # La caché de consultas solo se guarda cada save_every entradas nuevas
+            bot_handler.query_cache.save()
     except Exception as e:
         logger.critical(f"ERROR FATAL iniciando el bot: {str(e)}", exc_info=True)
 
 
+async def run_async_bot(token, logger):
+    """
+    Ejecuta el bot con el cliente asíncrono de Telegram (BOT_RUNTIME=async).
+
+    Las consultas a la IA se atienden en el bucle de eventos; los comandos
+    ligeros reutilizan BotHandler con un cliente síncrono en un pool de hilos.
+    """
+    from telebot.async_telebot import AsyncTeleBot
+    from async_handlers import AsyncBotHandler, register_async_handlers
+
+    logger.info("Inicializando cliente asíncrono de Telegram...")
+    bot = AsyncTeleBot(token, parse_mode=None)
+    sender = telebot.TeleBot(token, parse_mode=None, threaded=False)
+
+    # La carga inicial de documentos se hace fuera del bucle de eventos
+    executor = ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_WORKERS)
+    loop = asyncio.get_running_loop()
+    bot_handler = await loop.run_in_executor(executor, BotHandler, sender)
+
+    handler = AsyncBotHandler(bot, bot_handler, executor)
+    register_async_handlers(bot, handler)
+
+    logger.info("Bot listo, iniciando polling asíncrono...")
+    try:
+        await bot.infinity_polling(skip_pending=True)
+    finally:
+        await handler.close()
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,343 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from constants import (
+    SCHEDULER_MAX_CONCURRENT,
+    SCHEDULER_MAX_PENDING,
+    SCHEDULER_MAX_QUEUE_PER_USER,
+    SCHEDULER_MAX_WAIT,
+)
+
+
+class QueueFullError(Exception):
+    """La consulta se rechaza porque la cola del usuario o la global está llena"""
+
+
+def log_queue_metrics(logger, name, metrics):
+    """Registra el estado de una cola de consultas"""
+    m = metrics
+    logger.info(
+        f"Cola de {name}: {m['running']} en curso, {m['pending']} en espera "
+        f"({m['users_waiting']} usuarios, máx. {m['depth_max']}), {m['completed']} completadas, "
+        f"{m['rejected']} rechazadas, {m['expired']} caducadas, espera media {m['wait_avg']:.2f} s "
+        f"(máx. {m['wait_max']:.2f} s)"
+    )
+
+
+class Job:
+    """Consulta pendiente de un usuario"""
+
+    def __init__(self, user_id, func, args, on_expire=None):
+        self.user_id = user_id
+        self.func = func
+        self.args = args
+        self.on_expire = on_expire
+        self.submitted_at = time.monotonic()
+
+
+class FairQueue:
+    """
+    Colas FIFO por usuario atendidas por turnos.
+
+    Cada usuario tiene como mucho una consulta en ejecución; las demás
+    esperan en su cola. Cuando queda un hueco libre (hasta max_concurrent
+    consultas simultáneas en total) se atiende al siguiente usuario de la
+    rueda, de modo que un usuario con muchas consultas no retrasa a los
+    demás más de una consulta por turno. No es segura entre hilos: los
+    planificadores la protegen.
+    """
+
+    def __init__(
+        self,
+        max_concurrent=SCHEDULER_MAX_CONCURRENT,
+        max_queue_per_user=SCHEDULER_MAX_QUEUE_PER_USER,
+        max_pending=SCHEDULER_MAX_PENDING,
+        max_wait=SCHEDULER_MAX_WAIT,
+    ):
+        """
+        Args:
+            max_concurrent: Consultas simultáneas como máximo
+            max_queue_per_user: Consultas en espera por usuario antes de rechazar nuevas
+            max_pending: Consultas en espera en total antes de rechazar nuevas
+            max_wait: Segundos de espera tras los que una consulta se cancela
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue_per_user = max_queue_per_user
+        self.max_pending = max_pending
+        self.max_wait = max_wait
+        self.queues = {}  # usuario -> deque de Job en espera
+        self.ready = deque()  # usuarios con consultas en espera y sin ninguna en curso
+        self.running = set()  # usuarios con una consulta en curso
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.depth_max = 0
+
+    def push(self, job):
+        """
+        Añade una consulta a la cola de su usuario.
+
+        Returns:
+            int: Consultas que se atenderán antes que esta (0 = empieza ya)
+
+        Raises:
+            QueueFullError: Si la cola del usuario o la global está llena
+        """
+        queue = self.queues.setdefault(job.user_id, deque())
+        if len(queue) >= self.max_queue_per_user or self.pending >= self.max_pending:
+            self.rejected += 1
+            if not queue:
+                del self.queues[job.user_id]
+            raise QueueFullError(
+                f"Cola llena ({len(queue)} del usuario, {self.pending} en total)"
+            )
+
+        queue.append(job)
+        self.pending += 1
+        self.depth_max = max(self.depth_max, self.pending)
+        if len(queue) == 1 and job.user_id not in self.running:
+            self.ready.append(job.user_id)
+        return self.position(job)
+
+    def position(self, job):
+        """
+        Consultas que se atenderán antes que esta según el reparto por turnos.
+
+        Con k consultas por delante en su propia cola, cada otro usuario
+        puede ser atendido hasta k + 1 veces antes que ella.
+        """
+        queue = self.queues.get(job.user_id, ())
+        ahead_own = list(queue).index(job) if job in queue else 0
+        if job.user_id in self.running:
+            ahead_own += 1
+        ahead_others = sum(
+            min(len(other), ahead_own + 1)
+            for user_id, other in self.queues.items()
+            if user_id != job.user_id
+        )
+        ahead = ahead_own + ahead_others
+        free = self.max_concurrent - len(self.running)
+        if job.user_id not in self.running and ahead_own == 0 and ahead < free:
+            return 0
+        return ahead + 1
+
+    def pop(self):
+        """
+        Saca la siguiente consulta a ejecutar si hay un hueco libre.
+
+        Returns:
+            tuple: (consulta o None, consultas caducadas que se han descartado)
+        """
+        expired = []
+        now = time.monotonic()
+        while self.ready and len(self.running) < self.max_concurrent:
+            user_id = self.ready.popleft()
+            queue = self.queues[user_id]
+            job = queue.popleft()
+            self.pending -= 1
+            if not queue:
+                del self.queues[user_id]
+
+            waited = now - job.submitted_at
+            if self.max_wait and waited > self.max_wait:
+                self.expired += 1
+                expired.append(job)
+                if user_id in self.queues:
+                    self.ready.append(user_id)
+                continue
+
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.running.add(user_id)
+            return job, expired
+        return None, expired
+
+    def done(self, job):
+        """Libera el hueco de una consulta terminada y devuelve su usuario a la rueda"""
+        self.running.discard(job.user_id)
+        self.completed += 1
+        if job.user_id in self.queues:
+            self.ready.append(job.user_id)
+
+    def metrics(self):
+        """
+        Métricas de la cola.
+
+        Returns:
+            dict: Consultas en curso y en espera, máximos, rechazos y tiempos de espera
+        """
+        started = self.completed + len(self.running)
+        return {
+            "running": len(self.running),
+            "pending": self.pending,
+            "users_waiting": len(self.queues),
+            "depth_max": self.depth_max,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "wait_avg": self.wait_total / started if started else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+
+class FairScheduler:
+    """
+    Planificador de consultas para el bot con hilos.
+
+    Las consultas se ejecutan en un grupo fijo de max_concurrent hilos
+    propios, de modo que los hilos de TeleBot solo encolan y quedan libres
+    para seguir recibiendo mensajes.
+    """
+
+    def __init__(self, name="consultas", **limits):
+        """
+        Args:
+            name: Nombre para los hilos y el registro
+            limits: Límites de FairQueue
+        """
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.queue = FairQueue(**limits)
+        self.condition = threading.Condition()
+        self.workers = []
+
+    def submit(self, user_id, func, *args, on_expire=None):
+        """
+        Encola func(*args) en la cola del usuario.
+
+        Args:
+            user_id: Usuario que envía la consulta
+            func: Función que atiende la consulta
+            on_expire: Función llamada si la consulta espera más de max_wait
+
+        Returns:
+            int: Consultas por delante (0 = empieza ya)
+
+        Raises:
+            QueueFullError: Si la cola del usuario o la global está llena
+        """
+        with self.condition:
+            position = self.queue.push(Job(user_id, func, args, on_expire))
+            self._start_workers()
+            self.condition.notify()
+        return position
+
+    def metrics(self):
+        """Métricas de la cola (ver FairQueue.metrics)"""
+        with self.condition:
+            return self.queue.metrics()
+
+    def log_metrics(self):
+        """Registra el estado de la cola"""
+        log_queue_metrics(self.logger, self.name, self.metrics())
+
+    def _start_workers(self):
+        """Arranca los hilos la primera vez que hacen falta"""
+        while len(self.workers) < self.queue.max_concurrent:
+            worker = threading.Thread(
+                target=self._work, name=f"{self.name}-{len(self.workers)}", daemon=True
+            )
+            self.workers.append(worker)
+            worker.start()
+
+    def _work(self):
+        while True:
+            with self.condition:
+                job, expired = self.queue.pop()
+                while job is None and not expired:
+                    self.condition.wait()
+                    job, expired = self.queue.pop()
+            for stale in expired:
+                self._expire(stale)
+            if job is None:
+                continue
+            try:
+                job.func(*job.args)
+            except Exception as e:
+                self.logger.error(f"Error atendiendo consulta de {job.user_id}: {e}")
+            finally:
+                with self.condition:
+                    self.queue.done(job)
+                    self.condition.notify()
+
+    def _expire(self, job):
+        self.logger.warning(f"Consulta de {job.user_id} cancelada tras esperar demasiado")
+        if job.on_expire:
+            try:
+                job.on_expire()
+            except Exception as e:
+                self.logger.error(f"Error notificando consulta caducada: {e}")
+
+
+class AsyncFairScheduler:
+    """
+    Planificador de consultas para el bot asíncrono.
+
+    Mismo reparto que FairScheduler, pero cada consulta es una corrutina
+    lanzada como tarea del bucle de eventos cuando le llega el turno.
+    """
+
+    def __init__(self, name="consultas", **limits):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.queue = FairQueue(**limits)
+        self.tasks = set()
+
+    def submit(self, user_id, func, *args, on_expire=None):
+        """
+        Encola la corrutina func(*args) en la cola del usuario.
+
+        Args:
+            on_expire: Corrutina (sin argumentos) que se espera si la consulta caduca
+
+        Returns:
+            int: Consultas por delante (0 = empieza ya)
+
+        Raises:
+            QueueFullError: Si la cola del usuario o la global está llena
+        """
+        position = self.queue.push(Job(user_id, func, args, on_expire))
+        self._dispatch()
+        return position
+
+    def metrics(self):
+        """Métricas de la cola (ver FairQueue.metrics)"""
+        return self.queue.metrics()
+
+    def log_metrics(self):
+        """Registra el estado de la cola"""
+        log_queue_metrics(self.logger, self.name, self.metrics())
+
+    def _dispatch(self):
+        """Lanza consultas mientras haya huecos libres"""
+        while True:
+            job, expired = self.queue.pop()
+            for stale in expired:
+                self.logger.warning(f"Consulta de {stale.user_id} cancelada tras esperar demasiado")
+                if stale.on_expire:
+                    self._spawn(stale.on_expire())
+            if job is None:
+                if not expired:
+                    return
+                continue
+            self._spawn(self._run(job))
+
+    async def _run(self, job):
+        try:
+            await job.func(*job.args)
+        except Exception as e:
+            self.logger.error(f"Error atendiendo consulta de {job.user_id}: {e}")
+        finally:
+            self.queue.done(job)
+            self._dispatch()
+
+    def _spawn(self, coro):
+        # Se guarda una referencia para que la tarea no se recoja antes de terminar
+        task = asyncio.get_running_loop().create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
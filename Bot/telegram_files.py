@@ -0,0 +1,82 @@
+import json
+import logging
+import os
+import threading
+from constants import TELEGRAM_FILE_CACHE_FILE
+
+
+class TelegramFileCache:
+    """
+    Identificadores de Telegram (file_id) de los documentos ya enviados.
+
+    Telegram devuelve un file_id al recibir un archivo; reenviarlo con ese
+    identificador no vuelve a subir los bytes. Las entradas se guardan por
+    hash de contenido, así que un documento modificado tiene otro hash y se
+    vuelve a subir sin necesidad de invalidar nada a mano.
+    """
+
+    def __init__(self, file_path=TELEGRAM_FILE_CACHE_FILE):
+        """
+        Args:
+            file_path: Archivo JSON donde persisten los identificadores
+        """
+        self.logger = logging.getLogger(__name__)
+        self.file_path = file_path
+        self.files = {}  # hash de contenido -> {"file_id", "name"}
+        self.lock = threading.Lock()
+        self.load()
+
+    def get(self, content_hash):
+        """Devuelve el file_id del documento con ese hash, o None"""
+        entry = self.files.get(content_hash)
+        return entry["file_id"] if entry else None
+
+    def put(self, content_hash, file_id, name=""):
+        """Guarda el file_id devuelto por Telegram para un documento"""
+        with self.lock:
+            self.files[content_hash] = {"file_id": file_id, "name": name}
+            self._save()
+
+    def discard(self, content_hash):
+        """Olvida el file_id de un documento (p. ej. si Telegram lo rechaza)"""
+        with self.lock:
+            if self.files.pop(content_hash, None) is not None:
+                self._save()
+
+    def prune(self, valid_hashes):
+        """
+        Elimina las entradas de documentos que ya no existen.
+
+        Args:
+            valid_hashes: Hashes de contenido de los documentos actuales
+        """
+        with self.lock:
+            stale = [h for h in self.files if h not in valid_hashes]
+            for content_hash in stale:
+                del self.files[content_hash]
+            if stale:
+                self._save()
+                self.logger.info(f"Eliminados {len(stale)} file_id de documentos que ya no existen")
+
+    def load(self):
+        """Carga los identificadores guardados"""
+        if not os.path.exists(self.file_path):
+            return
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+            self.logger.info(f"Cargados {len(self.files)} file_id de Telegram desde {self.file_path}")
+        except Exception as e:
+            self.logger.error(f"Error cargando {self.file_path}: {e}")
+            self.files = {}
+
+    def _save(self):
+        """Guarda los identificadores de forma atómica"""
+        try:
+            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+            tmp_path = self.file_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "files": self.files}, f, indent=1)
+            os.replace(tmp_path, self.file_path)
+        except OSError as e:
+            self.logger.error(f"Error guardando {self.file_path}: {e}")
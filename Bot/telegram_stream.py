@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import time
+from telebot.apihelper import ApiTelegramException
+from constants import STREAM_EDIT_INTERVAL, TELEGRAM_MAX_MESSAGE_LENGTH
+
+
+def split_message(text, max_length=TELEGRAM_MAX_MESSAGE_LENGTH):
+    """Divide un texto en partes que caben en un mensaje de Telegram"""
+    if len(text) <= max_length:
+        return [text]
+    return [text[i : i + max_length] for i in range(0, len(text), max_length)]
+
+
+def _retry_after(error):
+    """Segundos de espera que pide Telegram en un error 429, o None"""
+    if getattr(error, "error_code", None) != 429:
+        return None
+    parameters = (getattr(error, "result_json", None) or {}).get("parameters", {})
+    return parameters.get("retry_after", 1)
+
+
+def _is_not_modified(error):
+    """Telegram rechaza las ediciones que no cambian el texto"""
+    return "message is not modified" in str(getattr(error, "description", error))
+
+
+def _is_parse_error(error):
+    """Error de Telegram al interpretar el formato Markdown"""
+    return "can't parse entities" in str(getattr(error, "description", error))
+
+
+class StreamingReply:
+    """
+    Respuesta de Telegram que se va completando a medida que llega el texto.
+
+    Envía un mensaje provisional y lo edita con el texto acumulado, como
+    mucho una vez cada min_interval segundos para respetar los límites de
+    edición de Telegram (y más tarde si Telegram devuelve un 429). Cuando el
+    texto supera la longitud máxima de un mensaje, la parte sobrante
+    continúa en mensajes nuevos.
+
+    La lógica (límite de frecuencia, división, reintentos y formato de
+    respaldo) está en generadores que producen las operaciones de Telegram
+    ("send", "edit", "delete", "sleep") y reciben su resultado o su error;
+    esta clase las ejecuta con TeleBot y AsyncStreamingReply con AsyncTeleBot.
+    """
+
+    def __init__(
+        self,
+        bot,
+        chat_id,
+        placeholder="⏳ Generando respuesta...",
+        min_interval=STREAM_EDIT_INTERVAL,
+        max_length=TELEGRAM_MAX_MESSAGE_LENGTH,
+    ):
+        """
+        Args:
+            bot: Instancia de TeleBot (o AsyncTeleBot en AsyncStreamingReply)
+            chat_id: Chat donde se publica la respuesta
+            placeholder: Texto del mensaje provisional
+            min_interval: Segundos mínimos entre ediciones
+            max_length: Longitud máxima de cada mensaje
+        """
+        self.logger = logging.getLogger(__name__)
+        self.bot = bot
+        self.chat_id = chat_id
+        self.placeholder = placeholder
+        self.min_interval = min_interval
+        self.max_length = max_length
+        self.message_ids = []
+        self.shown = []  # texto visible en cada mensaje
+        self.next_edit_at = 0.0
+        self.started_at = time.perf_counter()
+        self.first_text_at = None
+
+    def start(self):
+        """Publica el mensaje provisional"""
+        self._run(self._start_operations())
+
+    def update(self, text):
+        """Muestra el texto acumulado si ha pasado el intervalo mínimo desde la última edición"""
+        self._run(self._update_operations(text))
+
+    def finish(self, parts, parse_mode=None):
+        """
+        Muestra el texto final, sin limitación de frecuencia.
+
+        Args:
+            parts: Texto final o lista de partes (p. ej. la salida de sanitize_markdown)
+            parse_mode: Formato de Telegram para el texto final
+        """
+        self._run(self._finish_operations(parts, parse_mode))
+
+    def _run(self, operations):
+        """Ejecuta las operaciones de Telegram de un generador hasta que termina"""
+        result, error = None, None
+        while True:
+            try:
+                operation = operations.send(result) if error is None else operations.throw(error)
+            except StopIteration:
+                return
+            result, error = None, None
+            try:
+                result = self._perform(*operation)
+            except Exception as e:
+                error = e
+
+    def _perform(self, kind, *args):
+        """Ejecuta una operación con TeleBot"""
+        if kind == "send":
+            text, parse_mode = args
+            return self.bot.send_message(self.chat_id, text, parse_mode=parse_mode)
+        if kind == "edit":
+            message_id, text, parse_mode = args
+            return self.bot.edit_message_text(text, self.chat_id, message_id, parse_mode=parse_mode)
+        if kind == "delete":
+            return self.bot.delete_message(self.chat_id, args[0])
+        time.sleep(args[0])
+
+    # Lógica común a ambas versiones: generadores de operaciones
+
+    def _start_operations(self):
+        message = yield ("send", self.placeholder, None)
+        self.message_ids.append(message.message_id)
+        self.shown.append(self.placeholder)
+        self.started_at = time.perf_counter()
+
+    def _update_operations(self, text):
+        if not text.strip() or time.monotonic() < self.next_edit_at:
+            return
+        if self.first_text_at is None:
+            self.first_text_at = time.perf_counter()
+            self.logger.info(
+                f"Primer texto visible en {self.first_text_at - self.started_at:.2f} segundos"
+            )
+        yield from self._render_operations(split_message(text, self.max_length))
+
+    def _finish_operations(self, parts, parse_mode):
+        if isinstance(parts, str):
+            parts = split_message(parts, self.max_length)
+        self.next_edit_at = 0.0
+        yield from self._render_operations(parts, parse_mode, final=True)
+
+        # Mensajes sobrantes si el texto final ocupa menos que el provisional
+        for message_id in self.message_ids[len(parts) :]:
+            try:
+                yield ("delete", message_id)
+            except Exception as e:
+                self.logger.warning(f"No se pudo borrar un mensaje sobrante: {e}")
+        del self.message_ids[len(parts) :]
+        del self.shown[len(parts) :]
+
+    def _render_operations(self, parts, parse_mode=None, final=False):
+        """Edita los mensajes existentes y envía los nuevos necesarios"""
+        for i, part in enumerate(parts):
+            if i < len(self.message_ids):
+                if self.shown[i] == part and not final:
+                    continue
+                if not (yield from self._edit_operations(i, part, parse_mode, final)):
+                    return
+            elif not (yield from self._send_operations(part, parse_mode, final)):
+                return
+        self.next_edit_at = time.monotonic() + self.min_interval
+
+    def _edit_operations(self, i, text, parse_mode, wait):
+        """
+        Edita el mensaje i.
+
+        Returns:
+            bool: False si Telegram pide esperar y wait es False
+        """
+        while True:
+            try:
+                yield ("edit", self.message_ids[i], text, parse_mode)
+            except ApiTelegramException as e:
+                if _is_not_modified(e):
+                    pass
+                elif parse_mode and _is_parse_error(e):
+                    # Si el formato no es válido se muestra como texto plano
+                    parse_mode = None
+                    continue
+                elif not (yield from self._wait_operations(e, wait)):
+                    return False
+                else:
+                    continue
+            self.shown[i] = text
+            return True
+
+    def _send_operations(self, text, parse_mode, wait):
+        """
+        Envía un mensaje adicional.
+
+        Returns:
+            bool: False si Telegram pide esperar y wait es False
+        """
+        while True:
+            try:
+                message = yield ("send", text, parse_mode)
+            except ApiTelegramException as e:
+                if parse_mode and _is_parse_error(e):
+                    parse_mode = None
+                    continue
+                if not (yield from self._wait_operations(e, wait)):
+                    return False
+                continue
+            self.message_ids.append(message.message_id)
+            self.shown.append(text)
+            return True
+
+    def _wait_operations(self, error, wait):
+        """
+        Atiende un 429: espera si wait es True o pospone la siguiente edición.
+
+        Returns:
+            bool: True si se debe reintentar la operación
+
+        Raises:
+            ApiTelegramException: Si el error no es un 429
+        """
+        retry_after = _retry_after(error)
+        if retry_after is None:
+            raise error
+        if not wait:
+            self.next_edit_at = time.monotonic() + retry_after
+            return False
+        yield ("sleep", retry_after)
+        return True
+
+
+class AsyncStreamingReply(StreamingReply):
+    """Versión de StreamingReply para AsyncTeleBot: misma lógica, operaciones con await."""
+
+    async def start(self):
+        """Publica el mensaje provisional"""
+        await self._run(self._start_operations())
+
+    async def update(self, text):
+        """Muestra el texto acumulado si ha pasado el intervalo mínimo desde la última edición"""
+        await self._run(self._update_operations(text))
+
+    async def finish(self, parts, parse_mode=None):
+        """Muestra el texto final, sin limitación de frecuencia"""
+        await self._run(self._finish_operations(parts, parse_mode))
+
+    async def _run(self, operations):
+        """Ejecuta las operaciones de Telegram de un generador hasta que termina"""
+        result, error = None, None
+        while True:
+            try:
+                operation = operations.send(result) if error is None else operations.throw(error)
+            except StopIteration:
+                return
+            result, error = None, None
+            try:
+                result = await self._perform(*operation)
+            except Exception as e:
+                error = e
+
+    async def _perform(self, kind, *args):
+        """Ejecuta una operación con AsyncTeleBot"""
+        if kind == "send":
+            text, parse_mode = args
+            return await self.bot.send_message(self.chat_id, text, parse_mode=parse_mode)
+        if kind == "edit":
+            message_id, text, parse_mode = args
+            return await self.bot.edit_message_text(
+                text, self.chat_id, message_id, parse_mode=parse_mode
+            )
+        if kind == "delete":
+            return await self.bot.delete_message(self.chat_id, args[0])
+        await asyncio.sleep(args[0])
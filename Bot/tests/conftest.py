@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Los módulos del bot se importan desde Bot/, como al ejecutar main.py
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+import constants  # noqa: E402
+
+# Datos, documentos y logs de las pruebas en un directorio temporal. Se cambia
+# antes de importar ningún otro módulo, porque las rutas se usan como valores
+# por defecto de los argumentos al importarlos.
+DATA_ROOT = tempfile.mkdtemp(prefix="bot-tests-")
+for name in dir(constants):
+    value = getattr(constants, name)
+    if isinstance(value, str) and value.startswith(os.path.join(constants.ROOT_DIR, "Bot")):
+        setattr(constants, name, value.replace(os.path.join(constants.ROOT_DIR, "Bot"), DATA_ROOT))
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """Crea un PDF con una página por cada texto (varias líneas por página)."""
+    from reportlab.pdfgen import canvas
+
+    def make(name, pages, folder=None):
+        path = os.path.join(folder or str(tmp_path), name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pdf = canvas.Canvas(path)
+        for text in pages:
+            y = 800
+            for line in text.splitlines():
+                pdf.drawString(40, y, line)
+                y -= 14
+            pdf.showPage()
+        pdf.save()
+        return path
+
+    return make
+
+
+@pytest.fixture(scope="session")
+def stub_server():
+    from ai_embedding.fireworks_stub import start_stub_server
+
+    server, base_url = start_stub_server()
+    yield server, base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def stub(stub_server):
+    """Servidor simulado de Fireworks con contadores y errores programados nuevos."""
+    from ai_embedding.fireworks_stub import StubState
+
+    server, base_url = stub_server
+    server.state = StubState()
+    return server.state, base_url
+
+
+@pytest.fixture
+def library(stub, monkeypatch):
+    """
+    Biblioteca vacía para probar la ingesta completa: sin datos previos,
+    con el cliente de la API apuntando al servidor simulado y sin estado
+    global de ingestas anteriores.
+    """
+    import shutil
+    from ai_embedding import ai, extract
+    from ai_embedding.fireworks_client import FireworksClient
+
+    shutil.rmtree(DATA_ROOT)
+    os.makedirs(constants.DOCUMENTS_FOLDER)
+    _, base_url = stub
+    client = FireworksClient(base_url, ai.headers, base_delay=0.001)
+    for module, name, value in [
+        (ai, "_fireworks_client", client),
+        (ai, "_embedding_provider", None),
+        (ai, "_embedding_cache", None),
+        (ai, "_chunk_lookup", None),
+        (extract, "_fine_index", None),
+        (extract, "_bm25_index", None),
+    ]:
+        monkeypatch.setattr(module, name, value)
+    yield constants.DOCUMENTS_FOLDER
+    client.close()
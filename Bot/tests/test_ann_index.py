@@ -0,0 +1,52 @@
+import numpy as np
+from ai_embedding.ann_index import IVFFlatIndex
+from ai_embedding.search_engine import CosineSearchEngine
+
+
+def clustered_matrix(clusters=20, per_cluster=100, dimensions=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimensions))
+    points = np.repeat(centers, per_cluster, axis=0) + 0.3 * rng.standard_normal(
+        (clusters * per_cluster, dimensions)
+    )
+    return points.astype(np.float32)
+
+
+def recall(index, exact, queries, top_k=10):
+    hits = 0
+    for query in queries:
+        expected = {row for row, _ in exact.search(query, top_k)}
+        hits += len(expected & {row for row, _ in index.search(query, top_k)})
+    return hits / (top_k * len(queries))
+
+
+def test_probing_every_list_is_exact():
+    matrix = clustered_matrix()
+    index = IVFFlatIndex(n_lists=16, n_probe=16).build(matrix)
+    exact = CosineSearchEngine(matrix)
+    queries = matrix[::97] + 0.1
+    assert recall(index, exact, queries) == 1.0
+
+
+def test_recall_with_few_probes_on_clustered_data():
+    matrix = clustered_matrix()
+    index = IVFFlatIndex(n_lists=40, n_probe=6).build(matrix)
+    exact = CosineSearchEngine(matrix)
+    queries = matrix[::50] + 0.05
+    assert recall(index, exact, queries) >= 0.9
+
+
+def test_invalid_rows_are_not_indexed_and_saved_index_reloads(tmp_path):
+    matrix = clustered_matrix(clusters=5, per_cluster=40)
+    valid = np.ones(len(matrix), dtype=bool)
+    valid[::2] = False
+    index = IVFFlatIndex(n_lists=8, n_probe=8).build(matrix, valid)
+    assert index.size == valid.sum()
+    assert all(valid[row] for row, _ in index.search(matrix[0], top_k=50))
+
+    path = str(tmp_path / "ivf.npz")
+    index.signature = "firma"
+    index.save(path)
+    loaded = IVFFlatIndex.load(path, matrix)
+    assert loaded.signature == "firma"
+    assert loaded.search(matrix[1], top_k=5) == index.search(matrix[1], top_k=5)
@@ -0,0 +1,51 @@
+import time
+from ai_embedding.answer_cache import AnswerCache
+
+CHUNKS = [
+    {"content_hash": "doc-a", "chunk_id": "Block-1"},
+    {"content_hash": "doc-a", "chunk_id": "Block-2"},
+]
+OTHER_CHUNKS = [{"content_hash": "doc-b", "chunk_id": "Block-1"}]
+
+
+def test_exact_hit_ignores_chunk_order_and_question_formatting():
+    cache = AnswerCache()
+    cache.put("¿Qué es BRCA1?", None, CHUNKS, "respuesta", ["ref"])
+    assert cache.get("que es brca1", None, list(reversed(CHUNKS))) == ("respuesta", ["ref"])
+    assert cache.get("que es brca1", None, OTHER_CHUNKS) is None
+
+
+def test_semantic_hit_requires_threshold_and_same_chunks():
+    cache = AnswerCache(similarity_threshold=0.95)
+    cache.put("¿Qué es BRCA1?", [1.0, 0.0], CHUNKS, "respuesta", ["ref"])
+
+    assert cache.get("Explica BRCA1", [0.99, 0.05], CHUNKS) == ("respuesta", ["ref"])
+    assert cache.get("Explica BRCA1", [0.99, 0.05], OTHER_CHUNKS) is None
+    assert cache.get("Otra cosa", [0.5, 0.5], CHUNKS) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_answers_without_references_are_not_cached():
+    cache = AnswerCache()
+    cache.put("pregunta", [1.0], CHUNKS, "⚠️ Error", [])
+    assert cache.get("pregunta", [1.0], CHUNKS) is None
+
+
+def test_index_change_and_capacity_evict_entries():
+    cache = AnswerCache(max_entries=2)
+    for question in ("a", "b", "c"):
+        cache.put(question, None, CHUNKS, question.upper(), ["ref"])
+    assert cache.get("a", None, CHUNKS) is None
+    assert cache.get("c", None, CHUNKS) == ("C", ["ref"])
+
+    cache.set_index_version("v1")
+    assert cache.get("c", None, CHUNKS) is None
+    assert not cache.by_signature
+
+
+def test_expired_answers_are_misses(monkeypatch):
+    cache = AnswerCache(ttl=10)
+    cache.put("pregunta", [1.0], CHUNKS, "respuesta", ["ref"])
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get("pregunta", [1.0], CHUNKS) is None
@@ -0,0 +1,61 @@
+import threading
+from types import SimpleNamespace
+import requests
+from ai_embedding import ai
+from bot_handler import BotHandler
+from request_scheduler import FairScheduler
+
+
+def test_scheduler_and_embedding_pool_are_created_on_first_use(library):
+    threads = threading.active_count()
+    handler = BotHandler(bot=None)
+    assert handler._scheduler is None
+    assert handler._embedding_executor is None
+    assert threading.active_count() == threads
+
+    assert isinstance(handler.scheduler, FairScheduler)
+    assert handler.scheduler is handler.scheduler
+    assert handler.embedding_executor is handler.embedding_executor
+    handler.embedding_executor.shutdown(wait=False)
+
+
+class RecordingBot:
+    """Bot de Telegram que solo registra los textos enviados o editados."""
+
+    def __init__(self):
+        self.texts = []
+        self.next_id = 0
+
+    def send_chat_action(self, chat_id, action):
+        pass
+
+    def send_message(self, chat_id, text, parse_mode=None, **kwargs):
+        self.texts.append(text)
+        self.next_id += 1
+        return SimpleNamespace(message_id=self.next_id)
+
+    def edit_message_text(self, text, chat_id, message_id, parse_mode=None):
+        self.texts.append(text)
+
+    def delete_message(self, chat_id, message_id):
+        pass
+
+
+def test_search_falls_back_to_extractive_answer_when_chat_fails(library, make_pdf, monkeypatch):
+    for i, topic in enumerate(["alineamiento de secuencias", "estructura de proteínas"]):
+        lines = "\n".join(f"{topic} linea {line} BRCA1 TP53 lectura" for line in range(45))
+        make_pdf(f"doc{i}.pdf", [lines] * 3, folder=library)
+    bot = RecordingBot()
+    handler = BotHandler(bot=bot)
+    assert handler.embed_search_query("BRCA1 alineamiento") is not None
+
+    def chat_down(payload, on_text=None):
+        raise requests.exceptions.ConnectionError("servicio caído")
+
+    monkeypatch.setattr(ai, "complete_chat", chat_down)
+    message = SimpleNamespace(chat=SimpleNamespace(id=1))
+    handler._answer_embedding_search(message, "BRCA1 alineamiento")
+
+    assert any(text.startswith(ai.EXTRACTIVE_ANSWER_HEADER) for text in bot.texts)
+    assert not any(ai.API_ERROR_ANSWER in text for text in bot.texts)
+    assert not handler.answer_cache.entries
@@ -0,0 +1,110 @@
+import pickle
+import numpy as np
+import pytest
+from ai_embedding.checkpoint import (
+    EmbeddingCheckpoint,
+    chunk_key,
+    load_failed_chunks,
+    save_failed_chunks,
+)
+
+
+def make_chunks(count):
+    return [{"content_hash": "doc", "chunk_id": f"Block-{i}", "text": f"t{i}"} for i in range(count)]
+
+
+def write(path, model, embeddings):
+    checkpoint = EmbeddingCheckpoint(path, model)
+    for chunk, embedding in embeddings:
+        checkpoint.append(chunk, embedding)
+    checkpoint.close()
+
+
+def test_restore_after_interruption(tmp_path):
+    path = str(tmp_path / "data" / "checkpoint.log")
+    chunks = make_chunks(3)
+    write(path, "m:1", [(chunks[0], [1.0, 0.0]), (chunks[2], [0.0, 1.0])])
+
+    fresh = make_chunks(3)
+    assert EmbeddingCheckpoint(path, "m:1").restore(fresh) == 2
+    assert fresh[0]["embedding"] == [1.0, 0.0]
+    assert "embedding" not in fresh[1]
+    assert fresh[2]["embedding"] == [0.0, 1.0]
+
+
+def test_truncated_last_record_is_ignored(tmp_path):
+    path = str(tmp_path / "checkpoint.log")
+    chunks = make_chunks(2)
+    write(path, "m:1", [(chunks[0], [1.0, 2.0]), (chunks[1], [3.0, 4.0])])
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 5)
+    assert list(EmbeddingCheckpoint(path, "m:1").load()) == [chunk_key(chunks[0])]
+
+
+def test_checkpoint_of_another_model_is_discarded(tmp_path):
+    path = str(tmp_path / "checkpoint.log")
+    chunks = make_chunks(1)
+    write(path, "fireworks:nomic:768", [(chunks[0], [1.0] * 768)])
+    assert EmbeddingCheckpoint(path, "local:hashing-svd:256").restore(make_chunks(1)) == 0
+
+
+def test_records_with_other_dimensions_are_rejected(tmp_path):
+    path = str(tmp_path / "checkpoint.log")
+    chunks = make_chunks(2)
+    write(path, "m:1", [(chunks[0], [1.0, 2.0])])
+    # Registro ajeno añadido al final con otras dimensiones
+    with open(path, "ab") as f:
+        pickle.dump((chunk_key(chunks[1]), np.ones(3, dtype=np.float32).tobytes()), f)
+    assert list(EmbeddingCheckpoint(path, "m:1").load()) == [chunk_key(chunks[0])]
+
+    checkpoint = EmbeddingCheckpoint(path, "m:1")
+    checkpoint.append(chunks[1], [1.0, 2.0])
+    with pytest.raises(ValueError):
+        checkpoint.append(chunks[0], [1.0, 2.0, 3.0])
+    checkpoint.close()
+
+
+def test_legacy_checkpoint_without_header_is_discarded(tmp_path):
+    path = str(tmp_path / "checkpoint.log")
+    chunks = make_chunks(1)
+    with open(path, "wb") as f:
+        pickle.dump((chunk_key(chunks[0]), np.ones(2, dtype=np.float32).tobytes()), f)
+    assert EmbeddingCheckpoint(path, "m:1").load() == {}
+
+
+def test_append_continues_same_model_and_replaces_other(tmp_path):
+    path = str(tmp_path / "checkpoint.log")
+    chunks = make_chunks(3)
+    write(path, "m:1", [(chunks[0], [1.0, 2.0])])
+    write(path, "m:1", [(chunks[1], [3.0, 4.0])])
+    assert len(EmbeddingCheckpoint(path, "m:1").load()) == 2
+
+    write(path, "m:2", [(chunks[2], [5.0, 6.0, 7.0])])
+    assert EmbeddingCheckpoint(path, "m:1").load() == {}
+    assert list(EmbeddingCheckpoint(path, "m:2").load()) == [chunk_key(chunks[2])]
+
+
+def test_clear_removes_the_log(tmp_path):
+    path = str(tmp_path / "checkpoint.log")
+    write(path, "m:1", [(make_chunks(1)[0], [1.0])])
+    EmbeddingCheckpoint(path, "m:1").clear()
+    assert EmbeddingCheckpoint(path, "m:1").load() == {}
+
+
+def test_chunk_key_uses_content_hash_or_text():
+    assert chunk_key({"content_hash": "abc", "chunk_id": "Block-1"}) == "abc:Block-1"
+    assert chunk_key({"text": "x", "chunk_id": "Block-1"}) == chunk_key(
+        {"text": "x", "chunk_id": "Block-1"}
+    )
+    assert chunk_key({"text": "x", "chunk_id": "Block-1"}) != chunk_key(
+        {"text": "y", "chunk_id": "Block-1"}
+    )
+
+
+def test_failed_chunks_accumulate_attempts(tmp_path):
+    path = str(tmp_path / "failed.json")
+    chunks = make_chunks(2)
+    save_failed_chunks(path, chunks)
+    records = save_failed_chunks(path, chunks[:1])
+    assert [record["attempts"] for record in records.values()] == [2]
+    assert load_failed_chunks(path) == records
@@ -0,0 +1,41 @@
+import numpy as np
+from ai_embedding.checkpoint import chunk_key
+from ai_embedding.chunk_lookup import ChunkLookup
+
+
+def make_chunks(count=20, dimensions=8, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimensions)).astype(np.float32)
+    chunks = [
+        {"content_hash": "doc", "chunk_id": f"Block-{i + 1}", "embedding": vectors[i].tolist()}
+        for i in range(count)
+    ]
+    return chunks, vectors
+
+
+def test_exact_vectors_and_keys_resolve_to_their_chunk():
+    chunks, vectors = make_chunks()
+    lookup = ChunkLookup(chunks)
+    for chunk, vector in zip(chunks, vectors):
+        assert lookup.resolve_vector(vector) is chunk
+        assert lookup.resolve_vector(vector.tolist()) is chunk
+        assert lookup.get(chunk_key(chunk)) is chunk
+    assert lookup.get("doc:Block-999") is None
+
+
+def test_unknown_vector_resolves_to_nearest_embedded_chunk():
+    chunks, vectors = make_chunks()
+    del chunks[4]["embedding"]
+    lookup = ChunkLookup(chunks)
+    assert lookup.resolve_vector(vectors[7] + 0.01) is chunks[7]
+    assert lookup.resolve_vector(vectors[4]) is not chunks[4]
+    assert lookup.resolve_vector(np.zeros(3)) is None
+
+
+def test_mapped_matrix_and_deleted_chunks(tmp_path):
+    chunks, vectors = make_chunks()
+    path = str(tmp_path / "matrix.npy")
+    np.save(path, vectors)
+    chunks[2]["deleted"] = True
+    lookup = ChunkLookup(chunks, np.load(path, mmap_mode="r"), np.ones(len(chunks), dtype=bool))
+    assert lookup.resolve_vector(vectors[9]) is chunks[9]
+    assert lookup.get(chunk_key(chunks[2])) is None
@@ -0,0 +1,103 @@
+import random
+from ai_embedding.extract import TextBlockSplitter, iter_text_blocks
+
+
+def reference_blocks(pages, document, block_size, overlap):
+    """Implementación original: todo el texto en memoria y búsqueda lineal de páginas."""
+    full_text = ""
+    page_ranges = {}
+    for page_number, page_text in pages:
+        if page_text:
+            start_pos = len(full_text)
+            full_text += page_text + "\n\n"
+            page_ranges[page_number] = (start_pos, len(full_text))
+
+    blocks = []
+    text_length = len(full_text)
+    for i, start_pos in enumerate(range(0, text_length, block_size - overlap)):
+        end_pos = min(start_pos + block_size, text_length)
+        block_text = full_text[start_pos:end_pos]
+        if len(block_text.strip()) < 100:
+            continue
+        block_pages = [
+            page_num
+            for page_num, (page_start, page_end) in page_ranges.items()
+            if not (end_pos < page_start or start_pos > page_end)
+        ]
+        blocks.append(
+            {
+                "chunk_id": f"Block-{i + 1}",
+                "text": block_text,
+                "document": document,
+                "pages": block_pages,
+                "word_count": len(block_text.split()),
+            }
+        )
+    return blocks
+
+
+def random_pages(rng, count):
+    words = ["gen", "proteína", "BRCA1", "secuencia", "alineamiento", "x" * 40]
+    pages = []
+    for page_number in range(1, count + 1):
+        if rng.random() < 0.1:
+            pages.append((page_number, ""))  # página sin texto
+            continue
+        length = rng.choice([5, 50, 400, 1500])
+        pages.append((page_number, " ".join(rng.choice(words) for _ in range(length))))
+    return pages
+
+
+def test_matches_reference_chunker():
+    rng = random.Random(0)
+    for _ in range(30):
+        pages = random_pages(rng, rng.randint(0, 40))
+        block_size = rng.choice([300, 1000, 12500])
+        overlap = rng.choice([0, 50, block_size // 4])
+        expected = reference_blocks(pages, "doc.pdf", block_size, overlap)
+        blocks = list(iter_text_blocks(iter(pages), "doc.pdf", block_size, overlap))
+        keys = ["chunk_id", "text", "document", "pages", "word_count"]
+        assert [{key: block[key] for key in keys} for block in blocks] == expected
+
+
+def test_page_offsets_point_to_page_starts():
+    pages = [(1, "a" * 700), (2, "b" * 700), (3, "c" * 700)]
+    for block in iter_text_blocks(pages, "doc.pdf", block_size=1000, overlap=100):
+        for page, offset in zip(block["pages"], block["page_offsets"]):
+            if offset > 0:
+                assert block["text"][offset] == "abc"[page - 1]
+
+
+def test_splitter_keeps_only_pending_text():
+    rng = random.Random(1)
+    pages = random_pages(rng, 200)
+    splitter = TextBlockSplitter("doc.pdf", block_size=2000, overlap=200)
+    longest_page = max(len(text) for _, text in pages) + 2
+    blocks = []
+    for page_number, page_text in pages:
+        blocks.extend(splitter.add_page(page_number, page_text))
+        assert len(splitter.buffer) <= 2000 + longest_page
+    blocks.extend(splitter.finish())
+    assert blocks == list(iter_text_blocks(pages, "doc.pdf", 2000, 200))
+
+
+def test_get_new_chunks_streams_pages_into_blocks(make_pdf, tmp_path):
+    from ai_embedding.extract import get_new_chunks
+    from ai_embedding.pdf_workers import extract_pages
+
+    lines = "\n".join(f"linea {i} con texto de relleno para el bloque" for i in range(40))
+    paths = [make_pdf(f"doc{i}.pdf", [lines] * (3 + i)) for i in range(2)]
+    broken = str(tmp_path / "broken.pdf")
+    with open(broken, "wb") as f:
+        f.write(b"no es un pdf")
+    documents = {path: {"hash": f"h{i}"} for i, path in enumerate(paths + [broken])}
+
+    chunks, extracted = get_new_chunks(paths + [broken], documents)
+
+    assert sorted(extracted) == sorted(paths)
+    for i, path in enumerate(paths):
+        expected = list(iter_text_blocks(extract_pages(path), path))
+        got = [chunk for chunk in chunks if chunk["document"] == path]
+        assert [chunk["text"] for chunk in got] == [block["text"] for block in expected]
+        assert all(chunk["content_hash"] == f"h{i}" for chunk in got)
+        assert documents[path]["pages"] == 3 + i
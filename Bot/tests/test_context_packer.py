@@ -0,0 +1,108 @@
+import numpy as np
+from ai_embedding.context_packer import (
+    collect_passages,
+    estimate_tokens,
+    pack_context,
+    score_passages,
+)
+from ai_embedding.extract import iter_text_blocks
+
+
+def sentences(topic, count):
+    return " ".join(f"Frase {i} sobre {topic} con detalles adicionales del experimento." for i in range(count))
+
+
+def document_blocks(block_size=2000, overlap=500, count=30):
+    pages = [
+        (1, sentences("alineamiento", count)),
+        (2, sentences("proteína BRCA1", count)),
+        (3, sentences("secuenciación", count)),
+    ]
+    return list(iter_text_blocks(pages, "docs/a.pdf", block_size, overlap))
+
+
+def test_chunks_within_budget_are_returned_unchanged():
+    chunks = [{"chunk_id": "Block-1", "text": "texto corto", "document": "a.pdf", "pages": [1]}]
+    assert pack_context("pregunta", chunks, token_budget=100) == chunks
+    assert pack_context("pregunta", chunks, token_budget=0) == chunks
+
+
+def test_packed_context_respects_token_budget():
+    chunks = document_blocks()
+    total = sum(estimate_tokens(chunk["text"]) for chunk in chunks)
+    sections = pack_context("¿Qué se sabe de BRCA1?", chunks, token_budget=400, max_chars=300)
+    used = sum(estimate_tokens(section["text"]) for section in sections)
+    assert total > 400
+    assert 0 < used <= 400 + len(sections)
+
+
+def test_overlap_between_consecutive_blocks_is_skipped():
+    chunks = document_blocks()
+    passages = collect_passages(chunks, max_chars=300)
+    assert len(chunks) > 2
+    for chunk in chunks:
+        if len(chunk["text"]) <= 500:
+            continue
+        starts = [passage["start"] for passage in passages if passage["chunk_id"] == chunk["chunk_id"]]
+        assert min(starts) == (0 if chunk is chunks[0] else 500)
+
+
+def test_redundant_passages_are_dropped():
+    repeated = sentences("membranas", 20)
+    chunks = [
+        {"chunk_id": "Block-1", "text": repeated, "document": "a.pdf", "pages": [1]},
+        {"chunk_id": "Block-1", "text": repeated, "document": "b.pdf", "pages": [4]},
+    ]
+    sections = pack_context("membranas", chunks, token_budget=estimate_tokens(repeated) * 2 - 1)
+    assert [section["document"] for section in sections] == ["a.pdf"]
+
+
+def test_sections_keep_page_attribution():
+    chunks = document_blocks(block_size=20000)
+    sections = pack_context("proteína BRCA1", chunks, token_budget=200, max_chars=400)
+    assert sections
+    for section in sections:
+        assert section["document"] == "docs/a.pdf"
+        if "BRCA1" in section["text"] and "alineamiento" not in section["text"]:
+            assert section["pages"] == [2]
+
+
+def test_default_scoring_makes_no_embedding_calls(monkeypatch):
+    from ai_embedding import ai
+
+    def embed_texts(texts):
+        raise AssertionError("no se esperaban llamadas a la API de embeddings")
+
+    monkeypatch.setattr(ai, "embed_texts", embed_texts)
+    chunks = document_blocks(block_size=5000, count=100)
+    for chunk in chunks:
+        chunk["embedding"] = np.ones(4, dtype=np.float32)
+    sections = ai.prepare_context("BRCA1", chunks, chunks, question_embedding=[1.0, 0, 0, 0])
+    assert sections
+    assert sum(estimate_tokens(section["text"]) for section in sections) < sum(
+        estimate_tokens(chunk["text"]) for chunk in chunks
+    )
+
+
+def test_stored_chunk_vectors_break_lexical_ties():
+    passages = [
+        {"text": "sin términos comunes", "rank": 0},
+        {"text": "tampoco aquí", "rank": 1},
+    ]
+    scores, method = score_passages("BRCA1", passages, [1.0, 0.0], chunk_scores=np.array([0.1, 0.9]))
+    assert method == "léxica + chunk"
+    assert scores[1] > scores[0]
+
+
+def test_passage_embeddings_are_opt_in():
+    calls = []
+
+    def embed_texts(texts):
+        calls.append(len(texts))
+        return [[1.0, 0.0] if "BRCA1" in text else [0.0, 1.0] for text in texts]
+
+    passages = [{"text": "otra cosa", "rank": 0}, {"text": "BRCA1", "rank": 1}]
+    scores, method = score_passages("gen", passages, [1.0, 0.0], embed_texts)
+    assert method == "embeddings"
+    assert calls == [2]
+    assert scores[1] > scores[0]
@@ -0,0 +1,60 @@
+import os
+from ai_embedding.document_catalog import DocumentCatalog
+
+
+def open_catalog(tmp_path):
+    return DocumentCatalog(str(tmp_path / "docs"), str(tmp_path / "manifest.json"), poll_interval=0)
+
+
+def test_documents_are_indexed_by_name_category_and_hash(tmp_path, make_pdf):
+    folder = str(tmp_path / "docs")
+    make_pdf("Guia_BLAST.pdf", ["una", "dos"], folder=os.path.join(folder, "Bioinformatica"))
+    make_pdf("Python.pdf", ["uno"], folder=os.path.join(folder, "Programacion"))
+    catalog = open_catalog(tmp_path)
+
+    document = catalog.find_by_name("Guia BLAST")
+    assert document["rel_path"] == os.path.join("Bioinformatica", "Guia_BLAST.pdf")
+    assert [d["name"] for d in catalog.list_category("Programacion")] == ["Python.pdf"]
+    assert catalog.find_by_hash(document["hash"]) is document
+    assert catalog.page_count(document["rel_path"]) == 2
+
+
+def test_refresh_only_picks_up_changes(tmp_path, make_pdf, monkeypatch):
+    folder = str(tmp_path / "docs")
+    first = make_pdf("a.pdf", ["a"], folder=os.path.join(folder, "Libros"))
+    catalog = open_catalog(tmp_path)
+    assert not catalog.refresh()
+
+    scanned = []
+    real_scandir = os.scandir
+
+    def scandir(path):
+        scanned.append(path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", scandir)
+    make_pdf("b.pdf", ["b"], folder=os.path.join(folder, "Libros"))
+    assert catalog.refresh()
+    assert scanned == [os.path.join(folder, "Libros")]
+    assert catalog.find_by_name("b") is not None
+
+    os.remove(first)
+    assert catalog.refresh()
+    assert catalog.find_by_name("a") is None
+    assert [d["name"] for d in catalog.list_category("Libros")] == ["b.pdf"]
+
+
+def test_verify_rehashes_modified_files_and_drops_missing_ones(tmp_path, make_pdf):
+    folder = str(tmp_path / "docs")
+    path = make_pdf("a.pdf", ["original"], folder=folder)
+    catalog = open_catalog(tmp_path)
+    old_hash = catalog.get("a.pdf")["hash"]
+
+    make_pdf("a.pdf", ["contenido nuevo", "otra página"], folder=folder)
+    os.utime(path, (1, 1))
+    assert catalog.verify("a.pdf")["hash"] != old_hash
+    assert catalog.find_by_hash(old_hash) is None
+
+    os.remove(path)
+    assert catalog.verify("a.pdf") is None
+    assert catalog.get("a.pdf") is None
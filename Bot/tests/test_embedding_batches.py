@@ -0,0 +1,48 @@
+from ai_embedding import ai
+from ai_embedding.fireworks_stub import stub_embedding
+
+
+def chunks_with_lengths(lengths):
+    return [{"chunk_id": f"Block-{i + 1}", "text": "x" * n} for i, n in enumerate(lengths)]
+
+
+def test_batches_respect_count_and_character_limits():
+    chunks = chunks_with_lengths([10, 10, 10, 10, 10])
+    assert [len(batch) for batch in ai.make_batches(chunks, batch_size=2, max_batch_chars=100)] == [2, 2, 1]
+
+    chunks = chunks_with_lengths([40, 40, 40, 150, 10])
+    batches = list(ai.make_batches(chunks, batch_size=10, max_batch_chars=100))
+    assert [[len(chunk["text"]) for chunk in batch] for batch in batches] == [[40, 40], [40], [150], [10]]
+    assert [chunk for batch in batches for chunk in batch] == chunks
+
+
+def test_failed_batch_is_split_until_the_bad_text_is_isolated():
+    calls = []
+
+    def request_fn(texts):
+        calls.append(len(texts))
+        if "malo" in texts:
+            raise ValueError("texto rechazado")
+        return [[float(len(text))] for text in texts]
+
+    texts = ["a", "bb", "malo", "cccc", "ddddd"]
+    embeddings = ai.embed_batch(texts, request_fn)
+    assert embeddings == [[1.0], [2.0], None, [4.0], [5.0]]
+    assert calls[0] == 5
+
+
+def test_generate_embeddings_sends_one_request_per_batch(library, stub):
+    state, _ = stub
+    chunks = [{"chunk_id": f"Block-{i}", "text": f"texto número {i}"} for i in range(10)]
+    failed = ai.generate_embeddings(chunks, batch_size=4, max_in_flight=2, requests_per_second=0)
+
+    assert failed == []
+    assert state.requests == 3
+    for chunk in chunks:
+        assert chunk["embedding"] == stub_embedding(chunk["text"], len(chunk["embedding"]))
+
+    # Segunda pasada: todo está en la caché persistente y no hay peticiones
+    for chunk in chunks:
+        del chunk["embedding"]
+    assert ai.generate_embeddings(chunks, batch_size=4) == []
+    assert state.requests == 3
@@ -0,0 +1,62 @@
+from ai_embedding.embedding_cache import EmbeddingCache
+
+DIMENSIONS = 4
+ENTRY_BYTES = DIMENSIONS * 4
+
+
+def stored_bytes(cache):
+    return cache.conn.execute(
+        "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+    ).fetchone()[0]
+
+
+def open_cache(tmp_path, max_entries=100, model="modelo"):
+    return EmbeddingCache(
+        str(tmp_path / "cache.db"),
+        model,
+        DIMENSIONS,
+        max_bytes=max_entries * ENTRY_BYTES,
+        flush_every=1000,
+    )
+
+
+def test_running_total_tracks_inserts_and_replacements(tmp_path):
+    cache = open_cache(tmp_path)
+    for i in range(5):
+        cache.put(f"texto {i}", [float(i)] * DIMENSIONS)
+    cache.put("texto 0", [9.0] * DIMENSIONS)
+    cache.flush()
+    assert cache.total_bytes == stored_bytes(cache) == 5 * ENTRY_BYTES
+
+    cache.put("texto 1", [7.0] * DIMENSIONS)
+    cache.flush()
+    assert cache.total_bytes == stored_bytes(cache) == 5 * ENTRY_BYTES
+    assert cache.get("texto 0") == [9.0] * DIMENSIONS
+    cache.close()
+
+
+def test_total_is_loaded_once_when_reopening(tmp_path):
+    cache = open_cache(tmp_path)
+    for i in range(3):
+        cache.put(f"texto {i}", [1.0] * DIMENSIONS)
+    cache.close()
+
+    other_model = open_cache(tmp_path, model="otro")
+    assert other_model.total_bytes == 3 * ENTRY_BYTES
+    other_model.close()
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = open_cache(tmp_path, max_entries=10)
+    for i in range(10):
+        cache.put(f"texto {i}", [float(i)] * DIMENSIONS)
+        cache.flush()
+    assert cache.get("texto 0") is not None  # uso reciente: no se desaloja
+
+    cache.put("texto 10", [10.0] * DIMENSIONS)
+    cache.flush()
+    assert cache.total_bytes == stored_bytes(cache) <= 9 * ENTRY_BYTES
+    assert cache.get("texto 0") is not None
+    assert cache.get("texto 1") is None
+    assert cache.get("texto 10") is not None
+    cache.close()
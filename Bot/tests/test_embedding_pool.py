@@ -0,0 +1,76 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+import requests
+from ai_embedding.embedding_pool import EmbeddingWorkerPool, TokenBucket, is_retryable_error
+
+
+def http_error(status):
+    return requests.exceptions.HTTPError(
+        f"Error {status}", response=SimpleNamespace(status_code=status, headers={})
+    )
+
+
+def test_run_yields_every_batch_with_bounded_concurrency():
+    pool = EmbeddingWorkerPool(max_in_flight=3, requests_per_second=0)
+    lock = threading.Lock()
+    active = [0, 0]  # en curso, máximo observado
+
+    def task(batch):
+        with lock:
+            active[0] += 1
+            active[1] = max(active[1], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return [item * 2 for item in batch]
+
+    batches = [[i, i + 1] for i in range(0, 40, 2)]
+    results = {tuple(batch): result for batch, result in pool.run(batches, task, total_items=40)}
+    assert results == {tuple(batch): [item * 2 for item in batch] for batch in batches}
+    assert 1 < active[1] <= 3
+
+
+def test_transient_errors_are_retried_and_permanent_ones_raised():
+    pool = EmbeddingWorkerPool(requests_per_second=0, base_delay=0.001, max_retries=3)
+    errors = [http_error(429), http_error(503)]
+
+    def flaky():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert pool.call_with_backoff(flaky) == "ok"
+
+    calls = []
+
+    def rejected():
+        calls.append(1)
+        raise http_error(400)
+
+    assert not is_retryable_error(http_error(400))
+    with pytest.raises(requests.exceptions.HTTPError):
+        pool.call_with_backoff(rejected)
+    assert len(calls) == 1
+
+
+def test_retries_are_bounded():
+    pool = EmbeddingWorkerPool(requests_per_second=0, base_delay=0.001, max_retries=2)
+    calls = []
+
+    def always_down():
+        calls.append(1)
+        raise requests.exceptions.ConnectionError("sin red")
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        pool.call_with_backoff(always_down)
+    assert len(calls) == 3
+
+
+def test_token_bucket_limits_the_request_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 5 / 50 * 0.9
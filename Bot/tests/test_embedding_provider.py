@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from ai_embedding.embedding_provider import HashingSVDEmbeddingProvider, create_embedding_provider
+from ai_embedding.vector_store import ChunkStore
+
+CORPUS = [
+    "El gen BRCA1 participa en la reparación del ADN por recombinación homóloga.",
+    "Mutaciones en BRCA1 y BRCA2 aumentan el riesgo de cáncer de mama.",
+    "El alineamiento de lecturas con bwa-mem produce archivos SAM.",
+    "Samtools ordena e indexa los alineamientos en formato BAM.",
+    "Las proteínas de membrana atraviesan la bicapa lipídica.",
+    "La estructura terciaria de una proteína depende de su secuencia.",
+]
+
+
+def fitted_provider(tmp_path, dimensions=4):
+    provider = HashingSVDEmbeddingProvider(dimensions, n_features=2**12, model_path=str(tmp_path / "local.npz"))
+    assert provider.fit(CORPUS)
+    return provider
+
+
+def test_local_provider_needs_fitting_before_embedding(tmp_path):
+    provider = HashingSVDEmbeddingProvider(4, n_features=2**12, model_path=str(tmp_path / "local.npz"))
+    assert not provider.ready
+    with pytest.raises(RuntimeError):
+        provider.embed(["texto"])
+    assert not provider.fit(["solo uno"])
+
+
+def test_local_embeddings_are_normalized_and_topical(tmp_path):
+    provider = fitted_provider(tmp_path)
+    vectors = np.array(provider.embed(CORPUS + ["riesgo de cáncer por BRCA1"]))
+    assert vectors.shape == (7, provider.dimensions)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+    similarities = vectors[:-1] @ vectors[-1]
+    assert int(np.argmax(similarities)) in (0, 1)
+
+
+def test_fitted_model_is_reloaded_with_the_same_identity(tmp_path):
+    provider = fitted_provider(tmp_path)
+    assert provider.identity.startswith("local:hashing-svd-")
+    assert not provider.fit(CORPUS)
+
+    reloaded = HashingSVDEmbeddingProvider(4, n_features=2**12, model_path=provider.model_path)
+    assert reloaded.identity == provider.identity
+    assert np.allclose(reloaded.embed(CORPUS[:2]), provider.embed(CORPUS[:2]))
+
+    other_features = HashingSVDEmbeddingProvider(4, n_features=2**10, model_path=provider.model_path)
+    assert not other_features.ready
+
+
+def test_unknown_provider_is_rejected():
+    with pytest.raises(ValueError):
+        create_embedding_provider("otro", lambda: None, "modelo", 8)
+    assert create_embedding_provider("fireworks", lambda: None, "modelo", 8).identity == "fireworks:modelo:8"
+
+
+def make_chunks(count, dimensions=4):
+    return [
+        {"chunk_id": f"Block-{i + 1}", "text": f"texto {i}", "embedding": [float(i)] * dimensions}
+        for i in range(count)
+    ]
+
+
+def store_paths(tmp_path):
+    return str(tmp_path / "embeddings.npy"), str(tmp_path / "chunks.pkl")
+
+
+def test_store_discards_embeddings_of_a_previous_model(tmp_path):
+    matrix_path, meta_path = store_paths(tmp_path)
+    store = ChunkStore(make_chunks(2), matrix_path=matrix_path, meta_path=meta_path, embedding_model="a")
+    assert store.reset_embeddings("b") == 2
+    assert not store.searchable().any()
+    for chunk in store.chunks:
+        chunk["embedding"] = [1.0] * 8
+    store.save()
+    loaded = ChunkStore.load(matrix_path, meta_path)
+    assert loaded.embedding_model == "b" and loaded.matrix.shape == (2, 8)
@@ -0,0 +1,83 @@
+import numpy as np
+from ai_embedding.fine_index import FineIndex, parent_hash
+
+
+def make_chunks(texts, content_hash):
+    return [
+        {
+            "row_id": row_id,
+            "chunk_id": f"Block-{row_id + 1}",
+            "content_hash": content_hash,
+            "document": "docs/a.pdf",
+            "pages": [row_id + 1],
+            "text": text,
+        }
+        for row_id, text in enumerate(texts)
+    ]
+
+
+class FakeEmbed:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, passages):
+        self.calls.append([passage["parent_id"] for passage in passages])
+        for passage in passages:
+            passage["embedding"] = [1.0, float(len(passage["text"])), 0.0]
+        return []
+
+
+TEXTS = ["Primer bloque sobre genes. " * 10, "Segundo bloque sobre proteínas. " * 10]
+
+
+def test_parent_keys_are_stored_as_uint64_hashes(tmp_path):
+    chunks = make_chunks(TEXTS, "hash-a")
+    index = FineIndex()
+    assert index.update(chunks, FakeEmbed(), passage_chars=100)
+    assert index.parent_hashes.dtype == np.uint64
+    assert index.parent_hashes.tolist() == [parent_hash(chunks[p]) for p in index.parent_ids.tolist()]
+
+    vectors_path, meta_path = str(tmp_path / "fine.npy"), str(tmp_path / "fine.npz")
+    index.save(vectors_path, meta_path)
+    loaded = FineIndex.load(vectors_path, meta_path)
+    with np.load(meta_path) as data:
+        assert data["parent_hashes"].itemsize == 8
+        assert "parent_keys" not in data.files
+    loaded.attach(chunks)
+    assert loaded.live.all()
+    assert not loaded.update(chunks, FakeEmbed(), passage_chars=100)
+
+
+def test_regenerated_store_reusing_row_ids_is_reembedded():
+    index = FineIndex()
+    index.update(make_chunks(TEXTS, "hash-a"), FakeEmbed(), passage_chars=100)
+
+    # Almacén regenerado con otro documento: mismos row_id, otros bloques
+    regenerated = make_chunks(["Otro texto distinto. " * 12, TEXTS[1]], "hash-b")
+    embed = FakeEmbed()
+    index.attach(regenerated)
+    assert not index.live.any()
+    assert index.update(regenerated, embed, passage_chars=100)
+    assert sorted(set(embed.calls[0])) == [0, 1]
+    assert index.live.all()
+    assert set(index.parent_hashes.tolist()) == {parent_hash(chunk) for chunk in regenerated}
+
+
+def test_meta_without_hashes_is_rebuilt(tmp_path):
+    chunks = make_chunks(TEXTS, "hash-a")
+    index = FineIndex()
+    index.update(chunks, FakeEmbed(), passage_chars=100)
+    vectors_path, meta_path = str(tmp_path / "fine.npy"), str(tmp_path / "fine.npz")
+    index.save(vectors_path, meta_path)
+
+    # Índice anterior: claves como cadenas en lugar de hashes
+    with np.load(meta_path) as data:
+        meta = {name: data[name] for name in data.files if name != "parent_hashes"}
+    meta["parent_keys"] = np.array(["hash-a:Block-1"] * index.size)
+    np.savez(meta_path, **meta)
+
+    loaded = FineIndex.load(vectors_path, meta_path)
+    embed = FakeEmbed()
+    assert loaded.update(chunks, embed, passage_chars=100)
+    assert sorted(set(embed.calls[0])) == [0, 1]
+    assert loaded.size == index.size
@@ -0,0 +1,157 @@
+import asyncio
+import time
+import pytest
+import requests
+from ai_embedding import ai, ai_async
+from ai_embedding.fireworks_client import CircuitBreaker, CircuitOpenError, FireworksClient
+
+EMBEDDING = {"input": "hola", "model": "m", "dimensions": 8}
+
+
+@pytest.fixture
+def client(stub, monkeypatch):
+    """Cliente compartido (también por ai_async) con esperas cortas."""
+    _, base_url = stub
+    client = FireworksClient(
+        base_url, ai.headers, max_retries=3, base_delay=0.001, breaker=CircuitBreaker(3, 0.2)
+    )
+    monkeypatch.setattr(ai, "_fireworks_client", client)
+    yield client
+    client.close()
+
+
+def run_async(coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await ai_async.close_session()
+
+    return asyncio.run(main())
+
+
+def test_transient_errors_are_retried(stub, client):
+    state, _ = stub
+    state.fail_next(503, 429)
+    assert len(client.embeddings(EMBEDDING)["data"][0]["embedding"]) == 8
+    stats = client.metrics()["embeddings"]
+    assert (stats["requests"], stats["errors"], stats["retries"]) == (3, 2, 2)
+    assert client.metrics()["circuit"] == "closed"
+
+
+def test_client_errors_are_not_retried(stub, client):
+    state, _ = stub
+    state.fail_next(400)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.embeddings(EMBEDDING)
+    assert client.metrics()["embeddings"]["retries"] == 0
+
+
+def test_rate_limits_do_not_open_the_circuit(stub, client):
+    state, _ = stub
+    state.fail_next(429, 429, 429, 429)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.embeddings(EMBEDDING)
+    assert client.breaker.state == "closed"
+
+
+def test_circuit_opens_and_recovers_after_probe(stub, client):
+    state, _ = stub
+    state.fail_next(503, 503, 503)
+    with pytest.raises(CircuitOpenError):
+        client.embeddings(EMBEDDING)
+    assert client.breaker.state == "open"
+    sent = state.requests
+
+    with pytest.raises(CircuitOpenError):
+        client.chat({"messages": []})
+    assert state.requests == sent  # rechazada sin enviarse
+    assert client.metrics()["chat"]["rejected"] == 1
+
+    time.sleep(0.25)
+    assert client.breaker.state == "half-open"
+    client.embeddings(EMBEDDING)
+    assert client.breaker.state == "closed"
+
+
+def test_failed_probe_reopens_the_circuit(stub, client):
+    state, _ = stub
+    state.fail_next(503, 503, 503)
+    with pytest.raises(CircuitOpenError):
+        client.embeddings(EMBEDDING)
+    time.sleep(0.25)
+    state.fail_next(503)
+    with pytest.raises(CircuitOpenError):
+        client.embeddings(EMBEDDING)
+    assert client.breaker.state == "open"
+
+
+def test_only_one_probe_while_half_open():
+    breaker = CircuitBreaker(1, 0.0)
+    breaker.record_failure()
+    assert breaker.before_request() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.release_probe()
+    assert breaker.before_request() is True
+
+
+def test_async_requests_share_retries_and_metrics(stub, client):
+    state, _ = stub
+    state.fail_next(502, 503)
+    data = run_async(ai_async._post_json("embeddings", EMBEDDING, 5))
+    assert len(data["data"][0]["embedding"]) == 8
+    stats = client.metrics()["embeddings"]
+    assert (stats["requests"], stats["errors"], stats["retries"]) == (3, 2, 2)
+
+
+def test_async_streaming_retries_until_headers(stub, client):
+    state, _ = stub
+    state.fail_next(503)
+    received = []
+
+    async def on_text(text):
+        received.append(text)
+
+    text = run_async(ai_async._complete_chat({"messages": [{"content": "q"}]}, on_text))
+    assert text.startswith("Respuesta simulada") and received[-1] == text
+    assert client.metrics()["chat"]["retries"] == 1
+
+
+def test_async_circuit_open_fails_fast(stub, client):
+    state, _ = stub
+    state.fail_next(503, 503, 503)
+    with pytest.raises(CircuitOpenError):
+        run_async(ai_async._post_json("chat", {"messages": []}, 5))
+    sent = state.requests
+    with pytest.raises(CircuitOpenError):
+        run_async(ai_async._post_json("chat", {"messages": []}, 5))
+    assert state.requests == sent
+
+
+def test_cancelled_probe_is_released(stub, client):
+    state, _ = stub
+    state.fail_next(503, 503, 503)
+    with pytest.raises(CircuitOpenError):
+        client.embeddings(EMBEDDING)
+    time.sleep(0.25)
+
+    # La petición de prueba se cancela antes de recibir respuesta
+    state.latency = 0.5
+    with pytest.raises(asyncio.TimeoutError):
+        run_async(asyncio.wait_for(ai_async._post_json("embeddings", EMBEDDING, 5), 0.05))
+    assert client.breaker.probing is False
+
+    state.latency = 0.0
+    data = run_async(ai_async._post_json("embeddings", EMBEDDING, 5))
+    assert data["data"]
+    assert client.breaker.state == "closed"
+
+
+def test_generate_answer_async_reports_api_errors(stub, client, monkeypatch):
+    state, _ = stub
+    chunks = [{"text": "contexto", "document": "d.pdf", "pages": [1]}]
+    monkeypatch.setattr(ai_async, "prepare_context", lambda *args: chunks)
+    state.fail_next(503, 503, 503)
+    answer, references = run_async(ai_async.generate_answer_async("q", [], []))
+    assert (answer, references) == (ai.API_ERROR_ANSWER, [])
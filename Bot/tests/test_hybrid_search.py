@@ -0,0 +1,66 @@
+from ai_embedding.bm25_index import BM25Index, tokenize
+from ai_embedding.extract import reciprocal_rank_fusion
+
+
+def block(row_id, text, content_hash="doc"):
+    return {"row_id": row_id, "chunk_id": f"Block-{row_id + 1}", "content_hash": content_hash, "text": text}
+
+
+BLOCKS = [
+    block(0, "El gen BRCA1 y la reparación del ADN."),
+    block(1, "Alineamiento con bwa-mem sobre chr17:7668402."),
+    block(2, "Proteínas de membrana y su estructura."),
+]
+
+
+def test_tokenizer_keeps_technical_terms_and_their_parts():
+    terms = tokenize("Proteína BRCA1-Δ11 con bwa-mem")
+    assert "proteina" in terms
+    assert {"brca1-δ11", "brca1", "δ11", "bwa-mem", "bwa", "mem"} <= set(terms)
+
+
+def test_bm25_ranks_exact_term_matches_first():
+    index = BM25Index()
+    index.update(BLOCKS)
+    results = index.search("bwa-mem chr17:7668402")
+    assert results[0][0] is BLOCKS[1]
+    assert index.search("proteinas")[0][0] is BLOCKS[2]
+    assert index.search("término inexistente") == []
+
+
+def test_bm25_update_reindexes_changed_and_removed_blocks(tmp_path):
+    index = BM25Index()
+    index.update(BLOCKS)
+    assert not index.update(BLOCKS)
+
+    # Almacén regenerado: el row_id 0 pasa a ser otro bloque y el 2 desaparece
+    changed = [block(0, "Expresión génica de TP53.", "otro"), BLOCKS[1]]
+    assert index.update(changed)
+    assert index.search("BRCA1") == []
+    assert index.search("TP53")[0][0] is changed[0]
+    assert index.search("membrana") == []
+
+    path = str(tmp_path / "bm25.pkl")
+    index.save(path)
+    loaded = BM25Index.load(path)
+    loaded.attach(changed)
+    assert [chunk["row_id"] for chunk, _ in loaded.search("TP53 bwa")] == [
+        chunk["row_id"] for chunk, _ in index.search("TP53 bwa")
+    ]
+
+
+def test_rank_fusion_rewards_agreement_between_rankings():
+    a, b, c, d = (block(i, "") for i in range(4))
+    fused = reciprocal_rank_fusion([[a, b, c], [c, d, b]], top_k=3)
+    assert [chunk["row_id"] for chunk in fused] == [2, 1, 0]
+
+
+def test_rank_fusion_groups_passages_by_parent_block():
+    parent = block(5, "texto")
+    sections = [
+        {"parent_id": 5, "text": "primera sección"},
+        {"parent_id": 5, "text": "segunda sección"},
+        {"parent_id": 7, "text": "otro bloque"},
+    ]
+    fused = reciprocal_rank_fusion([sections, [parent]], top_k=1)
+    assert fused == sections[:2]
@@ -0,0 +1,52 @@
+import numpy as np
+from ai_embedding import ai, extract
+from ai_embedding.checkpoint import EmbeddingCheckpoint
+from ai_embedding.vector_store import ChunkStore
+import constants
+
+TOPICS = ["alineamiento de secuencias", "estructura de proteínas", "expresión génica"]
+
+
+def pages(topic, count=4):
+    return [
+        "\n".join(f"{topic} pagina {page} linea {line} BRCA1 TP53 lectura" for line in range(45))
+        for page in range(count)
+    ]
+
+
+def add_documents(folder, make_pdf, count=3):
+    return [
+        make_pdf(f"doc{i}.pdf", pages(TOPICS[i % len(TOPICS)]), folder=folder) for i in range(count)
+    ]
+
+
+def stored_dimensions():
+    store = ChunkStore.load()
+    return store.embedding_model, {
+        len(chunk["embedding"]) for chunk in store.live_chunks() if "embedding" in chunk
+    }
+
+
+def use_local_provider(monkeypatch):
+    monkeypatch.setattr(ai, "EMBEDDING_PROVIDER", "local")
+    monkeypatch.setattr(ai, "_embedding_provider", None)
+    monkeypatch.setattr(ai, "_embedding_cache", None)
+
+
+def test_model_switch_ignores_checkpoint_of_previous_model(library, make_pdf, monkeypatch):
+    add_documents(library, make_pdf)
+    _, chunks = extract.process_documents()
+    remote = ai.get_embedding_provider().identity
+    assert stored_dimensions() == (remote, {768})
+
+    # Ingesta con el modelo remoto interrumpida: el checkpoint queda en disco
+    checkpoint = EmbeddingCheckpoint(constants.EMBEDDING_CHECKPOINT_FILE, remote)
+    for chunk in chunks:
+        checkpoint.append(chunk, np.ones(768).tolist())
+    checkpoint.close()
+
+    use_local_provider(monkeypatch)
+    extract.process_documents()
+    local = ai.get_embedding_provider()
+    assert local.identity != remote
+    assert stored_dimensions() == (local.identity, {local.dimensions})
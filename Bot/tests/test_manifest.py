@@ -0,0 +1,113 @@
+import os
+from ai_embedding.manifest import (
+    bootstrap_manifest,
+    diff_documents,
+    hash_documents,
+    load_manifest,
+    save_manifest,
+)
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def test_diff_detects_added_changed_renamed_deleted(tmp_path):
+    a = write(str(tmp_path / "a.pdf"), b"A")
+    b = write(str(tmp_path / "b.pdf"), b"B")
+    c = write(str(tmp_path / "c.pdf"), b"C")
+    manifest = {
+        info["hash"]: {"path": path, "size": info["size"], "mtime": info["mtime"]}
+        for path, info in hash_documents([a, b, c], {}).items()
+    }
+    old_hashes = {path: entry for entry, path in ((h, e["path"]) for h, e in manifest.items())}
+
+    write(a, b"A2")  # modificado
+    os.rename(b, str(tmp_path / "renamed.pdf"))  # renombrado
+    os.remove(c)  # eliminado
+    d = write(str(tmp_path / "d.pdf"), b"D")  # nuevo
+    renamed = str(tmp_path / "renamed.pdf")
+
+    diff = diff_documents(hash_documents([a, renamed, d], manifest), manifest)
+
+    assert diff["added"] == [d]
+    assert diff["changed"] == [a]
+    assert diff["renamed"] == {old_hashes[b]: renamed}
+    assert diff["deleted"] == [old_hashes[c]]
+    assert set(diff["stale"]) == {old_hashes[a], old_hashes[c]}
+    assert diff["unchanged"] == []
+
+
+def test_duplicate_content_is_indexed_once(tmp_path):
+    a = write(str(tmp_path / "a.pdf"), b"same")
+    b = write(str(tmp_path / "b.pdf"), b"same")
+    diff = diff_documents(hash_documents([a, b], {}), {})
+    assert len(diff["added"]) == 1
+
+
+def test_hash_reused_when_size_and_mtime_match(tmp_path, monkeypatch):
+    a = write(str(tmp_path / "a.pdf"), b"A")
+    documents = hash_documents([a], {})
+    manifest = {
+        info["hash"]: {"path": path, "size": info["size"], "mtime": info["mtime"]}
+        for path, info in documents.items()
+    }
+    monkeypatch.setattr(
+        "ai_embedding.manifest.file_sha256", lambda path: (_ for _ in ()).throw(AssertionError)
+    )
+    assert hash_documents([a], manifest) == documents
+
+
+def test_corrupt_manifest_loads_empty(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    with open(path, "w") as f:
+        f.write("{no es json")
+    assert load_manifest(path) == {}
+
+
+def test_save_and_load_roundtrip(tmp_path):
+    path = str(tmp_path / "data" / "manifest.json")
+    documents = {"h": {"path": "/x.pdf", "size": 1, "mtime": 2.0}}
+    save_manifest(documents, path)
+    assert load_manifest(path) == documents
+
+
+def test_bootstrap_legacy_chunks_by_basename(tmp_path):
+    a = write(str(tmp_path / "new" / "a.pdf"), b"A")
+    documents = hash_documents([a], {})
+    chunks = [{"document": "/old/place/a.pdf", "text": "x"}]
+
+    manifest = bootstrap_manifest(documents, chunks)
+
+    assert chunks[0]["content_hash"] == documents[a]["hash"]
+    assert manifest[documents[a]["hash"]]["path"] == a
+    assert diff_documents(documents, manifest)["unchanged"] == [a]
+
+
+def test_lost_manifest_is_rebuilt_from_hashed_chunks(tmp_path):
+    """Sin manifiesto, los documentos ya procesados no se vuelven a ingerir."""
+    a = write(str(tmp_path / "a.pdf"), b"A")
+    b = write(str(tmp_path / "b.pdf"), b"B")
+    gone = write(str(tmp_path / "gone.pdf"), b"G")
+    hashes = {path: info["hash"] for path, info in hash_documents([a, b, gone], {}).items()}
+    chunks = [
+        {"document": path, "content_hash": content_hash, "chunk_id": f"Block-{i}"}
+        for i, (path, content_hash) in enumerate(hashes.items())
+    ]
+    os.remove(gone)
+    moved = str(tmp_path / "moved.pdf")
+    os.rename(b, moved)
+
+    documents = hash_documents([a, moved], load_manifest(str(tmp_path / "missing.json")))
+    manifest = bootstrap_manifest(documents, chunks)
+    diff = diff_documents(documents, manifest)
+
+    assert diff["added"] == []
+    assert diff["changed"] == []
+    assert diff["unchanged"] == [a]
+    assert diff["renamed"] == {hashes[b]: moved}
+    assert diff["stale"] == [hashes[gone]]
+    assert diff["deleted"] == [hashes[gone]]
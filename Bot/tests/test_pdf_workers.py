@@ -0,0 +1,54 @@
+from ai_embedding.pdf_workers import extract_documents_parallel, extract_pages
+
+
+def page_texts(document, pages):
+    return [f"{document} pagina {page}\nlinea de texto {page}" for page in range(1, pages + 1)]
+
+
+def collect(events):
+    pages, done, errors = {}, {}, {}
+    for path, event, payload in events:
+        assert path not in done and path not in errors
+        if event == "pages":
+            pages.setdefault(path, []).extend(payload)
+        elif event == "done":
+            done[path] = payload
+        else:
+            errors[path] = payload
+    return pages, done, errors
+
+
+def test_pages_arrive_in_order_per_document(make_pdf):
+    paths = [make_pdf(f"doc{i}.pdf", page_texts(f"doc{i}", 5 + i)) for i in range(3)]
+    for pages_per_task in (0, 2):
+        pages, done, errors = collect(
+            extract_documents_parallel(paths, max_workers=3, timeout=60, pages_per_task=pages_per_task)
+        )
+        assert errors == {}
+        for path in paths:
+            assert pages[path] == extract_pages(path)
+            assert done[path] == len(pages[path])
+
+
+def test_pages_are_streamed_in_batches(make_pdf):
+    path = make_pdf("long.pdf", page_texts("long", 20))
+    batches = [
+        payload
+        for _, event, payload in extract_documents_parallel([path], max_workers=1, timeout=60)
+        if event == "pages"
+    ]
+    assert len(batches) > 1
+    assert all(len(batch) <= 8 for batch in batches)
+
+
+def test_broken_document_does_not_affect_the_rest(make_pdf, tmp_path):
+    good = make_pdf("good.pdf", page_texts("good", 3))
+    broken = str(tmp_path / "broken.pdf")
+    with open(broken, "wb") as f:
+        f.write(b"%PDF-1.4 esto no es un pdf")
+    for pages_per_task in (0, 2):
+        pages, done, errors = collect(
+            extract_documents_parallel([broken, good], max_workers=2, timeout=60, pages_per_task=pages_per_task)
+        )
+        assert set(errors) == {broken}
+        assert done == {good: 3}
@@ -0,0 +1,60 @@
+import time
+from ai_embedding.query_cache import QueryEmbeddingCache, normalize_query
+
+
+def test_equivalent_queries_share_an_entry():
+    assert normalize_query("¿Qué es  BLAST?") == normalize_query("que es blast") == "que es blast"
+    cache = QueryEmbeddingCache()
+    cache.put("¿Qué es BLAST?", [1.0])
+    assert cache.get("QUE ES BLAST") == [1.0]
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryEmbeddingCache(max_entries=2)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    assert cache.get("a") == [1.0]
+    cache.put("c", [3.0])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0] and cache.get("c") == [3.0]
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    cache = QueryEmbeddingCache(ttl=10)
+    cache.put("consulta", [1.0])
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get("consulta") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_failed_computations_are_not_cached():
+    cache = QueryEmbeddingCache()
+    calls = []
+
+    def compute(query):
+        calls.append(query)
+        return None if len(calls) == 1 else [0.5]
+
+    assert cache.get_or_compute("gen", compute) is None
+    assert cache.get_or_compute("gen", compute) == [0.5]
+    assert cache.get_or_compute("gen", compute) == [0.5]
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_persisted_entries_survive_restart_only_for_the_same_model(tmp_path):
+    path = str(tmp_path / "query_cache.pkl")
+    cache = QueryEmbeddingCache(persist_path=path, model="modelo-a", save_every=100)
+    cache.put("consulta", [1.0])
+    cache.save()
+
+    assert QueryEmbeddingCache(persist_path=path, model="modelo-a").get("consulta") == [1.0]
+    assert QueryEmbeddingCache(persist_path=path, model="modelo-b").get("consulta") is None
+
+
+def test_changing_model_clears_the_cache():
+    cache = QueryEmbeddingCache(model="modelo-a")
+    cache.put("consulta", [1.0])
+    cache.use_model("modelo-b")
+    assert cache.get("consulta") is None
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+import pytest
+from request_scheduler import (
+    AsyncFairScheduler,
+    FairQueue,
+    FairScheduler,
+    Job,
+    QueueFullError,
+)
+
+
+def job(user_id, name=None):
+    return Job(user_id, None, (name or user_id,))
+
+
+def drain(queue):
+    """Ejecuta la cola hasta vaciarla, terminando cada consulta en cuanto empieza."""
+    order = []
+    while True:
+        popped, _ = queue.pop()
+        if popped is None:
+            return order
+        order.append(popped.args[0])
+        queue.done(popped)
+
+
+def test_users_are_served_round_robin():
+    queue = FairQueue(max_concurrent=1, max_queue_per_user=10, max_pending=100, max_wait=0)
+    for i in range(3):
+        queue.push(job("a", f"a{i}"))
+    queue.push(job("b", "b0"))
+    queue.push(job("c", "c0"))
+    assert drain(queue) == ["a0", "b0", "c0", "a1", "a2"]
+
+
+def test_one_running_query_per_user():
+    queue = FairQueue(max_concurrent=4, max_queue_per_user=10, max_pending=100, max_wait=0)
+    first = job("a", "a0")
+    assert queue.push(first) == 0
+    queue.push(job("a", "a1"))
+    running, _ = queue.pop()
+    assert running is first
+    assert queue.pop() == (None, [])
+    queue.done(running)
+    assert queue.pop()[0].args == ("a1",)
+
+
+def test_full_queues_reject_new_queries():
+    queue = FairQueue(max_concurrent=1, max_queue_per_user=2, max_pending=3, max_wait=0)
+    queue.push(job("a"))
+    queue.push(job("a"))
+    with pytest.raises(QueueFullError):
+        queue.push(job("a"))
+    queue.push(job("b"))
+    with pytest.raises(QueueFullError):
+        queue.push(job("c"))
+    assert "c" not in queue.queues
+    assert queue.metrics()["rejected"] == 2
+
+
+def test_positions_account_for_other_users():
+    queue = FairQueue(max_concurrent=1, max_queue_per_user=10, max_pending=100, max_wait=0)
+    assert queue.push(job("a", "a0")) == 0
+    queue.pop()
+    assert queue.push(job("a", "a1")) == 2
+    assert queue.push(job("b", "b0")) == 2
+
+
+def test_queries_waiting_too_long_expire():
+    queue = FairQueue(max_concurrent=1, max_queue_per_user=10, max_pending=100, max_wait=5)
+    stale = job("a")
+    stale.submitted_at -= 10
+    queue.push(stale)
+    queue.push(job("b"))
+    popped, expired = queue.pop()
+    assert expired == [stale] and popped.user_id == "b"
+    assert queue.metrics()["expired"] == 1
+
+
+def test_thread_scheduler_runs_jobs_within_the_concurrency_limit():
+    scheduler = FairScheduler(
+        "pruebas", max_concurrent=2, max_queue_per_user=10, max_pending=100, max_wait=0
+    )
+    lock = threading.Lock()
+    state = {"active": 0, "max": 0, "done": 0}
+    finished = threading.Event()
+
+    def work():
+        with lock:
+            state["active"] += 1
+            state["max"] = max(state["max"], state["active"])
+        time.sleep(0.01)
+        with lock:
+            state["active"] -= 1
+            state["done"] += 1
+            if state["done"] == 8:
+                finished.set()
+
+    for i in range(8):
+        scheduler.submit(f"usuario-{i % 4}", work)
+    assert finished.wait(5)
+    assert state["max"] <= 2
+    assert len(scheduler.workers) == 2
+
+
+def test_async_scheduler_runs_each_user_sequentially():
+    async def main():
+        scheduler = AsyncFairScheduler(
+            "pruebas", max_concurrent=3, max_queue_per_user=10, max_pending=100, max_wait=0
+        )
+        log = []
+
+        async def work(user_id, i):
+            log.append(("start", user_id, i))
+            await asyncio.sleep(0.01)
+            log.append(("end", user_id, i))
+
+        for i in range(3):
+            scheduler.submit("a", work, "a", i)
+        scheduler.submit("b", work, "b", 0)
+        while scheduler.tasks:
+            await asyncio.gather(*scheduler.tasks)
+        return log
+
+    log = asyncio.run(main())
+    events_a = [(event, i) for event, user_id, i in log if user_id == "a"]
+    assert events_a == [("start", 0), ("end", 0), ("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+    assert log.index(("start", "b", 0)) < log.index(("end", "a", 0))
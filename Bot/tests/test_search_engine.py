@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from ai_embedding.search_engine import CosineSearchEngine, QuantizedSearchEngine
+
+
+def random_matrix(rows=500, dimensions=32, seed=0):
+    return np.random.default_rng(seed).standard_normal((rows, dimensions)).astype(np.float32)
+
+
+def brute_force(matrix, query, top_k, valid=None):
+    normalized = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    if valid is not None:
+        scores[~valid] = -np.inf
+    return np.argsort(-scores)[:top_k].tolist(), scores
+
+
+def test_exact_search_matches_brute_force():
+    matrix = random_matrix()
+    engine = CosineSearchEngine(matrix)
+    query = np.random.default_rng(1).standard_normal(32)
+    expected, scores = brute_force(matrix, query, 10)
+
+    results = engine.search(query, top_k=10)
+    assert [row for row, _ in results] == expected
+    assert np.allclose([score for _, score in results], scores[expected], atol=1e-5)
+
+
+def test_invalid_and_zero_rows_are_never_returned():
+    matrix = random_matrix(rows=50)
+    matrix[3] = 0
+    valid = np.ones(50, dtype=bool)
+    valid[:10] = False
+    engine = CosineSearchEngine(matrix, valid)
+    assert engine.size == 40
+
+    results = engine.search(matrix[5], top_k=50)
+    assert len(results) == 40
+    assert all(row >= 10 for row, _ in results)
+
+
+def test_degenerate_queries_return_nothing():
+    engine = CosineSearchEngine(random_matrix(rows=5))
+    assert engine.search(np.zeros(32), top_k=3) == []
+    assert engine.search(np.ones(32), top_k=0) == []
+    assert len(engine.search(np.ones(32), top_k=10)) == 5
+
+
+@pytest.mark.parametrize("codec", QuantizedSearchEngine.CODECS)
+def test_quantized_search_rescored_to_exact_results(codec):
+    matrix = random_matrix(rows=2000, dimensions=64)
+    exact = CosineSearchEngine(matrix)
+    engine = QuantizedSearchEngine(matrix, codec=codec)
+    queries = matrix[::200] + 0.1 * random_matrix(rows=10, dimensions=64, seed=2)
+
+    hits = 0
+    for query in queries:
+        expected = exact.search(query, top_k=5)
+        results = engine.search(query, top_k=5)
+        hits += len({row for row, _ in expected} & {row for row, _ in results})
+        # Las similitudes devueltas son las exactas en float32
+        expected_scores = dict(expected)
+        for row, score in results:
+            if row in expected_scores:
+                assert score == pytest.approx(expected_scores[row], abs=1e-5)
+    assert hits / (5 * len(queries)) >= 0.9
+
+
+def test_quantized_copy_is_smaller_and_respects_the_mask():
+    matrix = random_matrix(rows=100, dimensions=64)
+    valid = np.arange(100) % 2 == 0
+    sizes = {codec: QuantizedSearchEngine(matrix, valid, codec).nbytes for codec in QuantizedSearchEngine.CODECS}
+    assert sizes["binary"] < sizes["int8"] < sizes["float16"] < matrix.nbytes
+
+    engine = QuantizedSearchEngine(matrix, valid, "int8")
+    assert all(valid[row] for row, _ in engine.search(matrix[1], top_k=20))
+    with pytest.raises(ValueError):
+        QuantizedSearchEngine(matrix, codec="int4")
@@ -0,0 +1,64 @@
+import json
+import os
+from types import SimpleNamespace
+from telebot.apihelper import ApiTelegramException
+from bot_handler import BotHandler
+from telegram_files import TelegramFileCache
+
+
+def test_file_ids_persist_and_stale_entries_are_pruned(tmp_path):
+    path = str(tmp_path / "telegram_files.json")
+    cache = TelegramFileCache(path)
+    cache.put("hash-a", "file-a", "a.pdf")
+    cache.put("hash-b", "file-b", "b.pdf")
+
+    reloaded = TelegramFileCache(path)
+    assert reloaded.get("hash-a") == "file-a"
+    reloaded.prune({"hash-b"})
+    reloaded.discard("hash-x")
+    assert TelegramFileCache(path).files.keys() == {"hash-b"}
+
+
+class DocumentBot:
+    """Bot que registra los envíos de documentos y rechaza los file_id indicados."""
+
+    def __init__(self):
+        self.sent = []
+        self.rejected = set()
+
+    def send_document(self, chat_id, document):
+        if isinstance(document, str):
+            self.sent.append(("file_id", document))
+            if document in self.rejected:
+                result_json = {"ok": False, "error_code": 400, "description": "wrong file identifier"}
+                raise ApiTelegramException(
+                    "sendDocument",
+                    SimpleNamespace(status_code=400, text=json.dumps(result_json)),
+                    result_json,
+                )
+            return SimpleNamespace(document=SimpleNamespace(file_id=document))
+        self.sent.append(("upload", os.path.basename(document.name)))
+        return SimpleNamespace(document=SimpleNamespace(file_id=f"id-{len(self.sent)}"))
+
+    def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(("message", text))
+
+
+def test_download_is_uploaded_once_and_resent_by_file_id(library, make_pdf):
+    make_pdf("guia.pdf", ["BLAST"], folder=os.path.join(library, "Bioinformatica"))
+    bot = DocumentBot()
+    handler = BotHandler(bot=bot)
+    call = SimpleNamespace(
+        message=SimpleNamespace(chat=SimpleNamespace(id=1)),
+        data=f"download#{os.path.join('Bioinformatica', 'guia.pdf')}",
+    )
+
+    handler.handle_pdf_download(call)
+    handler.handle_pdf_download(call)
+    assert bot.sent == [("upload", "guia.pdf"), ("file_id", "id-1")]
+
+    # Un file_id rechazado se olvida y el documento se vuelve a subir
+    bot.rejected.add("id-1")
+    handler.handle_pdf_download(call)
+    assert bot.sent[2:] == [("file_id", "id-1"), ("upload", "guia.pdf")]
+    assert handler.file_cache.get(handler.catalog.find_by_name("guia")["hash"]) == "id-4"
@@ -0,0 +1,157 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from telebot.apihelper import ApiTelegramException
+import telegram_stream
+from telegram_stream import AsyncStreamingReply, StreamingReply, split_message
+
+
+def telegram_error(code, description):
+    result_json = {"ok": False, "error_code": code, "description": description}
+    if code == 429:
+        result_json["parameters"] = {"retry_after": 3}
+    return ApiTelegramException(
+        "sendMessage", SimpleNamespace(status_code=code, text=json.dumps(result_json)), result_json
+    )
+
+
+class FakeBot:
+    """Registra las llamadas y lanza los errores programados en orden."""
+
+    def __init__(self, errors=()):
+        self.calls = []
+        self.errors = list(errors)
+        self.next_id = 100
+
+    def _call(self, *call):
+        self.calls.append(call)
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None:
+                raise error
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        self._call("send", text, parse_mode)
+        self.next_id += 1
+        return SimpleNamespace(message_id=self.next_id)
+
+    def edit_message_text(self, text, chat_id, message_id, parse_mode=None):
+        self._call("edit", message_id, text, parse_mode)
+
+    def delete_message(self, chat_id, message_id):
+        self._call("delete", message_id)
+
+
+class AsyncFakeBot(FakeBot):
+    async def send_message(self, *args, **kwargs):
+        return FakeBot.send_message(self, *args, **kwargs)
+
+    async def edit_message_text(self, *args, **kwargs):
+        return FakeBot.edit_message_text(self, *args, **kwargs)
+
+    async def delete_message(self, *args, **kwargs):
+        return FakeBot.delete_message(self, *args, **kwargs)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waited = []
+    monkeypatch.setattr(telegram_stream.time, "sleep", waited.append)
+
+    async def fake_async_sleep(seconds):
+        waited.append(seconds)
+
+    monkeypatch.setattr(telegram_stream.asyncio, "sleep", fake_async_sleep)
+    return waited
+
+
+def run_sync(errors, script):
+    bot = FakeBot(errors)
+    reply = StreamingReply(bot, chat_id=1, min_interval=0, max_length=10)
+    for method, args in script:
+        getattr(reply, method)(*args)
+    return bot.calls, reply
+
+
+def run_async(errors, script):
+    bot = AsyncFakeBot(errors)
+    reply = AsyncStreamingReply(bot, chat_id=1, min_interval=0, max_length=10)
+
+    async def main():
+        for method, args in script:
+            await getattr(reply, method)(*args)
+
+    asyncio.run(main())
+    return bot.calls, reply
+
+
+RUNNERS = [run_sync, run_async]
+
+
+@pytest.mark.parametrize("run", RUNNERS)
+def test_long_text_continues_in_new_messages(run):
+    calls, reply = run([], [("start", ()), ("update", ("a" * 25,))])
+    assert calls == [
+        ("send", "⏳ Generando respuesta...", None),
+        ("edit", 101, "a" * 10, None),
+        ("send", "a" * 10, None),
+        ("send", "a" * 5, None),
+    ]
+    assert reply.shown == split_message("a" * 25, 10)
+
+
+@pytest.mark.parametrize("run", RUNNERS)
+def test_finish_deletes_leftover_messages(run):
+    calls, reply = run([], [("start", ()), ("update", ("b" * 25,)), ("finish", ("fin",))])
+    assert calls[-3:] == [("edit", 101, "fin", None), ("delete", 102), ("delete", 103)]
+    assert reply.message_ids == [101]
+
+
+@pytest.mark.parametrize("run", RUNNERS)
+def test_invalid_markdown_falls_back_to_plain_text(run):
+    errors = [None, telegram_error(400, "Bad Request: can't parse entities")]
+    calls, _ = run(errors, [("start", ()), ("finish", (["*x"], "Markdown"))])
+    assert calls[1:] == [("edit", 101, "*x", "Markdown"), ("edit", 101, "*x", None)]
+
+
+@pytest.mark.parametrize("run", RUNNERS)
+def test_rate_limited_update_is_postponed(run):
+    errors = [None, telegram_error(429, "Too Many Requests")]
+    calls, reply = run(errors, [("start", ()), ("update", ("hola",)), ("update", ("hola mundo",))])
+    # La segunda actualización llega antes de que termine la espera pedida
+    assert calls[1:] == [("edit", 101, "hola", None)]
+    assert reply.shown == ["⏳ Generando respuesta..."]
+
+
+@pytest.mark.parametrize("run", RUNNERS)
+def test_rate_limited_finish_waits_and_retries(run, sleeps):
+    errors = [None, telegram_error(429, "Too Many Requests")]
+    calls, reply = run(errors, [("start", ()), ("finish", ("fin",))])
+    assert sleeps == [3]
+    assert calls[1:] == [("edit", 101, "fin", None), ("edit", 101, "fin", None)]
+    assert reply.shown == ["fin"]
+
+
+@pytest.mark.parametrize("run", RUNNERS)
+def test_not_modified_is_not_an_error(run):
+    errors = [None, telegram_error(400, "Bad Request: message is not modified")]
+    _, reply = run(errors, [("start", ()), ("finish", ("fin",))])
+    assert reply.shown == ["fin"]
+
+
+@pytest.mark.parametrize("run", RUNNERS)
+def test_other_errors_propagate(run):
+    errors = [None, telegram_error(403, "Forbidden: bot was blocked by the user")]
+    with pytest.raises(ApiTelegramException):
+        run(errors, [("start", ()), ("finish", ("fin",))])
+
+
+def test_updates_are_throttled():
+    bot = FakeBot()
+    reply = StreamingReply(bot, chat_id=1, min_interval=60)
+    reply.start()
+    reply.update("uno")
+    reply.update("uno dos")
+    reply.finish("uno dos tres")
+    assert [call[2] for call in bot.calls[1:]] == ["uno", "uno dos tres"]
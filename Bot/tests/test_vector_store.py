@@ -0,0 +1,82 @@
+import pickle
+import numpy as np
+from ai_embedding.vector_store import ChunkStore, convert_pickle_store, save_embedding_store
+
+
+def make_chunks(count, dimensions=4, embedded=None):
+    chunks = []
+    for i in range(count):
+        chunk = {"chunk_id": f"Block-{i + 1}", "document": "a.pdf", "pages": [i + 1], "text": f"texto {i}"}
+        if embedded is None or i in embedded:
+            chunk["embedding"] = [float(i)] * dimensions
+        chunks.append(chunk)
+    return chunks
+
+
+def store_paths(tmp_path):
+    return str(tmp_path / "embeddings.npy"), str(tmp_path / "chunks.pkl")
+
+
+def test_store_roundtrip_maps_the_matrix(tmp_path):
+    matrix_path, meta_path = store_paths(tmp_path)
+    save_embedding_store(make_chunks(5, embedded={0, 1, 3}), matrix_path, meta_path, embedding_model="modelo")
+
+    with open(meta_path, "rb") as f:
+        meta = pickle.load(f)
+    assert all("embedding" not in chunk for chunk in meta["chunks"])
+
+    store = ChunkStore.load(matrix_path, meta_path)
+    assert isinstance(store.matrix, np.memmap)
+    assert store.matrix.dtype == np.float32 and store.matrix.shape == (5, 4)
+    assert store.embedding_model == "modelo"
+    assert ["embedding" in chunk for chunk in store.chunks] == [True, True, False, True, False]
+    assert store.chunks[3]["embedding"].tolist() == [3.0] * 4
+    assert store.searchable().tolist() == [True, True, False, True, False]
+
+
+def test_missing_store_loads_as_none(tmp_path):
+    assert ChunkStore.load(*store_paths(tmp_path)) is None
+
+
+def test_legacy_pickle_is_converted(tmp_path):
+    pickle_path = str(tmp_path / "embeddings.pkl")
+    with open(pickle_path, "wb") as f:
+        pickle.dump(make_chunks(3), f)
+    matrix_path, meta_path = store_paths(tmp_path)
+
+    assert convert_pickle_store(pickle_path, matrix_path, meta_path)
+    store = ChunkStore.load(matrix_path, meta_path)
+    assert [chunk["text"] for chunk in store.chunks] == ["texto 0", "texto 1", "texto 2"]
+    assert np.array_equal(store.matrix, [[0.0] * 4, [1.0] * 4, [2.0] * 4])
+
+
+def test_row_ids_are_stable_and_never_reused(tmp_path):
+    matrix_path, meta_path = store_paths(tmp_path)
+    store = ChunkStore(make_chunks(3), matrix_path=matrix_path, meta_path=meta_path)
+    assert [chunk["row_id"] for chunk in store.chunks] == [0, 1, 2]
+
+    assert store.delete([1, 1, 99]) == 1
+    assert store.get(1) is None and len(store) == 2
+    assert store.add(make_chunks(2)) == [3, 4]
+    assert store.get(3)["text"] == "texto 0"
+    assert store.searchable().tolist() == [True, False, True, True, True]
+
+
+def test_tombstones_survive_save_until_compaction(tmp_path):
+    matrix_path, meta_path = store_paths(tmp_path)
+    store = ChunkStore(make_chunks(4), matrix_path=matrix_path, meta_path=meta_path)
+    store.delete([0])
+    store.save(compact_ratio=0.5)
+
+    loaded = ChunkStore.load(matrix_path, meta_path)
+    assert loaded.deleted_count == 1 and len(loaded.chunks) == 4
+    assert loaded.get(0) is None and loaded.chunks[0].get("deleted")
+
+    loaded.delete_where(lambda chunk: chunk["text"] == "texto 1")
+    loaded.save(compact_ratio=0.5)
+    compacted = ChunkStore.load(matrix_path, meta_path)
+    assert compacted.deleted_count == 0
+    assert [chunk["row_id"] for chunk in compacted.chunks] == [2, 3]
+    assert compacted.get(3)["embedding"].tolist() == [3.0] * 4
+    assert compacted.add(make_chunks(1)) == [4]
+